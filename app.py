@@ -1,173 +1,98 @@
-from flask import Flask, jsonify
-from seeds import seed_database
 from dotenv import load_dotenv
-from db_import import import_database
-import os
-import sys
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
-from flask_cors import CORS
-from db_config import get_db_connection, db_create_all
-from flasgger import Swagger
 
+# Jedyne wczytanie .env - przed importem modułów, które czytają konfigurację ze zmiennych środowiskowych
 load_dotenv()
 
-# Inicjalizacja aplikacji Flask
-app = Flask(__name__)
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'secret')  # Load from environment variable
-jwt = JWTManager(app)
-
-SWAGGER_TEMPLATE = {
-    "swagger": "2.0",
-    "info": {
-        "title": "Nutrition App API",
-        "description": "API documentation",
-        "version": "1.0.0"
-    },
-    "securityDefinitions": {
-        "Bearer": {
-            "type": "apiKey",
-            "name": "Authorization",
-            "in": "header",
-            "description": "JWT Authorization header using the Bearer scheme. Example: \"Authorization: Bearer {token}\""
-        }
-    },
-    "security": [
-        {
-            "Bearer": []
-        }
-    ]
-}
-
-swagger = Swagger(app, template=SWAGGER_TEMPLATE)
-
-CORS(app)  # Dodaj tę linię, aby włączyć CORS dla całej aplikacji
-
-# @app.cli.command('seed')
-# def seed():
-#     seed_base_database()
-
-# def seed_base_database():
-#     with app.app_context():
-#         seed_database()
-#         pass
-
-# # Funkcja do inicjalizacji bazy danych
-# def setup_database():
-#     # with app.app_context():
-#     #     db_create_all()
-#     #     if 'dbimport' in sys.argv or 'importdb' in sys.argv:
-#     #         print('Importing database, this may take a while')
-#     #         import_database()
-#     #         print('Importing completed')
-#     #     if 'seed' in sys.argv:
-#     #         print('Seeding database with base data')
-#     #         seed_base_database()
-#     #         print('Seeding completed')
-#     #     if 'seed' in sys.argv or 'dbimport' in sys.argv or 'importdb' in sys.argv:
-#     #         exit()
-#     pass
-
-# User Endpoints
-from endpoints.users import create_user, get_users, get_user, activate_user, deactivate_user, get_me
-app.add_url_rule('/users', view_func=create_user, methods=['POST'])
-app.add_url_rule('/users', view_func=get_users, methods=['GET'])
-app.add_url_rule('/users/me', view_func=get_me, methods=['GET'])
-app.add_url_rule('/users/<int:user_id>', view_func=get_user, methods=['GET'])
-app.add_url_rule('/users/<int:user_id>/activate', view_func=activate_user, methods=['GET'])
-app.add_url_rule('/users/<int:user_id>', view_func=deactivate_user, methods=['DELETE'])
-
-# User Details Endpoints
-from endpoints.user_details import create_user_details, update_user_details, get_user_details
-app.add_url_rule('/users/<int:user_id>/details', view_func=create_user_details, methods=['POST'])
-app.add_url_rule('/users/<int:user_id>/details', view_func=update_user_details, methods=['PUT', 'PATCH'])
-app.add_url_rule('/users/<int:user_id>/details', view_func=get_user_details, methods=['GET'])
-
-# Diets Endpoints
-from endpoints.diets import create_diet, get_diets, get_diet
-app.add_url_rule('/diets', view_func=create_diet, methods=['POST'])
-app.add_url_rule('/diets', view_func=get_diets, methods=['GET'])
-app.add_url_rule('/diets/<int:diet_id>', view_func=get_diet, methods=['GET'])
-
-# User Diets Endpoints
-from endpoints.user_diets import assign_diet_to_user, remove_diet_from_user, get_user_diets
-app.add_url_rule('/users/<int:user_id>/diets', view_func=assign_diet_to_user, methods=['POST'])
-app.add_url_rule('/users/<int:user_id>/diets/<int:diet_id>', view_func=remove_diet_from_user, methods=['DELETE'])
-app.add_url_rule('/users/<int:user_id>/diets', view_func=get_user_diets, methods=['GET'])
-
-# Meals Endpoints
-from endpoints.meals import get_meals, get_meal, create_meal, update_meal, search_meals, get_meal_versions, get_meal_nutrients
-app.add_url_rule('/meals', view_func=get_meals, methods=['GET'])
-app.add_url_rule('/meals/<int:meal_id>', view_func=get_meal, methods=['GET'])
-app.add_url_rule('/meals/search', view_func=search_meals, methods=['GET'])
-app.add_url_rule('/meals', view_func=create_meal, methods=['POST'])
-app.add_url_rule('/meals/<int:meal_id>', view_func=update_meal, methods=['PUT', 'PATCH'])
-# app.add_url_rule('/meals/<int:meal_id>', view_func=delete_meal, methods=['DELETE']) # Brak możliwości usuwania, do zaimplementowania w przyszłości - wymaga więcej uwagi przez relacje z innymi tabelami (np.: Historia zmian i możliwe relacje historii do food log i food schedule)
-app.add_url_rule('/meals/<int:meal_id>/versions', view_func=get_meal_versions, methods=['GET'])
-app.add_url_rule('/meals/<int:meal_id>/nutrients', view_func=get_meal_nutrients, methods=['GET'])
-
-# Meal Categories Endpoints
-from endpoints.meal_category import assign_category_to_meal, remove_category_from_meal, update_category_of_meal, get_meal_categories
-app.add_url_rule('/meals/categories', view_func=get_meal_categories, methods=['GET'])
-app.add_url_rule('/meals/<int:meal_id>/category/<int:category_id>', view_func=assign_category_to_meal, methods=['POST'])
-app.add_url_rule('/meals/<int:meal_id>/category', view_func=remove_category_from_meal, methods=['DELETE'])
-app.add_url_rule('/meals/<int:meal_id>/category/<int:category_id>', view_func=update_category_of_meal, methods=['PUT'])
-
-# Meal Diet Endpoints
-from endpoints.meal_diet import assign_diet_to_meal, remove_diet_from_meal, update_diet_of_meal
-app.add_url_rule('/meals/<int:meal_id>/diet/<int:diet_id>', view_func=assign_diet_to_meal, methods=['POST'])
-app.add_url_rule('/meals/<int:meal_id>/diet', view_func=remove_diet_from_meal, methods=['DELETE'])
-app.add_url_rule('/meals/<int:meal_id>/diet/<int:diet_id>', view_func=update_diet_of_meal, methods=['PUT'])
-
-# Meal Ingredients Endpoints
-from endpoints.meal_ingredients import get_meal_ingredients, replace_meal_ingredients, add_meal_ingredient, remove_meal_ingredient
-app.add_url_rule('/meals/<int:meal_id>/ingredients', view_func=get_meal_ingredients, methods=['GET'])
-app.add_url_rule('/meals/<int:meal_id>/ingredients', view_func=replace_meal_ingredients, methods=['PUT'])
-app.add_url_rule('/meals/<int:meal_id>/ingredients', view_func=add_meal_ingredient, methods=['POST'])
-app.add_url_rule('/meals/<int:meal_id>/ingredients/<int:ingredient_id>', view_func=remove_meal_ingredient, methods=['DELETE'])
-
-# Ingredients Endpoints
-
-# Brak POST dla składników - Składniki będą dodawane z formularza dodawania/aktualizacji posiłku
-# Składniki wybrane w posiłku będą importowane do bazy danych z zewnętrznej bazy OpenFoodFacts
-
-from endpoints.ingredients import get_ingredients, get_ingredient_by_id, search_ingredients
-app.add_url_rule('/ingredients', view_func=get_ingredients, methods=['GET'])
-app.add_url_rule('/ingredients/<int:ing_id>', view_func=get_ingredient_by_id, methods=['GET'])
-app.add_url_rule('/ingredients/search', view_func=search_ingredients, methods=['GET'])
-
-# Food schedule Endpoints
-from endpoints.food_schedule import get_food_schedules, get_food_schedule, create_food_schedule, delete_food_schedule, get_food_schedule_for_user, get_food_schedule_for_user_by_date
-app.add_url_rule('/food/schedules', view_func=get_food_schedules, methods=['GET'])
-app.add_url_rule('/food/schedules', view_func=create_food_schedule, methods=['POST'])
-app.add_url_rule('/food/schedules/<int:schedule_id>', view_func=get_food_schedule, methods=['GET'])
-app.add_url_rule('/food/schedules/<int:schedule_id>', view_func=delete_food_schedule, methods=['DELETE'])
-
-app.add_url_rule('/users/<int:user_id>/food/schedule', view_func=get_food_schedule_for_user, methods=['GET'])
-app.add_url_rule('/users/<int:user_id>/food/schedule/<date>', view_func=get_food_schedule_for_user_by_date, methods=['GET'])
-
-# Shopping List Endpoints
-from endpoints.shopping_list import generate_shopping_list
-app.add_url_rule('/users/<int:user_id>/shopping_list', view_func=generate_shopping_list, methods=['GET'])
-
-# Food log Endpoints
-from endpoints.food_logs import get_food_logs, get_food_log, create_food_log, delete_food_log, calculate_daily_nutrients, get_food_logs_for_user, get_food_logs_by_date_for_user
-app.add_url_rule('/food/logs', view_func=get_food_logs, methods=['GET'])
-app.add_url_rule('/food/logs/<int:food_log_id>', view_func=get_food_log, methods=['GET'])
-app.add_url_rule('/food/logs', view_func=create_food_log, methods=['POST'])
-app.add_url_rule('/food/logs/<int:food_log_id>', view_func=delete_food_log, methods=['DELETE'])
-
-app.add_url_rule('/users/<int:user_id>/food/log', view_func=get_food_logs_for_user, methods=['GET'])
-app.add_url_rule('/users/<int:user_id>/food/log/<date>', view_func=get_food_logs_by_date_for_user, methods=['GET'])
-
-# Daily Nutrients Endpoints
-app.add_url_rule('/users/<int:user_id>/nutrients/<date>', view_func=calculate_daily_nutrients, methods=['GET'])
-
-# Login & Register Endpoints
-
-from endpoints.auth import login #, register
-
-app.add_url_rule('/login', view_func=login, methods=['POST'])
-# app.add_url_rule('/register', view_func=register, methods=['POST'])
+import os
+import click
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager
+from flask_cors import CORS
+from query_stats import init_query_stats
+from metrics import init_metrics
+from slow_queries import init_slow_queries
+from profiling import init_profiling
+from db_routing import init_db_routing
+from invalidation_bus import init_invalidation_bus
+from swagger_spec import init_swagger
+
+# ==================== KOMENDY CLI ====================
+# Narzędzia (seed, import OpenFoodFacts, generator danych) importowane są dopiero przy wywołaniu komendy,
+# więc nie należą do grafu importów workera obsługującego żądania.
+
+@click.command('create-db')
+def create_db_command():
+    """Tworzy tabele w bazie danych."""
+    from db_config import db_create_all
+    db_create_all()
+
+@click.command('seed')
+def seed_command():
+    """Wypełnia bazę danymi bazowymi (typy linków, diety, kategorie)."""
+    from seeds import seed_database
+    seed_database()
+
+@click.command('import-db')
+def import_db_command():
+    """Importuje składniki z en.openfoodfacts.org.products.csv.gz."""
+    from db_import import import_database
+    print('Importing database, this may take a while')
+    import_database()
+    print('Importing completed')
+
+@click.command('generate-data')
+@click.option('--preset', default='small', show_default=True, help='small, medium lub large')
+@click.option('--seed', default=42, show_default=True, type=int)
+def generate_data_command(preset, seed):
+    """Dopisuje syntetyczny zbiór danych (synthetic_data.py)."""
+    from synthetic_data import generate_dataset
+    generate_dataset(preset, seed)
+
+@click.command('build-catalog')
+@click.option('--path', default=lambda: os.getenv('INGREDIENT_CATALOG_PATH'), help='Plik katalogu (domyślnie INGREDIENT_CATALOG_PATH)')
+def build_catalog_command(path):
+    """Buduje katalog składników mapowany przez workery (build_catalog.py)."""
+    from build_catalog import main
+    main(['--path', path] if path else [])
+
+# ==================== FABRYKA APLIKACJI ====================
+
+def create_app():
+    from blueprints import BLUEPRINTS
+
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'secret')  # Load from environment variable
+    JWTManager(app)
+
+    init_swagger(app)  # Statyczna specyfikacja API z swagger.json, Swagger UI tylko przy SWAGGER_UI=1
+
+    CORS(app)  # Dodaj tę linię, aby włączyć CORS dla całej aplikacji
+    init_query_stats(app)  # Liczba i czas zapytań do bazy w nagłówkach Server-Timing oraz w logach
+    init_metrics(app)  # Metryki żądań, zapytań i połączeń dla /metrics
+    init_slow_queries(app)  # Wolne zapytania i próbkowane plany EXPLAIN dla /admin/slow-queries
+    init_db_routing(app)  # Odczyty z żądań GET na repliki z REPLICA_DSNS, read-your-writes po zapisie
+    init_invalidation_bus(app)  # Wątek LISTEN/NOTIFY unieważniający cache po zmianach w bazie (także z innych hostów)
+    init_profiling(app)  # Profilowanie pojedynczych żądań (nagłówek X-Profile), tylko gdy ustawiono PROFILE_TOKEN
+
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
+
+    for command in (create_db_command, seed_command, import_db_command, generate_data_command, build_catalog_command):
+        app.cli.add_command(command)
+
+    # ==================== ERROR HANDLERY =============================
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({"error": "Not Found"}), 404
+
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({"error": "Bad Request"}), 400
+
+    return app
+
+# Instancja dla `flask run` (FLASK_APP=app.py) i serwerów WSGI (app:app)
+app = create_app()
 
 # Przykład zabezpieczonego endpointu
 # @app.route('/protected', methods=['GET'])
@@ -179,14 +104,4 @@ app.add_url_rule('/login', view_func=login, methods=['POST'])
 
 # ==================== URUCHOMIENIE APLIKACJI ====================
 if __name__ == "__main__":
-    # setup_database()
     app.run(debug=True)
-    
-# ==================== ERROR HANDLERY =============================
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({"error": "Not Found"}), 404
-    
-@app.errorhandler(400)
-def bad_request(error):
-    return jsonify({"error": "Bad Request"}), 400
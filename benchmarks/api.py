@@ -0,0 +1,413 @@
+"""Benchmark wszystkich endpointów API na jednorazowej lokalnej bazie Postgres.
+
+Uruchomienie (z katalogu projektu, serwer Postgres wskazany zmiennymi POSTGRES_*):
+
+    POSTGRES_HOST=localhost python -m benchmarks.api --save-baseline
+    POSTGRES_HOST=localhost python -m benchmarks.api
+
+Pierwsze wywołanie zapisuje wyniki do benchmarks/baseline.json, kolejne porównują się z nim
+i kończą kodem 1, jeśli któryś endpoint zwolnił ponad tolerancję lub wykonuje więcej zapytań.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+
+from synthetic_data import PRESETS, SYNTHETIC_PASSWORD
+
+ADMIN_TOKEN = 'bench-admin-token'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def admin_connection(dbname='postgres'):
+    conn = psycopg2.connect(
+        dbname=dbname,
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", "1234"),
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=os.getenv("POSTGRES_PORT", 5432)
+    )
+    conn.autocommit = True
+    return conn
+
+def create_database(name):
+    conn = admin_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL('DROP DATABASE IF EXISTS {}').format(sql.Identifier(name)))
+        cursor.execute(sql.SQL('CREATE DATABASE {}').format(sql.Identifier(name)))
+    conn.close()
+
+def drop_database(name):
+    conn = admin_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL('DROP DATABASE IF EXISTS {} WITH (FORCE)').format(sql.Identifier(name)))
+    conn.close()
+
+def build_context(conn, dataset):
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    user_id = dataset['user_ids'][0]
+    meal_id = dataset['meal_ids'][0]
+
+    cursor.execute('SELECT email FROM "user" WHERE id = %s', (user_id,))
+    email = cursor.fetchone()['email']
+    cursor.execute('SELECT password FROM "user" WHERE id = %s', (user_id,))
+    password_hash = cursor.fetchone()['password']
+    cursor.execute('SELECT version FROM meal WHERE id = %s', (meal_id,))
+    meal_version = cursor.fetchone()['version']
+    cursor.execute('SELECT id FROM food_log WHERE user_id = %s ORDER BY id LIMIT 1', (user_id,))
+    food_log_id = cursor.fetchone()['id']
+    cursor.execute('SELECT id FROM food_schedule WHERE user_id = %s ORDER BY id LIMIT 1', (user_id,))
+    schedule_id = cursor.fetchone()['id']
+    cursor.execute('SELECT ingredient_id FROM meal_ingredients WHERE meal_id = %s ORDER BY ingredient_id', (meal_id,))
+    meal_ingredient_ids = [row['ingredient_id'] for row in cursor.fetchall()]
+    cursor.close()
+
+    spare_ingredient_id = next(i for i in dataset['ingredient_ids'] if i not in meal_ingredient_ids)
+
+    return {
+        "user_id": user_id,
+        "email": email,
+        "password_hash": password_hash,
+        "meal_id": meal_id,
+        "meal_version": meal_version,
+        "meal_ingredient_ids": meal_ingredient_ids,
+        "spare_ingredient_id": spare_ingredient_id,
+        "ingredient_id": dataset['ingredient_ids'][0],
+        "diet_id": dataset['diet_ids'][0],
+        "other_diet_id": dataset['diet_ids'][-1],
+        "category_id": dataset['category_ids'][0],
+        "food_log_id": food_log_id,
+        "schedule_id": schedule_id,
+        "today": datetime.datetime.utcnow().strftime('%d-%m-%Y')
+    }
+
+def _execute(db, query, params=None, fetch=False):
+    with db.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchone() if fetch else None
+
+def _future(i):
+    return (datetime.datetime.utcnow() + datetime.timedelta(days=1, minutes=i)).strftime('%H:%M:%S %d-%m-%Y')
+
+def _new_user(db, ctx, i, active=True):
+    email = f'bench_setup_{os.getpid()}_{time.time_ns()}_{i}@example.com'
+    user = _execute(db, '''
+        INSERT INTO "user" (email, password, created_at, email_confirmed, active)
+        VALUES (%s, %s, NOW(), %s, %s)
+        RETURNING id
+    ''', (email, ctx['password_hash'], active, active), fetch=True)
+    return {"new_user_id": user['id'], "new_user_email": email}
+
+def _new_activation_link(db, ctx, i):
+    values = _new_user(db, ctx, i, active=False)
+    code = f'bench-{time.time_ns()}'
+    _execute(db, '''
+        INSERT INTO links (user_id, code, type_id, used, expire_at)
+        VALUES (%s, %s, (SELECT id FROM link_types WHERE type = 'activate'), FALSE, NOW() + interval '1 day')
+    ''', (values['new_user_id'], code))
+    values['code'] = code
+    return values
+
+# ==================== SCENARIUSZE ====================
+
+# Żądanie dla każdego endpointu: metoda, ścieżka, opcjonalne body i przygotowanie stanu (poza pomiarem).
+# Klucz to nazwa widoku zarejestrowanego w app.py.
+SCENARIOS = {
+    "login": {"method": "POST", "anonymous": True, "path": lambda c: '/login',
+              "json": lambda c: {"email": c['email'], "password": SYNTHETIC_PASSWORD}},
+    "create_user": {"method": "POST", "anonymous": True, "path": lambda c: '/users',
+                    "json": lambda c: {"email": f"bench_new_{os.getpid()}_{time.time_ns()}@example.com", "password": SYNTHETIC_PASSWORD, "confirm_password": SYNTHETIC_PASSWORD}},
+    "get_users": {"method": "GET", "path": lambda c: '/users?limit=20'},
+    "get_me": {"method": "GET", "path": lambda c: '/users/me'},
+    "get_user": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}"},
+    "activate_user": {"method": "GET", "anonymous": True, "setup": _new_activation_link,
+                      "path": lambda c: f"/users/{c['new_user_id']}/activate?code={c['code']}&email={c['new_user_email']}"},
+    "deactivate_user": {"method": "DELETE", "setup": _new_user, "as_user": "new_user_id",
+                        "path": lambda c: f"/users/{c['new_user_id']}", "json": lambda c: {"password": SYNTHETIC_PASSWORD}},
+
+    "create_user_details": {"method": "POST", "path": lambda c: f"/users/{c['user_id']}/details",
+                            "setup": lambda db, c, i: _execute(db, 'DELETE FROM user_details WHERE user_id = %s', (c['user_id'],)),
+                            "json": lambda c: {"age": 30, "gender": "X", "height": 180, "weight": 80, "kcal_goal": 2200, "fat_goal": 70, "protein_goal": 140, "carb_goal": 250}},
+    "update_user_details": {"method": ("PUT", "PATCH"), "path": lambda c: f"/users/{c['user_id']}/details", "json": lambda c: {"weight": 79.5}},
+    "get_user_details": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/details"},
+
+    "create_diet": {"method": "POST", "path": lambda c: '/diets', "json": lambda c: {"name": f"Bench diet {time.time_ns()}"}},
+    "get_diets": {"method": "GET", "path": lambda c: '/diets'},
+    "get_diet": {"method": "GET", "path": lambda c: f"/diets/{c['diet_id']}"},
+
+    "assign_diet_to_user": {"method": "POST", "path": lambda c: f"/users/{c['user_id']}/diets",
+                            "setup": lambda db, c, i: _execute(db, 'DELETE FROM user_diets WHERE user_id = %s AND diet_id = %s', (c['user_id'], c['other_diet_id'])),
+                            "json": lambda c: {"diet_id": c['other_diet_id'], "allowed": True}},
+    "remove_diet_from_user": {"method": "DELETE", "path": lambda c: f"/users/{c['user_id']}/diets/{c['other_diet_id']}",
+                              "setup": lambda db, c, i: _execute(db, 'INSERT INTO user_diets (user_id, diet_id, allowed) VALUES (%s, %s, TRUE) ON CONFLICT DO NOTHING', (c['user_id'], c['other_diet_id']))},
+    "get_user_diets": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/diets"},
+
+    "get_meals": {"method": "GET", "path": lambda c: '/meals?limit=20'},
+    "get_meal": {"method": "GET", "path": lambda c: f"/meals/{c['meal_id']}"},
+    "search_meals": {"method": "GET", "path": lambda c: '/meals/search?query=bowl&allowMore=1'},
+    "create_meal": {"method": "POST", "path": lambda c: '/meals',
+                    "json": lambda c: {"name": "Bench meal", "diet_id": c['diet_id'], "category_id": c['category_id'],
+                                       "ingredients": [{"ingredient_id": i, "unit": "g", "quantity": 100} for i in c['meal_ingredient_ids']]}},
+    "update_meal": {"method": ("PUT", "PATCH"), "path": lambda c: f"/meals/{c['meal_id']}", "json": lambda c: {"description": f"Updated {time.time_ns()}"}},
+    "get_meal_versions": {"method": "GET", "path": lambda c: f"/meals/{c['meal_id']}/versions"},
+    "get_meal_nutrients": {"method": "GET", "path": lambda c: f"/meals/{c['meal_id']}/nutrients"},
+    "get_similar_meals": {"method": "GET", "path": lambda c: f"/meals/{c['meal_id']}/similar"},
+    "compute_nutrients": {"method": "POST", "path": lambda c: '/nutrients/compute',
+                          "json": lambda c: {"ingredients": [{"ingredient_id": i, "unit": "g", "quantity": 100 + n} for n, i in enumerate(c['meal_ingredient_ids'])]}},
+
+    "get_meal_categories": {"method": "GET", "path": lambda c: '/meals/categories'},
+    "assign_category_to_meal": {"method": "POST", "path": lambda c: f"/meals/{c['meal_id']}/category/{c['category_id']}",
+                                "setup": lambda db, c, i: _execute(db, 'UPDATE meal SET category_id = NULL WHERE id = %s', (c['meal_id'],))},
+    "remove_category_from_meal": {"method": "DELETE", "path": lambda c: f"/meals/{c['meal_id']}/category",
+                                  "setup": lambda db, c, i: _execute(db, 'UPDATE meal SET category_id = %s WHERE id = %s', (c['category_id'], c['meal_id']))},
+    "update_category_of_meal": {"method": "PUT", "path": lambda c: f"/meals/{c['meal_id']}/category/{c['category_id']}"},
+
+    "assign_diet_to_meal": {"method": "POST", "path": lambda c: f"/meals/{c['meal_id']}/diet/{c['diet_id']}",
+                            "setup": lambda db, c, i: _execute(db, 'UPDATE meal SET diet_id = NULL WHERE id = %s', (c['meal_id'],))},
+    "remove_diet_from_meal": {"method": "DELETE", "path": lambda c: f"/meals/{c['meal_id']}/diet",
+                              "setup": lambda db, c, i: _execute(db, 'UPDATE meal SET diet_id = %s WHERE id = %s', (c['diet_id'], c['meal_id']))},
+    "update_diet_of_meal": {"method": "PUT", "path": lambda c: f"/meals/{c['meal_id']}/diet/{c['diet_id']}"},
+
+    "get_meal_ingredients": {"method": "GET", "path": lambda c: f"/meals/{c['meal_id']}/ingredients"},
+    "replace_meal_ingredients": {"method": "PUT", "path": lambda c: f"/meals/{c['meal_id']}/ingredients",
+                                 "json": lambda c: {"ingredients": [{"ingredient_id": i, "unit": "g", "quantity": 100 + c['iteration'] + n} for n, i in enumerate(c['meal_ingredient_ids'])]}},
+    "add_meal_ingredient": {"method": "POST", "path": lambda c: f"/meals/{c['meal_id']}/ingredients",
+                            "setup": lambda db, c, i: _execute(db, 'DELETE FROM meal_ingredients WHERE meal_id = %s AND ingredient_id = %s', (c['meal_id'], c['spare_ingredient_id'])),
+                            "json": lambda c: {"ingredient_id": c['spare_ingredient_id'], "unit": "g", "quantity": 50}},
+    "remove_meal_ingredient": {"method": "DELETE", "path": lambda c: f"/meals/{c['meal_id']}/ingredients/{c['spare_ingredient_id']}",
+                               "setup": lambda db, c, i: _execute(db, "INSERT INTO meal_ingredients (meal_id, ingredient_id, unit, quantity) VALUES (%s, %s, 'g', 50) ON CONFLICT DO NOTHING", (c['meal_id'], c['spare_ingredient_id']))},
+
+    "get_ingredients": {"method": "GET", "path": lambda c: '/ingredients?limit=20'},
+    "get_ingredient_by_id": {"method": "GET", "path": lambda c: f"/ingredients/{c['ingredient_id']}"},
+    "search_ingredients": {"method": "GET", "path": lambda c: '/ingredients/search?query=rice&top=20'},
+    "typeahead_ingredients": {"method": "GET", "path": lambda c: '/ingredients/typeahead?query=ri&top=10'},
+
+    "get_food_schedules": {"method": "GET", "path": lambda c: '/food/schedules?limit=20'},
+    "create_food_schedule": {"method": "POST", "path": lambda c: '/food/schedules',
+                             "json": lambda c: {"meal_id": c['meal_id'], "meal_version": 1, "at": _future(c['iteration'])}},
+    "get_food_schedule": {"method": "GET", "path": lambda c: f"/food/schedules/{c['schedule_id']}"},
+    "delete_food_schedule": {"method": "DELETE", "path": lambda c: f"/food/schedules/{c['new_schedule_id']}",
+                             "setup": lambda db, c, i: {"new_schedule_id": _execute(db, "INSERT INTO food_schedule (meal_history_id, at, user_id) SELECT id, NOW() + interval '1 day', %s FROM meal_history LIMIT 1 RETURNING id", (c['user_id'],), fetch=True)['id']}},
+    "create_food_schedule_rule": {"method": "POST", "path": lambda c: '/food/schedules/rules',
+                                  "json": lambda c: {"meal_id": c['meal_id'], "meal_version": 1, "time": "08:00", "weekdays": [1, 2, 3, 4, 5], "weeks": 4}},
+    "delete_food_schedule_rule": {"method": "DELETE", "path": lambda c: f"/food/schedules/rules/{c['new_rule_id']}",
+                                  "setup": lambda db, c, i: {"new_rule_id": _execute(db, "INSERT INTO food_schedule_rule (meal_history_id, user_id, at_time, weekdays, starts_on, ends_on) SELECT id, %s, '08:00', 31, CURRENT_DATE, CURRENT_DATE + 27 FROM meal_history LIMIT 1 RETURNING id", (c['user_id'],), fetch=True)['id']}},
+    "get_food_schedule_for_user": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/food/schedule"},
+    "get_food_schedule_rules_for_user": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/food/schedule/rules"},
+    "get_food_schedule_for_user_by_date": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/food/schedule/{c['today']}"},
+
+    "generate_shopping_list": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/shopping_list?days=7"},
+    "get_meal_suggestions": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/suggestions?mealsLeft=2&allowMore=true"},
+
+    "get_food_logs": {"method": "GET", "path": lambda c: '/food/logs?limit=20'},
+    "get_food_log": {"method": "GET", "path": lambda c: f"/food/logs/{c['food_log_id']}"},
+    "create_food_log": {"method": "POST", "path": lambda c: '/food/logs',
+                        "json": lambda c: {"meal_id": c['meal_id'], "meal_version": 1, "portion": 250, "at": datetime.datetime.utcnow().strftime('%H:%M:%S %d-%m-%Y')}},
+    "create_food_logs_batch": {"method": "POST", "path": lambda c: '/food/logs/batch',
+                               "json": lambda c: {"logs": [{"meal_id": c['meal_id'], "meal_version": 1, "portion": 100 + n, "at": datetime.datetime.utcnow().strftime('%H:%M:%S %d-%m-%Y')} for n in range(50)]}},
+    "delete_food_log": {"method": "DELETE", "path": lambda c: f"/food/logs/{c['new_food_log_id']}",
+                        "setup": lambda db, c, i: {"new_food_log_id": _execute(db, 'INSERT INTO food_log (meal_history_id, portion, at, user_id) SELECT id, 100, NOW(), %s FROM meal_history LIMIT 1 RETURNING id', (c['user_id'],), fetch=True)['id']}},
+    "get_food_logs_for_user": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/food/log"},
+    "get_food_logs_by_date_for_user": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/food/log/{c['today']}"},
+    "get_apispec": {"method": "GET", "anonymous": True, "path": lambda c: '/apispec_1.json'},
+    "get_metrics": {"method": "GET", "anonymous": True, "path": lambda c: '/metrics'},
+    "get_slow_queries": {"method": "GET", "anonymous": True, "path": lambda c: '/admin/slow-queries',
+                         "headers": lambda c: {"X-Admin-Token": ADMIN_TOKEN}},
+    "calculate_daily_nutrients": {"method": "GET", "path": lambda c: f"/users/{c['user_id']}/nutrients/{c['today']}?compareDetails=true"},
+}
+
+# ==================== KLIENCI ====================
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, int(response.headers.get('X-DB-Query-Count', 0))
+
+    def close(self):
+        pass
+
+class WSGIServerClient:
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+
+    def request(self, method, path, headers, body):
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status, int(response.getheader('X-DB-Query-Count', 0))
+
+    def close(self):
+        self.connection.close()
+        self.server.shutdown()
+
+# ==================== POMIAR ====================
+
+def percentile(values, q):
+    # Percentyl metodą najbliższej rangi
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def view_name(endpoint):
+    return endpoint.rsplit('.', 1)[-1]
+
+def api_rules(app):
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or rule.endpoint.startswith('flasgger.'):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            yield method, rule
+
+def run_benchmark(app, client, db, ctx, tokens, requests, warmup):
+    from flask_jwt_extended import create_access_token
+
+    results = {}
+    skipped = []
+    for method, rule in api_rules(app):
+        key = f'{method} {rule.rule}'
+        scenario = SCENARIOS.get(view_name(rule.endpoint))
+        if scenario is None or method not in (scenario['method'] if isinstance(scenario['method'], tuple) else (scenario['method'],)):
+            skipped.append(key)
+            continue
+
+        latencies = []
+        queries = []
+        statuses = {}
+        for i in range(warmup + requests):
+            ictx = dict(ctx, iteration=i)
+            if scenario.get('setup'):
+                ictx.update(scenario['setup'](db, ictx, i) or {})
+
+            headers = {}
+            if not scenario.get('anonymous'):
+                user_id = ictx[scenario.get('as_user', 'user_id')]
+                if user_id not in tokens:
+                    with app.app_context():
+                        tokens[user_id] = create_access_token(identity=str(user_id))
+                headers['Authorization'] = f'Bearer {tokens[user_id]}'
+
+            if scenario.get('headers'):
+                headers.update(scenario['headers'](ictx))
+
+            body = scenario['json'](ictx) if scenario.get('json') else None
+            path = scenario['path'](ictx)
+
+            started = time.perf_counter()
+            status, query_count = client.request(method, path, headers, body)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            if i >= warmup:
+                latencies.append(elapsed)
+                queries.append(query_count)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        results[key] = {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "queries_per_request": round(sum(queries) / len(queries), 2),
+            "statuses": {str(code): count for code, count in sorted(statuses.items())}
+        }
+        print(f"{key:60s} p50 {results[key]['p50_ms']:8.2f} ms  p95 {results[key]['p95_ms']:8.2f} ms  p99 {results[key]['p99_ms']:8.2f} ms  "
+              f"{results[key]['queries_per_request']:6.1f} q/req  {results[key]['statuses']}")
+
+    for key in skipped:
+        print(f'{key:60s} skipped (no scenario)')
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline['routes'].get(key)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{key}: {metric} {previous[metric]} -> {current[metric]}')
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{key}: queries_per_request {previous['queries_per_request']} -> {current['queries_per_request']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark endpointów API na jednorazowej bazie Postgres')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small', help='rozmiar zbioru danych z synthetic_data.py')
+    parser.add_argument('--seed', type=int, default=42)
+    for name in PRESETS['small']:
+        parser.add_argument(f'--{name.replace("_", "-")}', type=int, help='nadpisuje wartość z presetu')
+    parser.add_argument('--requests', type=int, default=50, help='mierzone żądania na endpoint')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--wsgi', action='store_true', help='użyj prawdziwego serwera WSGI zamiast klienta testowego Flaska')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='dopuszczalny wzrost p50/p95 względem baseline')
+    parser.add_argument('--keep-database', action='store_true')
+    args = parser.parse_args(argv)
+
+    database = f'nutri_bench_{os.getpid()}'
+    create_database(database)
+    os.environ['POSTGRES_DB'] = database
+    os.environ.setdefault('POSTGRES_HOST', 'localhost')
+    os.environ['ADMIN_TOKEN'] = ADMIN_TOKEN
+
+    try:
+        from db_config import db_create_all
+        from synthetic_data import generate_dataset
+
+        db_create_all()
+        dataset = generate_dataset(args.preset, args.seed, **{name: getattr(args, name) for name in PRESETS['small']})
+
+        db = admin_connection(database)
+        ctx = build_context(db, dataset)
+
+        from app import app
+        client = WSGIServerClient(app) if args.wsgi else TestClient(app)
+        try:
+            results = run_benchmark(app, client, db, ctx, {}, args.requests, args.warmup)
+        finally:
+            client.close()
+            db.close()
+    finally:
+        if not args.keep_database:
+            drop_database(database)
+
+    report = {
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ('baseline', 'save_baseline', 'keep_database')},
+        "routes": results
+    }
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
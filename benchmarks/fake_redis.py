@@ -0,0 +1,102 @@
+"""Lokalny serwer zgodny z protokołem Redisa (RESP) do testowania backendu cache.py bez instalowania Redisa.
+
+Obsługuje tylko polecenia używane przez aplikację (PING, AUTH, SELECT, GET, SET [PX ms] [NX], DEL, INCR, FLUSHDB).
+Dane trzymane są w pamięci procesu serwera:
+
+    python -m benchmarks.fake_redis --port 6380
+    CACHE_URL=redis://localhost:6380/0 flask run
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+_data = {}
+_lock = threading.Lock()
+
+def _live(key):
+    item = _data.get(key)
+    if item is not None and item[0] is not None and item[0] <= time.monotonic():
+        del _data[key]
+        return None
+    return item
+
+def _encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, Exception):
+        return f'-ERR {value}\r\n'.encode()
+    return f'+{value}\r\n'.encode()
+
+def execute(args):
+    name = args[0].decode().upper()
+    with _lock:
+        if name == 'PING':
+            return 'PONG'
+        if name in ('AUTH', 'SELECT'):
+            return 'OK'
+        if name == 'FLUSHDB':
+            _data.clear()
+            return 'OK'
+        if name == 'GET':
+            item = _live(args[1])
+            return item[1] if item else None
+        if name == 'SET':
+            key, value, options = args[1], args[2], [arg.decode().upper() for arg in args[3:]]
+            expires_at = None
+            if 'PX' in options:
+                expires_at = time.monotonic() + int(options[options.index('PX') + 1]) / 1000
+            if 'NX' in options and _live(key) is not None:
+                return None
+            _data[key] = (expires_at, value)
+            return 'OK'
+        if name == 'DEL':
+            return sum(1 for key in args[1:] if _live(key) is not None and _data.pop(key))
+        if name == 'INCR':
+            item = _live(args[1])
+            value = int(item[1]) + 1 if item else 1
+            _data[args[1]] = (item[0] if item else None, str(value).encode())
+            return value
+    return Exception(f"unknown command '{name}'")
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()  # polecenie inline, np. "PING" z telnetu
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            if args:
+                self.wfile.write(_encode(execute(args)))
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lokalny serwer RESP dla backendu redis:// w cache.py')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args(argv)
+
+    with FakeRedisServer((args.host, args.port), RespHandler) as server:
+        print(f'Fake Redis listening on {args.host}:{args.port}')
+        server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Pomiar czasu startu workera: import aplikacji i pierwsze żądanie o specyfikację API.
+
+Każdy pomiar wykonywany jest w świeżym interpreterze (jak nowy worker gunicorna lub zimny start kontenera):
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --budget-ms 400 --top 15   # kod 1 po przekroczeniu budżetu
+
+Dodatkowy przebieg z `python -X importtime` pokazuje moduły o największym łącznym czasie importu
+i sprawdza, czy narzędzia CLI nie trafiły do grafu importów aplikacji obsługującej żądania.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Domyślny budżet importu aplikacji (mediana), można nadpisać przez STARTUP_BUDGET_MS lub --budget-ms
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 400))
+
+# Moduły używane tylko przez komendy CLI i budowanie obrazu - nie mogą być importowane przez `import app`
+CLI_ONLY_MODULES = ('seeds', 'db_import', 'synthetic_data', 'build_swagger', 'build_catalog', 'flasgger')
+
+# Uruchamiane w osobnym procesie - wypisuje czasy w sekundach jako JSON
+MEASURE = '''
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get('/apispec_1.json')
+served = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "first_spec_s": served - imported, "spec_status": response.status_code}))
+'''
+
+def _environment():
+    # Pomiar konfiguracji produkcyjnej - bez Swagger UI i profilowania
+    env = dict(os.environ)
+    for name in ('SWAGGER_UI', 'PROFILE_TOKEN', 'PROFILE_ALWAYS'):
+        env.pop(name, None)
+    return env
+
+def measure_boot(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', MEASURE], cwd=PROJECT_DIR, env=_environment(),
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_ms": round(statistics.median(s['import_s'] for s in samples) * 1000, 1),
+        "first_spec_ms": round(statistics.median(s['first_spec_s'] for s in samples) * 1000, 1),
+        "spec_status": samples[-1]['spec_status']
+    }
+
+def parse_importtime(stderr):
+    # Linie w formacie "import time: self [us] | cumulative | imported package", wcięcie nazwy oznacza zagnieżdżenie
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules[name.strip()] = {"self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000}
+    return modules
+
+def measure_imports():
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=PROJECT_DIR,
+                            env=_environment(), capture_output=True, text=True, check=True).stderr
+    return parse_importtime(stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pomiar czasu startu aplikacji')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='liczba modułów z największym łącznym czasem importu')
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS, help='budżet mediany importu aplikacji')
+    args = parser.parse_args(argv)
+
+    result = measure_boot(args.runs)
+    print(f"import app: {result['import_ms']} ms (median of {args.runs}, budget {args.budget_ms:g} ms)")
+    print(f"first GET /apispec_1.json: {result['first_spec_ms']} ms (status {result['spec_status']})")
+
+    modules = measure_imports()
+    print(f"\ntop {args.top} modules by cumulative import time ({len(modules)} modules imported):")
+    for name, times in sorted(modules.items(), key=lambda item: item[1]['cumulative_ms'], reverse=True)[:args.top]:
+        print(f"  {times['cumulative_ms']:8.1f} ms  {times['self_ms']:7.1f} ms self  {name}")
+
+    failed = False
+    leaked = [name for name in CLI_ONLY_MODULES if name in modules]
+    if leaked:
+        print(f"\nCLI-only modules imported while serving: {', '.join(leaked)}")
+        failed = True
+    if result['import_ms'] > args.budget_ms:
+        print(f"\nStartup budget exceeded: {result['import_ms']} ms > {args.budget_ms:g} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+from flask import Blueprint
+
+# Blueprinty z trasami API - każdy moduł endpoints/ ma własny blueprint (nazwy endpointów: "<moduł>.<widok>").
+# Importowane tylko przez create_app() w app.py.
+
+# Monitoring Endpoints
+from endpoints.metrics import get_metrics
+metrics_bp = Blueprint('metrics', __name__)
+metrics_bp.add_url_rule('/metrics', view_func=get_metrics, methods=['GET'])
+
+# Admin Endpoints
+from endpoints.admin import get_slow_queries
+admin_bp = Blueprint('admin', __name__)
+admin_bp.add_url_rule('/admin/slow-queries', view_func=get_slow_queries, methods=['GET'])
+
+# User Endpoints
+from endpoints.users import create_user, get_users, get_user, activate_user, deactivate_user, get_me
+users_bp = Blueprint('users', __name__)
+users_bp.add_url_rule('/users', view_func=create_user, methods=['POST'])
+users_bp.add_url_rule('/users', view_func=get_users, methods=['GET'])
+users_bp.add_url_rule('/users/me', view_func=get_me, methods=['GET'])
+users_bp.add_url_rule('/users/<int:user_id>', view_func=get_user, methods=['GET'])
+users_bp.add_url_rule('/users/<int:user_id>/activate', view_func=activate_user, methods=['GET'])
+users_bp.add_url_rule('/users/<int:user_id>', view_func=deactivate_user, methods=['DELETE'])
+
+# User Details Endpoints
+from endpoints.user_details import create_user_details, update_user_details, get_user_details
+user_details_bp = Blueprint('user_details', __name__)
+user_details_bp.add_url_rule('/users/<int:user_id>/details', view_func=create_user_details, methods=['POST'])
+user_details_bp.add_url_rule('/users/<int:user_id>/details', view_func=update_user_details, methods=['PUT', 'PATCH'])
+user_details_bp.add_url_rule('/users/<int:user_id>/details', view_func=get_user_details, methods=['GET'])
+
+# Diets Endpoints
+from endpoints.diets import create_diet, get_diets, get_diet
+diets_bp = Blueprint('diets', __name__)
+diets_bp.add_url_rule('/diets', view_func=create_diet, methods=['POST'])
+diets_bp.add_url_rule('/diets', view_func=get_diets, methods=['GET'])
+diets_bp.add_url_rule('/diets/<int:diet_id>', view_func=get_diet, methods=['GET'])
+
+# User Diets Endpoints
+from endpoints.user_diets import assign_diet_to_user, remove_diet_from_user, get_user_diets
+user_diets_bp = Blueprint('user_diets', __name__)
+user_diets_bp.add_url_rule('/users/<int:user_id>/diets', view_func=assign_diet_to_user, methods=['POST'])
+user_diets_bp.add_url_rule('/users/<int:user_id>/diets/<int:diet_id>', view_func=remove_diet_from_user, methods=['DELETE'])
+user_diets_bp.add_url_rule('/users/<int:user_id>/diets', view_func=get_user_diets, methods=['GET'])
+
+# Meals Endpoints
+from endpoints.meals import get_meals, get_meal, create_meal, update_meal, search_meals, get_meal_versions, get_meal_nutrients, get_similar_meals
+meals_bp = Blueprint('meals', __name__)
+meals_bp.add_url_rule('/meals', view_func=get_meals, methods=['GET'])
+meals_bp.add_url_rule('/meals/<int:meal_id>', view_func=get_meal, methods=['GET'])
+meals_bp.add_url_rule('/meals/search', view_func=search_meals, methods=['GET'])
+meals_bp.add_url_rule('/meals', view_func=create_meal, methods=['POST'])
+meals_bp.add_url_rule('/meals/<int:meal_id>', view_func=update_meal, methods=['PUT', 'PATCH'])
+# meals_bp.add_url_rule('/meals/<int:meal_id>', view_func=delete_meal, methods=['DELETE']) # Brak możliwości usuwania, do zaimplementowania w przyszłości - wymaga więcej uwagi przez relacje z innymi tabelami (np.: Historia zmian i możliwe relacje historii do food log i food schedule)
+meals_bp.add_url_rule('/meals/<int:meal_id>/versions', view_func=get_meal_versions, methods=['GET'])
+meals_bp.add_url_rule('/meals/<int:meal_id>/nutrients', view_func=get_meal_nutrients, methods=['GET'])
+meals_bp.add_url_rule('/meals/<int:meal_id>/similar', view_func=get_similar_meals, methods=['GET'])
+
+# Meal Categories Endpoints
+from endpoints.meal_category import assign_category_to_meal, remove_category_from_meal, update_category_of_meal, get_meal_categories
+meal_category_bp = Blueprint('meal_category', __name__)
+meal_category_bp.add_url_rule('/meals/categories', view_func=get_meal_categories, methods=['GET'])
+meal_category_bp.add_url_rule('/meals/<int:meal_id>/category/<int:category_id>', view_func=assign_category_to_meal, methods=['POST'])
+meal_category_bp.add_url_rule('/meals/<int:meal_id>/category', view_func=remove_category_from_meal, methods=['DELETE'])
+meal_category_bp.add_url_rule('/meals/<int:meal_id>/category/<int:category_id>', view_func=update_category_of_meal, methods=['PUT'])
+
+# Meal Diet Endpoints
+from endpoints.meal_diet import assign_diet_to_meal, remove_diet_from_meal, update_diet_of_meal
+meal_diet_bp = Blueprint('meal_diet', __name__)
+meal_diet_bp.add_url_rule('/meals/<int:meal_id>/diet/<int:diet_id>', view_func=assign_diet_to_meal, methods=['POST'])
+meal_diet_bp.add_url_rule('/meals/<int:meal_id>/diet', view_func=remove_diet_from_meal, methods=['DELETE'])
+meal_diet_bp.add_url_rule('/meals/<int:meal_id>/diet/<int:diet_id>', view_func=update_diet_of_meal, methods=['PUT'])
+
+# Meal Ingredients Endpoints
+from endpoints.meal_ingredients import get_meal_ingredients, replace_meal_ingredients, add_meal_ingredient, remove_meal_ingredient
+meal_ingredients_bp = Blueprint('meal_ingredients', __name__)
+meal_ingredients_bp.add_url_rule('/meals/<int:meal_id>/ingredients', view_func=get_meal_ingredients, methods=['GET'])
+meal_ingredients_bp.add_url_rule('/meals/<int:meal_id>/ingredients', view_func=replace_meal_ingredients, methods=['PUT'])
+meal_ingredients_bp.add_url_rule('/meals/<int:meal_id>/ingredients', view_func=add_meal_ingredient, methods=['POST'])
+meal_ingredients_bp.add_url_rule('/meals/<int:meal_id>/ingredients/<int:ingredient_id>', view_func=remove_meal_ingredient, methods=['DELETE'])
+
+# Ingredients Endpoints
+
+# Brak POST dla składników - Składniki będą dodawane z formularza dodawania/aktualizacji posiłku
+# Składniki wybrane w posiłku będą importowane do bazy danych z zewnętrznej bazy OpenFoodFacts
+
+from endpoints.ingredients import get_ingredients, get_ingredient_by_id, search_ingredients, typeahead_ingredients
+ingredients_bp = Blueprint('ingredients', __name__)
+ingredients_bp.add_url_rule('/ingredients', view_func=get_ingredients, methods=['GET'])
+ingredients_bp.add_url_rule('/ingredients/<int:ing_id>', view_func=get_ingredient_by_id, methods=['GET'])
+ingredients_bp.add_url_rule('/ingredients/search', view_func=search_ingredients, methods=['GET'])
+ingredients_bp.add_url_rule('/ingredients/typeahead', view_func=typeahead_ingredients, methods=['GET'])
+
+# Food schedule Endpoints
+from endpoints.food_schedule import get_food_schedules, get_food_schedule, create_food_schedule, delete_food_schedule, get_food_schedule_for_user, get_food_schedule_for_user_by_date, create_food_schedule_rule, get_food_schedule_rules_for_user, delete_food_schedule_rule
+food_schedule_bp = Blueprint('food_schedule', __name__)
+food_schedule_bp.add_url_rule('/food/schedules', view_func=get_food_schedules, methods=['GET'])
+food_schedule_bp.add_url_rule('/food/schedules', view_func=create_food_schedule, methods=['POST'])
+food_schedule_bp.add_url_rule('/food/schedules/<int:schedule_id>', view_func=get_food_schedule, methods=['GET'])
+food_schedule_bp.add_url_rule('/food/schedules/<int:schedule_id>', view_func=delete_food_schedule, methods=['DELETE'])
+food_schedule_bp.add_url_rule('/food/schedules/rules', view_func=create_food_schedule_rule, methods=['POST'])
+food_schedule_bp.add_url_rule('/food/schedules/rules/<int:rule_id>', view_func=delete_food_schedule_rule, methods=['DELETE'])
+
+food_schedule_bp.add_url_rule('/users/<int:user_id>/food/schedule', view_func=get_food_schedule_for_user, methods=['GET'])
+food_schedule_bp.add_url_rule('/users/<int:user_id>/food/schedule/rules', view_func=get_food_schedule_rules_for_user, methods=['GET'])
+food_schedule_bp.add_url_rule('/users/<int:user_id>/food/schedule/<date>', view_func=get_food_schedule_for_user_by_date, methods=['GET'])
+
+# Shopping List Endpoints
+from endpoints.shopping_list import generate_shopping_list
+shopping_list_bp = Blueprint('shopping_list', __name__)
+shopping_list_bp.add_url_rule('/users/<int:user_id>/shopping_list', view_func=generate_shopping_list, methods=['GET'])
+
+# Suggestions Endpoints
+from endpoints.suggestions import get_meal_suggestions
+suggestions_bp = Blueprint('suggestions', __name__)
+suggestions_bp.add_url_rule('/users/<int:user_id>/suggestions', view_func=get_meal_suggestions, methods=['GET'])
+
+# Food log Endpoints
+from endpoints.food_logs import get_food_logs, get_food_log, create_food_log, create_food_logs_batch, delete_food_log, calculate_daily_nutrients, get_food_logs_for_user, get_food_logs_by_date_for_user
+food_logs_bp = Blueprint('food_logs', __name__)
+food_logs_bp.add_url_rule('/food/logs', view_func=get_food_logs, methods=['GET'])
+food_logs_bp.add_url_rule('/food/logs/<int:food_log_id>', view_func=get_food_log, methods=['GET'])
+food_logs_bp.add_url_rule('/food/logs', view_func=create_food_log, methods=['POST'])
+food_logs_bp.add_url_rule('/food/logs/batch', view_func=create_food_logs_batch, methods=['POST'])
+food_logs_bp.add_url_rule('/food/logs/<int:food_log_id>', view_func=delete_food_log, methods=['DELETE'])
+
+food_logs_bp.add_url_rule('/users/<int:user_id>/food/log', view_func=get_food_logs_for_user, methods=['GET'])
+food_logs_bp.add_url_rule('/users/<int:user_id>/food/log/<date>', view_func=get_food_logs_by_date_for_user, methods=['GET'])
+
+# Daily Nutrients Endpoints
+food_logs_bp.add_url_rule('/users/<int:user_id>/nutrients/<date>', view_func=calculate_daily_nutrients, methods=['GET'])
+
+# Nutrients Endpoints
+from endpoints.nutrients import compute_nutrients
+nutrients_bp = Blueprint('nutrients', __name__)
+nutrients_bp.add_url_rule('/nutrients/compute', view_func=compute_nutrients, methods=['POST'])
+
+# Login & Register Endpoints
+
+from endpoints.auth import login #, register
+auth_bp = Blueprint('auth', __name__)
+
+auth_bp.add_url_rule('/login', view_func=login, methods=['POST'])
+# auth_bp.add_url_rule('/register', view_func=register, methods=['POST'])
+
+BLUEPRINTS = [metrics_bp, admin_bp, users_bp, user_details_bp, diets_bp, user_diets_bp, meals_bp, meal_category_bp, meal_diet_bp, meal_ingredients_bp, ingredients_bp, food_schedule_bp, shopping_list_bp, suggestions_bp, food_logs_bp, nutrients_bp, auth_bp]
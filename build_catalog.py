@@ -0,0 +1,91 @@
+"""Buduje plik katalogu składników mapowany przez workery (ingredient_catalog.py).
+
+    python build_catalog.py                 # zapis do INGREDIENT_CATALOG_PATH
+    python build_catalog.py --path plik.bin
+    flask build-catalog                     # to samo z poziomu aplikacji
+
+Uruchamiane po imporcie składników i okresowo (np. z crona) na każdym hoście z workerami.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+FETCH_SIZE = 50000
+
+def build_catalog(path):
+    from db_config import connect
+    from ingredient_catalog import FORMAT_VERSION, HEADER, MAGIC, INGREDIENT_CATALOG_RETENTION_S, layout, search_key
+
+    ids, values, names, brands = [], [], [], []
+    conn = connect()
+    try:
+        # Czas sprzed zapytania według zegara bazy - ten sam zegar ustawia ingredients.updated_at, więc worker
+        # pobiera ponownie składniki zmienione od rozpoczęcia budowy (ingredient_macros.py)
+        cursor = conn.cursor()
+        cursor.execute('SELECT extract(epoch FROM clock_timestamp())::float')
+        built_at = cursor.fetchone()[0]
+        cursor.execute('DELETE FROM ingredients_deleted WHERE deleted_at < to_timestamp(%s)', (built_at - INGREDIENT_CATALOG_RETENTION_S,))
+        cursor.close()
+        # Kursor po stronie serwera - miliony wierszy pobierane partiami
+        cursor = conn.cursor(name='ingredient_catalog')
+        cursor.itersize = FETCH_SIZE
+        cursor.execute('''
+            SELECT id, COALESCE(kcal_100g, 0), COALESCE(protein_100g, 0), COALESCE(carbs_100g, 0), COALESCE(fat_100g, 0),
+                   COALESCE(NULLIF(product_name, ''), generic_name, ''), COALESCE(brand, '')
+            FROM ingredients
+            ORDER BY id
+        ''')
+        for row in cursor:
+            ids.append(row[0])
+            values.append(row[1:5])
+            names.append(row[5].encode('utf-8'))
+            brands.append(row[6].encode('utf-8'))
+        cursor.close()
+        conn.commit()
+    finally:
+        conn.close()
+
+    count = len(ids)
+    arrays = {
+        'ids': np.array(ids, dtype=np.int64),
+        'values': np.array(values, dtype=np.float32).reshape(count, 4),
+        'name_offsets': np.concatenate(([0], np.cumsum([len(name) for name in names], dtype=np.int64))),
+        'brand_offsets': np.concatenate(([0], np.cumsum([len(brand) for brand in brands], dtype=np.int64))),
+        'name_order': np.array(sorted(range(count), key=lambda row: search_key(names[row].decode('utf-8'))), dtype=np.int32),
+        'names': np.frombuffer(b''.join(names), dtype=np.uint8),
+        'brands': np.frombuffer(b''.join(brands), dtype=np.uint8),
+    }
+    sections, size = layout(count, len(arrays['names']), len(arrays['brands']))
+
+    # Zapis obok i podmiana przez os.replace() - workery mapują albo stary, albo kompletny nowy plik
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, built_at, count, len(arrays['names']), len(arrays['brands'])))
+        for name, dtype, shape, offset in sections:
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        f.write(b'\0' * (size - f.tell()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count, size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Budowanie katalogu składników mapowanego przez workery')
+    parser.add_argument('--path', default=os.getenv('INGREDIENT_CATALOG_PATH'), help='plik katalogu (domyślnie INGREDIENT_CATALOG_PATH)')
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error('set INGREDIENT_CATALOG_PATH or pass --path')
+
+    started = time.perf_counter()
+    count, size = build_catalog(args.path)
+    print(f'Written {args.path}: {count} ingredients, {size / 2**20:.1f} MB in {time.perf_counter() - started:.1f} s')
+    return 0
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Generuje swagger.json z docstringów widoków (uruchamiane przy budowaniu obrazu i po zmianie dokumentacji endpointów).
+
+    python build_swagger.py          # zapis swagger.json
+    python build_swagger.py --check  # kod 1, jeśli swagger.json jest nieaktualny
+"""
+import argparse
+import json
+import os
+import sys
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Budowanie statycznej specyfikacji API')
+    parser.add_argument('--check', action='store_true', help='tylko sprawdź, czy swagger.json jest aktualny')
+    args = parser.parse_args(argv)
+
+    # Aplikacja bez Swagger UI - build_spec rejestruje własną instancję flasggera
+    os.environ.pop('SWAGGER_UI', None)
+    from app import app
+    from swagger_spec import SWAGGER_SPEC_PATH, build_spec
+
+    spec = json.dumps(build_spec(app), indent=2, sort_keys=True, ensure_ascii=False) + '\n'
+
+    if args.check:
+        current = open(SWAGGER_SPEC_PATH, encoding='utf-8').read() if os.path.exists(SWAGGER_SPEC_PATH) else None
+        if current != spec:
+            print(f'{SWAGGER_SPEC_PATH} is out of date, run: python build_swagger.py')
+            return 1
+        print(f'{SWAGGER_SPEC_PATH} is up to date')
+        return 0
+
+    with open(SWAGGER_SPEC_PATH + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(spec)
+    os.replace(SWAGGER_SPEC_PATH + '.tmp', SWAGGER_SPEC_PATH)
+    print(f'Written {SWAGGER_SPEC_PATH}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
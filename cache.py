@@ -0,0 +1,364 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+from metrics import cache_hit, cache_miss
+
+logger = logging.getLogger('nutri.cache')
+
+# Wspólna warstwa cache. Backend wybiera CACHE_URL:
+#   memory://            - słownik w procesie (domyślnie; zastępstwo lokalne, osobny w każdym workerze)
+#   redis://[:hasło@]host[:port][/db] - serwer zgodny z protokołem Redisa, współdzielony przez workery i kontenery
+#
+# Klucze mają postać CACHE_PREFIX:przestrzeń:v<wersja>:klucz. Unieważnienie całej przestrzeni zwiększa jej wersję,
+# pojedynczy klucz jest usuwany. Wartości zapisywane są jako JSON (daty i Decimal jako tekst).
+# Błąd backendu nigdy nie przerywa żądania - odczyt traktowany jest jak chybienie.
+
+CACHE_URL = os.getenv('CACHE_URL', 'memory://')
+CACHE_PREFIX = os.getenv('CACHE_PREFIX', 'nutri')
+CACHE_DEFAULT_TTL = float(os.getenv('CACHE_DEFAULT_TTL', 300))
+CACHE_MEMORY_MAX_ITEMS = int(os.getenv('CACHE_MEMORY_MAX_ITEMS', 100000))
+CACHE_MEMORY_MAX_BYTES = int(os.getenv('CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_SOCKET_TIMEOUT = float(os.getenv('CACHE_SOCKET_TIMEOUT', 0.5))
+# Jak długo lokalnie pamiętana jest wersja przestrzeni (opóźnienie unieważnienia całej przestrzeni w innych workerach)
+CACHE_VERSION_TTL = float(os.getenv('CACHE_VERSION_TTL', 1))
+# Ochrona przed lawiną chybień: jeden proces liczy wartość, pozostałe czekają na nią najwyżej CACHE_LOCK_WAIT sekund
+CACHE_LOCK_TTL = float(os.getenv('CACHE_LOCK_TTL', 10))
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 2))
+CACHE_LOCK_POLL = 0.05
+# Po błędzie połączenia serwer cache jest pomijany przez tyle sekund (bez czekania na timeout w każdym żądaniu)
+CACHE_RETRY_S = float(os.getenv('CACHE_RETRY_S', 5))
+# Losowe wydłużenie TTL, żeby wpisy zapisane razem nie wygasały jednocześnie
+CACHE_TTL_JITTER = 0.1
+
+class CacheError(Exception):
+    pass
+
+# ==================== BACKENDY ====================
+
+class MemoryBackend:
+    # LRU ograniczone liczbą wpisów i szacowanym rozmiarem w bajtach (klucz + wartość + narzut słownika)
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_items=CACHE_MEMORY_MAX_ITEMS, max_bytes=CACHE_MEMORY_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        # Liczniki (wersje przestrzeni) poza LRU - usunięta wersja przywróciłaby nieaktualne wpisy
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _size(self, key, value):
+        return len(key) + len(value) + self.ENTRY_OVERHEAD
+
+    def _remove(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= self._size(key, item[1])
+
+    def _live(self, key, now):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] <= now:
+            self._remove(key)
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key]).encode()
+            item = self._live(key, time.monotonic())
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        now = time.monotonic()
+        with self._lock:
+            if only_if_missing and self._live(key, now) is not None:
+                return False
+            self._remove(key)
+            self._items[key] = (now + ttl if ttl else None, value)
+            self._bytes += self._size(key, value)
+            while len(self._items) > self.max_items or (self._bytes > self.max_bytes and len(self._items) > 1):
+                self._remove(next(iter(self._items)))
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+class RedisBackend:
+    # Minimalny klient protokołu RESP (GET, SET PX NX, DEL, INCR) - bez dodatkowych zależności.
+    # Jedno połączenie na wątek, otwierane ponownie po fork() i po błędzie.
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip('/') or 0)
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.sock = None
+            local.pid = os.getpid()
+        if local.sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=CACHE_SOCKET_TIMEOUT)
+            local.sock, local.reader = sock, sock.makefile('rb')
+            if self.password:
+                self._send('AUTH', self.password)
+            if self.db:
+                self._send('SELECT', self.db)
+        return local
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise CacheError('Connection closed by cache server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise CacheError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            return None if length < 0 else [self._read_reply(reader) for _ in range(length)]
+        raise CacheError(f'Unexpected reply from cache server: {line!r}')
+
+    def _send(self, *args):
+        local = self._local
+        chunks = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            chunks.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        local.sock.sendall(b''.join(chunks))
+        return self._read_reply(local.reader)
+
+    def command(self, *args):
+        if self._down_until > time.monotonic():
+            raise CacheError('Cache server unavailable')
+        try:
+            self._connection()
+            return self._send(*args)
+        except OSError as e:
+            self._down_until = time.monotonic() + CACHE_RETRY_S
+            self._reset()
+            raise CacheError(str(e)) from e
+        except CacheError:
+            self._reset()
+            raise
+
+    def _reset(self):
+        local = self._local
+        if getattr(local, 'sock', None) is not None:
+            local.sock.close()
+            local.sock = None
+
+    def get(self, key):
+        return self.command('GET', key)
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        args = ['SET', key, value]
+        if ttl:
+            args += ['PX', max(int(ttl * 1000), 1)]
+        if only_if_missing:
+            args.append('NX')
+        return self.command(*args) is not None
+
+    def delete(self, *keys):
+        if keys:
+            self.command('DEL', *keys)
+
+    def incr(self, key):
+        return self.command('INCR', key)
+
+def create_backend(url=CACHE_URL):
+    scheme = urlsplit(url).scheme
+    if scheme == 'memory':
+        return MemoryBackend()
+    if scheme == 'redis':
+        return RedisBackend(url)
+    raise ValueError(f'Unsupported CACHE_URL scheme: {scheme}')
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+# ==================== PRZESTRZENIE NAZW ====================
+
+# Listenery wywoływane przy każdym unieważnieniu jako listener(namespace, key, version) - key None oznacza całą przestrzeń,
+# version to wersja encji po zmianie, jeśli jest znana (np. meal.version ze zdarzenia invalidation_bus.py)
+INVALIDATION_LISTENERS = []
+# version przy invalidate_all() - zdarzenia mogły przepaść, ale nie wiadomo, czy dane się zmieniły
+FLUSH_VERSION = 'flush'
+# Przestrzenie zdarzeń szyny unieważniania (wyzwalacze z db_create_all()) - invalidate_all() obejmuje je także wtedy,
+# gdy proces jeszcze ich nie użył, bo kopie w pamięci (np. ingredient_macros.py) słuchają ich przez listenery
+BUS_NAMESPACES = ('meals', 'ingredients', 'users', 'reference')
+
+_caches = {}
+_key_locks = [threading.Lock() for _ in range(64)]
+
+class Cache:
+    def __init__(self, namespace, ttl=CACHE_DEFAULT_TTL, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._backend = backend
+        self._version = None
+        self._version_read_at = 0.0
+
+    @property
+    def backend(self):
+        return self._backend or get_backend()
+
+    def _version_key(self):
+        return f'{CACHE_PREFIX}:{self.namespace}:version'
+
+    def _current_version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._version_read_at >= CACHE_VERSION_TTL:
+            version = self.backend.get(self._version_key())
+            self._version = int(version) if version is not None else 0
+            self._version_read_at = now
+        return self._version
+
+    def version(self):
+        # Wersja przestrzeni - zmienia się przy każdym clear() (także w innych workerach przy backendzie Redis)
+        try:
+            return self._current_version()
+        except CacheError as e:
+            logger.warning('cache version failed (%s): %s', self.namespace, e)
+            return self._version
+
+    def _key(self, key):
+        return f'{CACHE_PREFIX}:{self.namespace}:v{self._current_version()}:{key}'
+
+    def _ttl(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        return ttl * (1 + random.random() * CACHE_TTL_JITTER) if ttl else None
+
+    def get(self, key):
+        try:
+            data = self.backend.get(self._key(key))
+        except CacheError as e:
+            logger.warning('cache get failed (%s): %s', self.namespace, e)
+            data = None
+        if data is None:
+            cache_miss(self.namespace)
+            return None
+        cache_hit(self.namespace)
+        return json.loads(data)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(self._key(key), json.dumps(value, separators=(',', ':'), default=str).encode(), self._ttl(ttl))
+        except CacheError as e:
+            logger.warning('cache set failed (%s): %s', self.namespace, e)
+
+    def get_or_set(self, key, loader, ttl=None):
+        value = self.get(key)
+        if value is not None:
+            return value
+        # Jeden wątek w procesie i jeden proces (blokada SET NX w backendzie) liczy wartość, reszta czeka na wynik
+        with _key_locks[hash((self.namespace, key)) % len(_key_locks)]:
+            try:
+                data = self.backend.get(self._key(key))
+                if data is not None:
+                    return json.loads(data)
+                lock_key = self._key(key) + ':lock'
+                locked = self.backend.set(lock_key, b'1', CACHE_LOCK_TTL, only_if_missing=True)
+            except CacheError as e:
+                logger.warning('cache lock failed (%s): %s', self.namespace, e)
+                return loader()
+            if not locked:
+                deadline = time.monotonic() + CACHE_LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(CACHE_LOCK_POLL)
+                    try:
+                        data = self.backend.get(self._key(key))
+                    except CacheError:
+                        break
+                    if data is not None:
+                        return json.loads(data)
+                return loader()
+            try:
+                value = loader()
+                self.set(key, value, ttl)
+                return value
+            finally:
+                try:
+                    self.backend.delete(lock_key)
+                except CacheError:
+                    pass
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except CacheError as e:
+            logger.warning('cache delete failed (%s): %s', self.namespace, e)
+
+    def clear(self):
+        try:
+            self._version = self.backend.incr(self._version_key())
+            self._version_read_at = time.monotonic()
+        except CacheError as e:
+            logger.warning('cache clear failed (%s): %s', self.namespace, e)
+
+def get_cache(namespace, ttl=CACHE_DEFAULT_TTL):
+    if namespace not in _caches:
+        _caches[namespace] = Cache(namespace, ttl)
+    return _caches[namespace]
+
+def invalidate(namespace, key=None, version=None):
+    # Wywoływane przez endpointy po zatwierdzeniu zmian: invalidate('meals', meal_id) albo invalidate('reference')
+    cache = get_cache(namespace)
+    if key is None:
+        cache.clear()
+    else:
+        cache.delete(key)
+    for listener in INVALIDATION_LISTENERS:
+        listener(namespace, key, version)
+
+def invalidate_all(shared=True):
+    # Unieważnienie wszystkich znanych przestrzeni - gdy zdarzenia o zmianach mogły zostać utracone.
+    # shared=False - tylko stan procesu (przestrzenie w pamięci procesu i listenery); wersje przestrzeni na
+    # współdzielonym serwerze (Redis) zostają, bo ich podbicie czyści cache wszystkich workerów
+    for namespace in sorted(set(_caches) | set(BUS_NAMESPACES)):
+        cache = get_cache(namespace)
+        if shared or isinstance(cache.backend, MemoryBackend):
+            cache.clear()
+        for listener in INVALIDATION_LISTENERS:
+            listener(namespace, None, FLUSH_VERSION)
@@ -1,20 +1,85 @@
 import psycopg2
 import os
-from dotenv import load_dotenv
+import time
+from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
+from endpoints.meal_history import dedup_meal_compositions
 
-load_dotenv()
+# Funkcje wywoływane po każdym zapytaniu jako listener(cursor, statement, params, duration_s) - rejestruje je np. query_stats.py
+QUERY_LISTENERS = []
+# Funkcje wywoływane przy otwarciu (listener('open', czas_łączenia_s)) i zamknięciu (listener('close', None)) połączenia
+CONNECTION_LISTENERS = []
+# Funkcja zwracająca połączenie z repliką albo None (serwer główny) - rejestruje ją db_routing.py
+CONNECTION_ROUTER = None
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB", "bazaDanych"),
-        user=os.getenv("POSTGRES_USER", "postgres"),
-        password=os.getenv("POSTGRES_PASSWORD", "1234"),
-        host=os.getenv("POSTGRES_HOST", "db"), #db - nazwa kontenera z bazą danych
-        port=os.getenv("POSTGRES_PORT", 5432)
-    )
+_instrumented_cursors = {}
+
+def _instrumented_cursor(cursor_factory):
+    # Podklasa danej klasy kursora (np. RealDictCursor) mierząca czas zapytań, tworzona raz na klasę
+    if cursor_factory not in _instrumented_cursors:
+        class InstrumentedCursor(cursor_factory):
+            def _timed(self, method, query, params, *args):
+                if not QUERY_LISTENERS:
+                    return method(query, params, *args)
+                started = time.perf_counter()
+                try:
+                    return method(query, params, *args)
+                finally:
+                    duration = time.perf_counter() - started
+                    statement = query.as_string(self) if isinstance(query, sql.Composable) else query
+                    for listener in QUERY_LISTENERS:
+                        listener(self, statement, params, duration)
+
+            def execute(self, query, vars=None):
+                return self._timed(super().execute, query, vars)
+
+            def executemany(self, query, vars_list):
+                return self._timed(super().executemany, query, vars_list)
+
+            def copy_expert(self, query, file, size=8192):
+                # Dla COPY "parametrem" jest strumień danych
+                return self._timed(super().copy_expert, query, file, size)
+
+        _instrumented_cursors[cursor_factory] = InstrumentedCursor
+    return _instrumented_cursors[cursor_factory]
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        kwargs['cursor_factory'] = _instrumented_cursor(kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+    def close(self):
+        if not self.closed:
+            for listener in CONNECTION_LISTENERS:
+                listener('close', None)
+        return super().close()
+
+def connect(dsn=None, connection_factory=InstrumentedConnection):
+    # Nowe połączenie z serwerem głównym (parametry POSTGRES_*) albo z podanym DSN (np. repliką)
+    started = time.perf_counter()
+    if dsn:
+        conn = psycopg2.connect(dsn, connection_factory=connection_factory)
+    else:
+        conn = psycopg2.connect(
+            dbname=os.getenv("POSTGRES_DB", "bazaDanych"),
+            user=os.getenv("POSTGRES_USER", "postgres"),
+            password=os.getenv("POSTGRES_PASSWORD", "1234"),
+            host=os.getenv("POSTGRES_HOST", "db"), #db - nazwa kontenera z bazą danych
+            port=os.getenv("POSTGRES_PORT", 5432),
+            connection_factory=connection_factory
+        )
+    for listener in CONNECTION_LISTENERS:
+        listener('open', time.perf_counter() - started)
     return conn
 
+def get_db_connection():
+    # Żądania tylko do odczytu mogą trafić na replikę (db_routing.py), pozostałe zawsze na serwer główny
+    if CONNECTION_ROUTER is not None:
+        conn = CONNECTION_ROUTER()
+        if conn is not None:
+            return conn
+    return connect()
+
 def db_create_all():
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -39,6 +104,44 @@ def db_create_all():
         );
     ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS tsv_idx ON ingredients USING gin(tsv);')
+    # Czas ostatniej zmiany i usunięte id - po nich worker z katalogiem (ingredient_catalog.py) pobiera składniki
+    # zmienione od zbudowania pliku, także gdy zdarzenia szyny unieważniania nie dotarły (przerwa w połączeniu, start workera)
+    cursor.execute('ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ingredients_updated_at_idx ON ingredients (updated_at);')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingredients_deleted (
+            id INTEGER PRIMARY KEY,
+            deleted_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+        );
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ingredients_deleted_at_idx ON ingredients_deleted (deleted_at);')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION ingredients_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION ingredients_record_deleted() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO ingredients_deleted (id) SELECT id FROM changed_rows
+            ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    ''')
+    cursor.execute('DROP TRIGGER IF EXISTS ingredients_touch ON ingredients;')
+    cursor.execute('CREATE TRIGGER ingredients_touch BEFORE UPDATE ON ingredients FOR EACH ROW EXECUTE FUNCTION ingredients_touch();')
+    cursor.execute('DROP TRIGGER IF EXISTS ingredients_record_deleted ON ingredients;')
+    cursor.execute('''
+        CREATE TRIGGER ingredients_record_deleted AFTER DELETE ON ingredients
+        REFERENCING OLD TABLE AS changed_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredients_record_deleted();
+    ''')
+    # Podpowiedzi po prefiksie nazwy bez katalogu (typeahead_ingredients) - to samo wyrażenie co w zapytaniu
+    cursor.execute("CREATE INDEX IF NOT EXISTS ingredients_name_prefix_idx ON ingredients (lower(COALESCE(NULLIF(product_name, ''), generic_name, '')) text_pattern_ops);")
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS "user" (
@@ -65,6 +168,13 @@ def db_create_all():
         );
     ''')
     
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS link_types (
+            id SERIAL PRIMARY KEY,
+            type VARCHAR(32)
+        );
+    ''')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS links (
             id SERIAL PRIMARY KEY,
@@ -76,13 +186,6 @@ def db_create_all():
         );
     ''')
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS link_types (
-            id SERIAL PRIMARY KEY,
-            type VARCHAR(32)
-        );
-    ''')
-    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS diet (
             id SERIAL PRIMARY KEY,
@@ -101,6 +204,14 @@ def db_create_all():
         );
     ''')
     
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meal_category (
+            id SERIAL PRIMARY KEY,
+            category VARCHAR(32),
+            description VARCHAR(255)
+        );
+    ''')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS meal (
             id SERIAL PRIMARY KEY,
@@ -114,14 +225,6 @@ def db_create_all():
         );
     ''')
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS meal_category (
-            id SERIAL PRIMARY KEY,
-            category VARCHAR(32),
-            description VARCHAR(255)
-        );
-    ''')
-    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS meal_ingredients (
             id SERIAL PRIMARY KEY,
@@ -133,14 +236,51 @@ def db_create_all():
         );
     ''')
     
+    # Skład wersji posiłku adresowany skrótem treści - identyczne listy składników zapisywane są raz
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION meal_composition_normalize(ingredients JSONB) RETURNS JSONB AS $$
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'ingredient_id', (e->>'ingredient_id')::integer,
+                'unit', e->>'unit',
+                'quantity', (e->>'quantity')::float8
+            ) ORDER BY (e->>'ingredient_id')::integer), '[]'::jsonb)
+            FROM jsonb_array_elements(ingredients) AS e
+        $$ LANGUAGE SQL IMMUTABLE;
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION meal_composition_hash(ingredients JSONB) RETURNS CHAR(64) AS $$
+            SELECT encode(sha256(convert_to(ingredients::text, 'UTF8')), 'hex')
+        $$ LANGUAGE SQL IMMUTABLE;
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meal_composition (
+            hash CHAR(64) PRIMARY KEY,
+            ingredients JSONB NOT NULL
+        );
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS meal_composition_ingredients_idx ON meal_composition USING gin(ingredients jsonb_path_ops);')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS meal_history (
             id SERIAL PRIMARY KEY,
-            composition JSON,
+            composition JSONB,
+            composition_hash CHAR(64) REFERENCES meal_composition(hash),
             meal_id INTEGER REFERENCES meal(id),
             meal_version INTEGER
         );
     ''')
+    # Migracja baz utworzonych przed wprowadzeniem meal_composition (np. z backup.dump)
+    cursor.execute('''
+        DO $$ BEGIN
+            IF (SELECT data_type FROM information_schema.columns WHERE table_name = 'meal_history' AND column_name = 'composition') = 'json' THEN
+                ALTER TABLE meal_history ALTER COLUMN composition TYPE JSONB USING composition::jsonb;
+            END IF;
+        END $$;
+    ''')
+    cursor.execute('ALTER TABLE meal_history ADD COLUMN IF NOT EXISTS composition_hash CHAR(64) REFERENCES meal_composition(hash);')
+    cursor.execute('CREATE INDEX IF NOT EXISTS meal_history_meal_idx ON meal_history (meal_id, meal_version);')
+    dedup_meal_compositions(cursor)
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS food_schedule (
@@ -151,6 +291,19 @@ def db_create_all():
         );
     ''')
     
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS food_schedule_rule (
+            id SERIAL PRIMARY KEY,
+            meal_history_id INTEGER REFERENCES meal_history(id),
+            user_id INTEGER REFERENCES "user"(id),
+            at_time TIME NOT NULL,
+            weekdays SMALLINT NOT NULL,
+            starts_on DATE NOT NULL,
+            ends_on DATE NOT NULL
+        );
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS food_schedule_rule_user_idx ON food_schedule_rule (user_id, starts_on, ends_on);')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS food_log (
             id SERIAL PRIMARY KEY,
@@ -160,7 +313,58 @@ def db_create_all():
             user_id INTEGER REFERENCES "user"(id)
         );
     ''')
-    
+
+    # Zdarzenia unieważniania cache (invalidation_bus.py): po zatwierdzeniu transakcji każdy worker dostaje
+    # przez NOTIFY {"entity", "id", "version"} zmienionych wierszy; przy ponad 100 wierszach w jednej instrukcji
+    # wysyłane jest jedno zdarzenie z id = null (unieważnienie całej przestrzeni)
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+        DECLARE
+            entity TEXT := TG_ARGV[0];
+            id_column TEXT := TG_ARGV[1];
+            version_column TEXT := TG_ARGV[2];
+            changed BIGINT;
+            event RECORD;
+        BEGIN
+            SELECT count(*) INTO changed FROM changed_rows;
+            IF changed = 0 THEN
+                RETURN NULL;
+            END IF;
+            IF id_column IS NULL OR changed > 100 THEN
+                PERFORM pg_notify('cache_invalidation', json_build_object('entity', entity, 'id', NULL, 'version', txid_current())::text);
+                RETURN NULL;
+            END IF;
+            FOR event IN EXECUTE format('SELECT DISTINCT %I AS id, %s AS version FROM changed_rows', id_column,
+                    CASE WHEN version_column IS NULL THEN 'txid_current()' ELSE quote_ident(version_column) END) LOOP
+                PERFORM pg_notify('cache_invalidation', json_build_object('entity', entity, 'id', event.id, 'version', event.version)::text);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    ''')
+    # (tabela, przestrzeń cache, kolumna id, kolumna wersji, zdarzenia) - nowe składniki i użytkownicy nie mogą być
+    # nieaktualni w cache, więc INSERT do tych tabel (import OpenFoodFacts, rejestracja) nie wysyła zdarzeń
+    invalidation_triggers = [
+        ('meal', 'meals', 'id', 'version', ('INSERT', 'UPDATE', 'DELETE')),
+        ('meal_ingredients', 'meals', 'meal_id', None, ('INSERT', 'UPDATE', 'DELETE')),
+        ('ingredients', 'ingredients', 'id', None, ('UPDATE', 'DELETE')),
+        ('"user"', 'users', 'id', None, ('UPDATE', 'DELETE')),
+        ('diet', 'reference', None, None, ('INSERT', 'UPDATE', 'DELETE')),
+        ('meal_category', 'reference', None, None, ('INSERT', 'UPDATE', 'DELETE')),
+        ('link_types', 'reference', None, None, ('INSERT', 'UPDATE', 'DELETE')),
+    ]
+    for table, entity, id_column, version_column, events in invalidation_triggers:
+        arguments = ', '.join(f"'{argument}'" for argument in (entity, id_column, version_column) if argument)
+        for event in events:
+            name = table.strip('"') + '_cache_invalidation_' + event.lower()
+            transition = 'OLD' if event == 'DELETE' else 'NEW'
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name} ON {table};')
+            cursor.execute(f'''
+                CREATE TRIGGER {name} AFTER {event} ON {table}
+                REFERENCING {transition} TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation({arguments});
+            ''')
+
     conn.commit()
     cursor.close()
     conn.close()
\ No newline at end of file
@@ -1,6 +1,8 @@
 import csv
 import gzip
+import os
 import psycopg2
+import metrics
 from db_config import get_db_connection
 from psycopg2.extras import RealDictCursor
 
@@ -10,7 +12,9 @@ def import_database():
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-    with gzip.open('en.openfoodfacts.org.products.csv.gz', 'rt', encoding='utf-8') as f:
+    # Postęp liczony po pozycji w skompresowanym pliku - liczba wierszy nie jest znana z góry
+    with open('en.openfoodfacts.org.products.csv.gz', 'rb') as raw, gzip.open(raw, 'rt', encoding='utf-8') as f:
+        size = os.fstat(raw.fileno()).st_size
         reader = csv.DictReader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
         i = 0
         for p in reader:
@@ -36,7 +40,13 @@ def import_database():
             # commit every 100 000 records to reduce memory usage and speed up things
             if i % 100_000 == 0:
                 conn.commit()
+                metrics.inc('import_rows_processed_total', value=100_000)
+                metrics.set_gauge('import_progress_ratio', (), raw.tell() / size)
+                metrics.flush()
         conn.commit()
+        metrics.inc('import_rows_processed_total', value=i % 100_000)
+        metrics.set_gauge('import_progress_ratio', (), 1.0)
+        metrics.flush()
 
     cursor.close()
     conn.close()
\ No newline at end of file
@@ -0,0 +1,78 @@
+from flask import request, jsonify
+from endpoints.auth import admin_required
+from slow_queries import recent_slow_queries, SLOW_QUERY_MS, EXPLAIN_SAMPLE_RATE
+
+@admin_required
+def get_slow_queries():
+    """
+    Recently captured slow queries of this worker process
+    ---
+    tags:
+      - Admin
+    security: []
+    parameters:
+      - in: header
+        name: X-Admin-Token
+        type: string
+        required: true
+        description: Value of the ADMIN_TOKEN environment variable
+      - in: query
+        name: limit
+        type: integer
+        description: Number of entries to return (newest first)
+        default: 20
+      - in: query
+        name: with_plan
+        type: boolean
+        description: Return only entries with a captured EXPLAIN (ANALYZE, BUFFERS) plan
+        default: false
+    responses:
+      200:
+        description: Slow queries with redacted parameters
+        schema:
+          type: object
+          properties:
+            threshold_ms:
+              type: number
+            explain_sample_rate:
+              type: number
+            queries:
+              type: array
+              items:
+                type: object
+                properties:
+                  at:
+                    type: string
+                  route:
+                    type: string
+                  duration_ms:
+                    type: number
+                  statement:
+                    type: string
+                  params:
+                    type: array
+                    items:
+                      type: string
+                  plan:
+                    type: string
+      400:
+        description: Invalid limit
+      403:
+        description: Missing or invalid admin token
+    """
+    try:
+        limit = int(request.args.get('limit', 20))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Limit must be a positive integer"}), 400
+
+    queries = recent_slow_queries()
+    if request.args.get('with_plan', 'false').lower() == 'true':
+        queries = [query for query in queries if query['plan']]
+
+    return jsonify({
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain_sample_rate": EXPLAIN_SAMPLE_RATE,
+        "queries": queries[:limit]
+    }), 200
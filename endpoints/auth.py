@@ -1,11 +1,14 @@
 from flask import request, jsonify
-from werkzeug.security import check_password_hash, generate_password_hash
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, verify_jwt_in_request
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from db_config import get_db_connection
+from cache import get_cache
+from passwords import verify_password, hash_password, needs_rehash, PasswordHashingBusy
 from functools import wraps
 import datetime
+import hmac
+import os
 
 def login():
     """
@@ -52,6 +55,13 @@ def login():
           properties:
             error:
               type: string
+      429:
+        description: Too many concurrent logins, retry later
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
     security: []
     """
     data = request.get_json()
@@ -64,17 +74,25 @@ def login():
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-    cursor.execute('SELECT * FROM "user" WHERE email = %s', (email,))
-    user = cursor.fetchone()
+    try:
+        cursor.execute('SELECT * FROM "user" WHERE email = %s', (email,))
+        user = cursor.fetchone()
 
-    cursor.close()
-    conn.close()
+        if not user or not verify_password(user['password'], password):
+            return jsonify({"error": "Invalid email or password"}), 401
+
+        # Skrót zapisany inną metodą lub z innymi parametrami jest przeliczany przy logowaniu - tylko wtedy znamy hasło
+        if needs_rehash(user['password']):
+            cursor.execute('UPDATE "user" SET password = %s WHERE id = %s', (hash_password(password), user['id']))
+            conn.commit()
 
-    if user and check_password_hash(user['password'], password):
         access_token = create_access_token(identity=str(user['id']), expires_delta=datetime.timedelta(hours=1))
         return jsonify({"message": "Login successful", "access_token": access_token}), 200
-    else:
-        return jsonify({"error": "Invalid email or password"}), 401
+    except PasswordHashingBusy:
+        return too_many_requests()
+    finally:
+        cursor.close()
+        conn.close()
 
 
 @jwt_required()
@@ -92,7 +110,28 @@ def get_logged_user():
 
     return user
 
-def login_required(fn, optional_message="You must be logged in to access this resource"):
+def too_many_requests(message="Too many concurrent password operations, retry later"):
+    return jsonify({"error": "Too many requests", "message": message}), 429, {"Retry-After": "1"}
+
+# Stan konta dla login_required(cached=True) - w przestrzeni cache 'users', którą unieważniają aktywacja
+# i dezaktywacja konta (invalidate('users', user_id)) oraz szyna unieważniania; TTL ogranicza opóźnienie bez szyny
+LOGIN_ACTIVE_CACHE_TTL = float(os.getenv('LOGIN_ACTIVE_CACHE_TTL', 30))
+
+def _user_active(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute('SELECT active FROM "user" WHERE id = %s', (user_id,))
+    user = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return bool(user and user['active'])
+
+def login_required(fn=None, optional_message="You must be logged in to access this resource", cached=False):
+    # @login_required albo @login_required(cached=True) - stan konta z cache zamiast zapytania w każdym żądaniu,
+    # dla widoków wywoływanych bardzo często (np. podpowiedzi przy wpisywaniu)
+    if fn is None:
+        return lambda fn: login_required(fn, optional_message, cached)
+
     @wraps(fn)
     def wrapper(*args, **kwargs):
         try:
@@ -100,14 +139,12 @@ def login_required(fn, optional_message="You must be logged in to access this re
             user_id = get_jwt_identity()
             
             # Sprawdzenie, czy użytkownik jest aktywowany
-            conn = get_db_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute('SELECT active FROM "user" WHERE id = %s', (user_id,))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            if cached:
+                active = get_cache('users').get_or_set(user_id, lambda: {"active": _user_active(user_id)}, LOGIN_ACTIVE_CACHE_TTL)['active']
+            else:
+                active = _user_active(user_id)
             
-            if not user or not user['active']:
+            if not active:
                 return jsonify({"error": "Unauthorized", "message": "User account is not activated"}), 401
             
             return fn(*args, **kwargs)
@@ -125,6 +162,18 @@ def anonymous_required(fn, optional_message="You must be logged out to access th
             return fn(*args, **kwargs)
     return wrapper
 
+def admin_required(fn, optional_message="Admin token is required to access this resource"):
+    # Endpointy diagnostyczne - dostęp tylko z tokenem ADMIN_TOKEN w nagłówku X-Admin-Token
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        admin_token = os.getenv('ADMIN_TOKEN')
+        if not admin_token:
+            return jsonify({"error": "Forbidden", "message": "Admin access is not configured"}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+            return jsonify({"error": "Forbidden", "message": optional_message}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
 def verify_identity(user_id, optional_message="You can't perform this action"):
     current_user_id = int(get_jwt_identity())
     checking_user_id = int(user_id)
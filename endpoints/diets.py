@@ -3,6 +3,7 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from db_config import get_db_connection
 from endpoints.auth import login_required
+import reference_data
 
 @login_required
 def create_diet():
@@ -71,6 +72,7 @@ def create_diet():
         new_diet_id = cursor.fetchone()['id']
 
         conn.commit()
+        reference_data.refresh()
         cursor.close()
         conn.close()
 
@@ -149,21 +151,10 @@ def get_diets():
 
         offset = (page - 1) * limit
 
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute('SELECT COUNT(*) FROM diet')
-        total = cursor.fetchone()['count']
-
-        cursor.execute('''
-            SELECT * FROM diet
-            ORDER BY id
-            LIMIT %s OFFSET %s
-        ''', (limit, offset))
-        diets = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+        # Diety z rejestru danych słownikowych (reference_data.py) - bez zapytań do bazy
+        all_diets = reference_data.get_diets()
+        total = len(all_diets)
+        diets = all_diets[offset:offset + limit]
 
         return jsonify({
             "diets": diets,
@@ -174,10 +165,6 @@ def get_diets():
         })
 
     except Exception as e:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
         return jsonify({"error": str(e)}), 500
 
 def get_diet(diet_id):
@@ -220,14 +207,7 @@ def get_diet(diet_id):
               type: string
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute('SELECT * FROM diet WHERE id = %s', (diet_id,))
-        diet = cursor.fetchone()
-
-        cursor.close()
-        conn.close()
+        diet = reference_data.get_diet(diet_id)
 
         if diet:
             return jsonify(diet)
@@ -235,8 +215,4 @@ def get_diet(diet_id):
             return jsonify({"message": "Diet not found"}), 404
 
     except Exception as e:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
@@ -1,10 +1,28 @@
 from flask import request, jsonify
 from datetime import datetime, timedelta
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from db_config import get_db_connection
 from endpoints.auth import login_required, verify_identity
 from flask_jwt_extended import get_jwt_identity
+from endpoints.meal_history import COMPOSITION_JOIN_SQL, COMPOSITION_INGREDIENTS_SQL
+import ingredient_macros
+
+def get_logged_totals(cursor, user_id, start, end):
+    # Sumy (waga, kcal, białko, węglowodany, tłuszcz) posiłków zalogowanych w [start, end). Składniki wszystkich
+    # posiłków pobierane są jednym zapytaniem (dwie tablice), sumy liczy ingredient_macros.py
+    cursor.execute(f'''
+        SELECT
+            COALESCE(array_agg((ingredient->>'ingredient_id')::int), '{{}}') AS ingredient_ids,
+            COALESCE(array_agg(COALESCE((ingredient->>'quantity')::float, 0)), '{{}}') AS quantities
+        FROM food_log fl
+        JOIN meal_history mh ON mh.id = fl.meal_history_id
+        {COMPOSITION_JOIN_SQL}
+        CROSS JOIN LATERAL jsonb_array_elements({COMPOSITION_INGREDIENTS_SQL}) AS ingredient
+        WHERE fl.user_id = %s AND fl.at >= %s AND fl.at < %s
+    ''', (user_id, start, end))
+    composition = cursor.fetchone()
+    return ingredient_macros.totals(composition['ingredient_ids'], composition['quantities'])[0]
 
 # Pobieranie wszystkich logów posiłków
 @login_required
@@ -261,7 +279,7 @@ def create_food_log():
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         # Validate meal_id and meal_version
-        cursor.execute('SELECT * FROM meal_history WHERE meal_id = %s AND meal_version = %s', (data['meal_id'], data['meal_version']))
+        cursor.execute('SELECT id FROM meal_history WHERE meal_id = %s AND meal_version = %s', (data['meal_id'], data['meal_version']))
         meal_history = cursor.fetchone()
         if not meal_history:
             cursor.close()
@@ -298,6 +316,184 @@ def create_food_log():
             conn.rollback()
         return jsonify({"error": "An unexpected error occurred", "message": str(e)}), 500
 
+# Maksymalna liczba wpisów przyjmowana w jednym żądaniu synchronizacji
+FOOD_LOG_BATCH_LIMIT = 1000
+
+# Tworzenie wielu logów posiłków w jednym żądaniu (synchronizacja offline)
+@login_required
+def create_food_logs_batch():
+    """
+    Create many food logs at once
+    ---
+    tags:
+      - Food Logs
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          required:
+            - logs
+          properties:
+            logs:
+              type: array
+              description: Up to 1000 food log entries
+              items:
+                type: object
+                required:
+                  - meal_id
+                  - meal_version
+                  - portion
+                  - at
+                properties:
+                  meal_id:
+                    type: integer
+                  meal_version:
+                    type: integer
+                  portion:
+                    type: number
+                  at:
+                    type: string
+                    format: date-time
+                    description: The time of the meal in 'HH:MM:SS DD-MM-YYYY' format
+    responses:
+      201:
+        description: Food logs created (entries that failed validation are listed in errors)
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+            created:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                  food_log_id:
+                    type: integer
+            errors:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                  error:
+                    type: string
+      400:
+        description: Bad request or no valid entries
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+            errors:
+              type: array
+              items:
+                type: object
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+            message:
+              type: string
+    """
+    conn = None
+    try:
+        data = request.get_json()
+        logs = data.get('logs') if isinstance(data, dict) else None
+
+        if not isinstance(logs, list) or not logs:
+            return jsonify({"error": "logs must be a non-empty list"}), 400
+        if len(logs) > FOOD_LOG_BATCH_LIMIT:
+            return jsonify({"error": f"At most {FOOD_LOG_BATCH_LIMIT} logs can be sent in one request"}), 400
+
+        user_id = get_jwt_identity()
+
+        # Walidacja pól każdego wpisu - błędy zbierane są per wpis zamiast przerywać całe żądanie
+        errors = []
+        entries = []
+        for index, log in enumerate(logs):
+            if not isinstance(log, dict) or not log.get('meal_id') or not log.get('meal_version') or not log.get('portion') or not log.get('at'):
+                errors.append({"index": index, "error": "meal_id, meal_version, portion and at are required"})
+                continue
+            try:
+                meal_id = int(log['meal_id'])
+                meal_version = int(log['meal_version'])
+                portion = float(log['portion'])
+            except (TypeError, ValueError):
+                errors.append({"index": index, "error": "meal_id and meal_version must be integers and portion a number"})
+                continue
+            try:
+                at_time = datetime.strptime(log['at'], '%H:%M:%S %d-%m-%Y')
+            except (TypeError, ValueError):
+                errors.append({"index": index, "error": "Invalid date format. Use 'HH:MM:SS DD-MM-YYYY'"})
+                continue
+            entries.append((index, meal_id, meal_version, portion, at_time))
+
+        if not entries:
+            return jsonify({"error": "No valid food logs", "errors": errors}), 400
+
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        # Wszystkie pary (meal_id, meal_version) rozwiązywane jednym zapytaniem
+        pairs = {(meal_id, meal_version) for _, meal_id, meal_version, _, _ in entries}
+        cursor.execute('''
+            SELECT mh.id, mh.meal_id, mh.meal_version
+            FROM meal_history mh
+            JOIN unnest(%s::int[], %s::int[]) AS p(meal_id, meal_version)
+              ON mh.meal_id = p.meal_id AND mh.meal_version = p.meal_version
+        ''', ([meal_id for meal_id, _ in pairs], [meal_version for _, meal_version in pairs]))
+        meal_history_ids = {(row['meal_id'], row['meal_version']): row['id'] for row in cursor.fetchall()}
+
+        rows = []
+        indexes = []
+        for index, meal_id, meal_version, portion, at_time in entries:
+            meal_history_id = meal_history_ids.get((meal_id, meal_version))
+            if meal_history_id is None:
+                errors.append({"index": index, "error": "Meal history not found for the given ID and version"})
+                continue
+            rows.append((meal_history_id, portion, at_time, user_id))
+            indexes.append(index)
+
+        created = []
+        if rows:
+            # Jeden wielowierszowy INSERT w jednej transakcji
+            inserted = execute_values(cursor, '''
+                INSERT INTO food_log (meal_history_id, portion, at, user_id)
+                VALUES %s
+                RETURNING id
+            ''', rows, page_size=len(rows), fetch=True)
+            created = [{"index": index, "food_log_id": row['id']} for index, row in zip(indexes, inserted)]
+            conn.commit()
+
+        cursor.close()
+        conn.close()
+
+        errors.sort(key=lambda error: error['index'])
+        if not created:
+            return jsonify({"error": "No valid food logs", "errors": errors}), 400
+
+        return jsonify({"message": f"{len(created)} food logs created", "created": created, "errors": errors}), 201
+
+    except psycopg2.IntegrityError as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"error": "An unexpected error occurred", "message": str(e)}), 500
+
 # Usuwanie logu posiłku
 @login_required
 def delete_food_log(food_log_id):
@@ -478,35 +674,7 @@ def calculate_daily_nutrients(user_id, date):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute('''
-            SELECT * FROM food_log
-            WHERE user_id = %s AND at >= %s AND at < %s
-        ''', (user_id, start_date, end_date))
-        food_logs = cursor.fetchall()
-
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        for log in food_logs:
-            cursor.execute('SELECT composition FROM meal_history WHERE id = %s', (log['meal_history_id'],))
-            meal_history = cursor.fetchone()
-            if meal_history:
-                composition = meal_history['composition']
-                ingredients = composition['ingredients']
-                total_weight = sum(ingredient['quantity'] for ingredient in ingredients)
-                for ingredient in ingredients:
-                    cursor.execute('SELECT * FROM ingredients WHERE id = %s', (ingredient['ingredient_id'],))
-                    ingredient_details = cursor.fetchone()
-                    if ingredient_details:
-                        if ingredient_details['kcal_100g']:
-                            total_calories += (ingredient['quantity'] * ingredient_details['kcal_100g']) / 100
-                        if ingredient_details['protein_100g']:
-                            total_protein += (ingredient['quantity'] * ingredient_details['protein_100g']) / 100
-                        if ingredient_details['carbs_100g']:
-                            total_carbs += (ingredient['quantity'] * ingredient_details['carbs_100g']) / 100
-                        if ingredient_details['fat_100g']:
-                            total_fat += (ingredient['quantity'] * ingredient_details['fat_100g']) / 100
+        total_weight, total_calories, total_protein, total_carbs, total_fat = get_logged_totals(cursor, user_id, start_date, end_date).tolist()
 
         response = {
             "date": date,
@@ -5,6 +5,49 @@ from db_config import get_db_connection
 from endpoints.auth import login_required, verify_identity
 from flask_jwt_extended import get_jwt_identity
 
+# Zaplanowane posiłki użytkownika w przedziale [start, end) - pojedyncze wpisy z food_schedule
+# oraz wystąpienia reguł cyklicznych, rozwijane leniwie tylko w obrębie odpytywanego przedziału.
+# generate_series() na datach zwraca timestamptz - rzutowanie d.day::date daje termin (date + time) niezależny
+# od strefy czasowej sesji, tak jak kolumny TIMESTAMP w food_schedule
+SCHEDULE_SLOTS_SQL = '''
+    SELECT fs.id, NULL::integer AS rule_id, fs.meal_history_id, fs.at, fs.user_id
+    FROM food_schedule fs
+    WHERE fs.user_id = %(user_id)s AND fs.at >= %(start)s AND fs.at < %(end)s
+    UNION ALL
+    SELECT NULL::integer AS id, r.id AS rule_id, r.meal_history_id, d.day::date + r.at_time AS at, r.user_id
+    FROM food_schedule_rule r
+    CROSS JOIN LATERAL generate_series(GREATEST(r.starts_on, %(start)s::date), LEAST(r.ends_on, %(end)s::date), interval '1 day') AS d(day)
+    WHERE r.user_id = %(user_id)s AND r.starts_on <= %(end)s::date AND r.ends_on >= %(start)s::date
+      AND r.weekdays & (1 << (EXTRACT(ISODOW FROM d.day::date)::integer - 1)) <> 0
+      AND d.day::date + r.at_time >= %(start)s AND d.day::date + r.at_time < %(end)s
+'''
+
+# Maksymalna długość reguły cyklicznej
+SCHEDULE_RULE_MAX_WEEKS = 52
+
+def get_schedule_slots(cursor, user_id, start=datetime.min, end=datetime.max):
+    cursor.execute(f'''
+        SELECT s.*, mh.composition->'meal' AS meal
+        FROM ({SCHEDULE_SLOTS_SQL}) s
+        JOIN meal_history mh ON mh.id = s.meal_history_id
+        ORDER BY s.at
+    ''', {"user_id": user_id, "start": start, "end": end})
+    return cursor.fetchall()
+
+def _weekdays_mask(weekdays):
+    # Dni tygodnia według ISO (1 - poniedziałek, 7 - niedziela) zapisane jako maska bitowa
+    mask = 0
+    for day in weekdays:
+        if isinstance(day, bool) or not isinstance(day, int) or not 1 <= day <= 7:
+            raise ValueError("weekdays must contain ISO day numbers from 1 (Monday) to 7 (Sunday)")
+        mask |= 1 << (day - 1)
+    if not mask:
+        raise ValueError("weekdays must not be empty")
+    return mask
+
+def _weekdays_list(mask):
+    return [day for day in range(1, 8) if mask & (1 << (day - 1))]
+
 # Pobieranie wszystkich harmonogramów posiłków
 @login_required
 def get_food_schedules():
@@ -252,7 +295,7 @@ def create_food_schedule():
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         # Validate meal_id and meal_version
-        cursor.execute('SELECT * FROM meal_history WHERE meal_id = %s AND meal_version = %s', (data['meal_id'], data['meal_version']))
+        cursor.execute('SELECT id FROM meal_history WHERE meal_id = %s AND meal_version = %s', (data['meal_id'], data['meal_version']))
         meal_history = cursor.fetchone()
         if not meal_history:
             cursor.close()
@@ -366,6 +409,335 @@ def delete_food_schedule(schedule_id):
             conn.close()
         return jsonify({"error": str(e)}), 500
 
+# Tworzenie cyklicznej reguły harmonogramu posiłków
+@login_required
+def create_food_schedule_rule():
+    """
+    Create a recurring food schedule rule
+    ---
+    tags:
+      - Food Schedules
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          required:
+            - meal_id
+            - meal_version
+            - time
+            - weeks
+          properties:
+            meal_id:
+              type: integer
+              description: The ID of the meal
+            meal_version:
+              type: integer
+              description: The version of the meal
+            time:
+              type: string
+              description: The time of the meal in 'HH:MM' format
+            weekdays:
+              type: array
+              description: ISO days of the week (1 - Monday, 7 - Sunday), every day by default
+              items:
+                type: integer
+            starts_on:
+              type: string
+              description: The first day of the rule in 'DD-MM-YYYY' format, today by default
+            weeks:
+              type: integer
+              description: How many weeks the rule lasts (1-52)
+            materialize:
+              type: boolean
+              description: Expand the rule into single food schedules at write time instead of storing the rule
+              default: False
+    responses:
+      201:
+        description: Food schedule rule created
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+            rule_id:
+              type: integer
+            food_schedules_created:
+              type: integer
+      400:
+        description: Bad request
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      404:
+        description: Meal history not found
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    try:
+        data = request.get_json()
+
+        # Validate required fields
+        if not data.get('meal_id') or not data.get('meal_version') or not data.get('time') or not data.get('weeks'):
+            return jsonify({"error": "meal_id, meal_version, time and weeks are required"}), 400
+
+        try:
+            at_time = datetime.strptime(data['time'], '%H:%M').time()
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid time format. Use 'HH:MM'"}), 400
+
+        try:
+            weekdays = _weekdays_mask(data.get('weekdays', list(range(1, 8))))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        weeks = data['weeks']
+        if isinstance(weeks, bool) or not isinstance(weeks, int) or not 1 <= weeks <= SCHEDULE_RULE_MAX_WEEKS:
+            return jsonify({"error": f"weeks must be an integer between 1 and {SCHEDULE_RULE_MAX_WEEKS}"}), 400
+
+        today = datetime.utcnow().date()
+        try:
+            starts_on = datetime.strptime(data['starts_on'], '%d-%m-%Y').date() if data.get('starts_on') else today
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid date format. Use 'DD-MM-YYYY'"}), 400
+        if starts_on < today:
+            return jsonify({"error": "'starts_on' must not be in the past"}), 400
+        ends_on = starts_on + timedelta(weeks=weeks, days=-1)
+
+        user_id = get_jwt_identity()
+
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        params = {
+            "meal_id": data['meal_id'],
+            "meal_version": data['meal_version'],
+            "user_id": user_id,
+            "at_time": at_time,
+            "weekdays": weekdays,
+            "starts_on": starts_on,
+            "ends_on": ends_on,
+            "now": datetime.utcnow()
+        }
+
+        if data.get('materialize'):
+            # Rozwinięcie reguły w pojedyncze wpisy jednym INSERT ... SELECT
+            cursor.execute('''
+                INSERT INTO food_schedule (meal_history_id, at, user_id)
+                SELECT mh.id, d.day::date + %(at_time)s::time, %(user_id)s
+                FROM meal_history mh
+                CROSS JOIN generate_series(%(starts_on)s::date, %(ends_on)s::date, interval '1 day') AS d(day)
+                WHERE mh.meal_id = %(meal_id)s AND mh.meal_version = %(meal_version)s
+                  AND %(weekdays)s & (1 << (EXTRACT(ISODOW FROM d.day::date)::integer - 1)) <> 0
+                  AND d.day::date + %(at_time)s::time > %(now)s
+            ''', params)
+            food_schedules_created = cursor.rowcount
+            rule_id = None
+        else:
+            cursor.execute('''
+                INSERT INTO food_schedule_rule (meal_history_id, user_id, at_time, weekdays, starts_on, ends_on)
+                SELECT mh.id, %(user_id)s, %(at_time)s, %(weekdays)s, %(starts_on)s, %(ends_on)s
+                FROM meal_history mh
+                WHERE mh.meal_id = %(meal_id)s AND mh.meal_version = %(meal_version)s
+                LIMIT 1
+                RETURNING id
+            ''', params)
+            rule = cursor.fetchone()
+            food_schedules_created = 0
+            rule_id = rule['id'] if rule else None
+
+        if rule_id is None and not food_schedules_created:
+            cursor.execute('SELECT 1 FROM meal_history WHERE meal_id = %s AND meal_version = %s', (data['meal_id'], data['meal_version']))
+            meal_history = cursor.fetchone()
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            if not meal_history:
+                return jsonify({"error": "Meal history not found for the given ID and version"}), 404
+            return jsonify({"error": "The rule does not produce any future food schedules"}), 400
+
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        return jsonify({"message": "Food schedule rule created", "rule_id": rule_id, "food_schedules_created": food_schedules_created}), 201
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
+
+# Pobieranie cyklicznych reguł harmonogramu dla danego użytkownika
+@login_required
+def get_food_schedule_rules_for_user(user_id):
+    """
+    Get recurring food schedule rules for a user
+    ---
+    tags:
+      - Food Schedules
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: user_id
+        type: integer
+        required: true
+        description: The ID of the user to retrieve food schedule rules for
+    responses:
+      200:
+        description: A list of food schedule rules
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              meal_history_id:
+                type: integer
+              user_id:
+                type: integer
+              time:
+                type: string
+              weekdays:
+                type: array
+                items:
+                  type: integer
+              starts_on:
+                type: string
+              ends_on:
+                type: string
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    try:
+        verifivation = verify_identity(user_id, 'You can only get food schedules for yourself')
+        if verifivation is not None:
+            return verifivation
+
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        cursor.execute('SELECT * FROM food_schedule_rule WHERE user_id = %s ORDER BY starts_on, at_time', (user_id,))
+        rules = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        return jsonify([{
+            "id": rule['id'],
+            "meal_history_id": rule['meal_history_id'],
+            "user_id": rule['user_id'],
+            "time": rule['at_time'].strftime('%H:%M'),
+            "weekdays": _weekdays_list(rule['weekdays']),
+            "starts_on": rule['starts_on'].strftime('%d-%m-%Y'),
+            "ends_on": rule['ends_on'].strftime('%d-%m-%Y')
+        } for rule in rules])
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
+
+# Usuwanie cyklicznej reguły harmonogramu
+@login_required
+def delete_food_schedule_rule(rule_id):
+    """
+    Delete a recurring food schedule rule
+    ---
+    tags:
+      - Food Schedules
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: rule_id
+        type: integer
+        required: true
+        description: The ID of the food schedule rule to delete
+    responses:
+      200:
+        description: Food schedule rule deleted
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+      404:
+        description: Food schedule rule not found
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+      403:
+        description: Unauthorized
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+            message:
+              type: string
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        cursor.execute('SELECT * FROM food_schedule_rule WHERE id = %s', (rule_id,))
+        rule = cursor.fetchone()
+
+        if not rule:
+            cursor.close()
+            conn.close()
+            return jsonify({"message": "Food schedule rule not found"}), 404
+
+        verifivation = verify_identity(rule['user_id'], 'You can only delete food schedule rules you created')
+        if verifivation is not None:
+            cursor.close()
+            conn.close()
+            return verifivation
+
+        cursor.execute('DELETE FROM food_schedule_rule WHERE id = %s', (rule_id,))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return jsonify({"message": "Food schedule rule deleted"})
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
+
 # Pobieranie zaplanowanych posiłków dla danego użytkownika
 @login_required
 def get_food_schedule_for_user(user_id):
@@ -392,6 +764,10 @@ def get_food_schedule_for_user(user_id):
             properties:
               id:
                 type: integer
+                description: The ID of the food schedule (null for recurring rule occurrences)
+              rule_id:
+                type: integer
+                description: The ID of the recurring rule that produced this occurrence
               meal_history_id:
                 type: integer
               at:
@@ -417,17 +793,7 @@ def get_food_schedule_for_user(user_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute('SELECT * FROM food_schedule WHERE user_id = %s', (user_id,))
-        food_schedules = cursor.fetchall()
-
-        result = []
-        for schedule in food_schedules:
-            cursor.execute('SELECT * FROM meal_history WHERE id = %s', (schedule['meal_history_id'],))
-            meal_history = cursor.fetchone()
-            if meal_history:
-                schedule_details = dict(schedule)
-                schedule_details['meal'] = meal_history['composition']['meal']
-                result.append(schedule_details)
+        result = get_schedule_slots(cursor, user_id)
 
         cursor.close()
         conn.close()
@@ -472,6 +838,10 @@ def get_food_schedule_for_user_by_date(user_id, date):
             properties:
               id:
                 type: integer
+                description: The ID of the food schedule (null for recurring rule occurrences)
+              rule_id:
+                type: integer
+                description: The ID of the recurring rule that produced this occurrence
               meal_history_id:
                 type: integer
               at:
@@ -507,20 +877,7 @@ def get_food_schedule_for_user_by_date(user_id, date):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute('''
-            SELECT * FROM food_schedule
-            WHERE user_id = %s AND at >= %s AND at < %s
-        ''', (user_id, start_date, end_date))
-        food_schedules = cursor.fetchall()
-
-        result = []
-        for schedule in food_schedules:
-            cursor.execute('SELECT * FROM meal_history WHERE id = %s', (schedule['meal_history_id'],))
-            meal_history = cursor.fetchone()
-            if meal_history:
-                schedule_details = dict(schedule)
-                schedule_details['meal'] = meal_history['composition']['meal']
-                result.append(schedule_details)
+        result = get_schedule_slots(cursor, user_id, start_date, end_date)
 
         cursor.close()
         conn.close()
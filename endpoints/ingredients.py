@@ -1,7 +1,12 @@
 from flask import request, jsonify
 from psycopg2.extras import RealDictCursor
 from db_config import get_db_connection
+from single_flight import single_flight
 from endpoints.auth import login_required
+from ingredient_catalog import get_catalog, search_key
+import ingredient_macros
+
+TYPEAHEAD_MAX_RESULTS = 50
 
 @login_required
 def get_ingredients():
@@ -192,6 +197,7 @@ def get_ingredient_by_id(ing_id):
         return jsonify({"message": "Ingredient not found"}), 404
 
 @login_required
+@single_flight()
 def search_ingredients():
     """
     Search for ingredients
@@ -284,4 +290,113 @@ def search_ingredients():
     cursor.close()
     conn.close()
 
-    return jsonify(results)
\ No newline at end of file
+    return jsonify(results)
+# Podpowiedzi nazw przy wpisywaniu - z katalogu mapowanego do pamięci (ingredient_catalog.py) bez zapytań do bazy;
+# stan konta z cache (login_required(cached=True)). Bez katalogu - zapytanie z LIKE po prefiksie
+@login_required(cached=True)
+def typeahead_ingredients():
+    """
+    Suggest ingredients by name prefix
+    ---
+    tags:
+      - Ingredients
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: query
+        type: string
+        required: true
+        description: Beginning of the ingredient name (case-insensitive)
+      - in: query
+        name: top
+        type: integer
+        description: Number of suggestions to return (max 50)
+        default: 10
+    responses:
+      200:
+        description: Ingredients ordered by name
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              product_name:
+                type: string
+              brand:
+                type: string
+              kcal_100g:
+                type: number
+              protein_100g:
+                type: number
+              carbs_100g:
+                type: number
+              fat_100g:
+                type: number
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    import numpy as np
+    query = request.args.get('query', default='', type=str).strip()
+    top = min(request.args.get('top', default=10, type=int), TYPEAHEAD_MAX_RESULTS)
+    if not query or top < 1:
+        return jsonify([])
+
+    catalog = get_catalog()
+    if catalog is not None:
+        # Składniki usunięte od zbudowania katalogu są pomijane - kolejne wiersze, dopóki nie będzie top wyników
+        results = []
+        offset = 0
+        while len(results) < top:
+            rows = catalog.typeahead(query, top, offset)
+            values, found = ingredient_macros.snapshot().macros(catalog.ids[rows])
+            values = np.round(values.astype(np.float64), 2).tolist()
+            results += [
+                {
+                    "id": int(catalog.ids[row]),
+                    "product_name": catalog.name(row),
+                    "brand": catalog.brand(row),
+                    "kcal_100g": kcal, "protein_100g": protein, "carbs_100g": carbs, "fat_100g": fat
+                }
+                for row, (kcal, protein, carbs, fat), exists in zip(rows, values, found) if exists
+            ]
+            if len(rows) < top:
+                break
+            offset += len(rows)
+        return jsonify(results[:top])
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        prefix = search_key(query).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        # Wyrażenie jak w indeksie ingredients_name_prefix_idx (text_pattern_ops); ~<~ - kolejność bajtów, tak jak w katalogu
+        cursor.execute('''
+            SELECT id, COALESCE(NULLIF(product_name, ''), generic_name, '') AS product_name, COALESCE(brand, '') AS brand,
+                   ROUND(COALESCE(kcal_100g, 0)::numeric, 2)::float AS kcal_100g,
+                   ROUND(COALESCE(protein_100g, 0)::numeric, 2)::float AS protein_100g,
+                   ROUND(COALESCE(carbs_100g, 0)::numeric, 2)::float AS carbs_100g,
+                   ROUND(COALESCE(fat_100g, 0)::numeric, 2)::float AS fat_100g
+            FROM ingredients
+            WHERE lower(COALESCE(NULLIF(product_name, ''), generic_name, '')) LIKE %s
+            ORDER BY lower(COALESCE(NULLIF(product_name, ''), generic_name, '')) USING ~<~
+            LIMIT %s
+        ''', (prefix, top))
+        results = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return jsonify(results)
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
@@ -1,6 +1,8 @@
 from flask import request, jsonify
 from psycopg2.extras import RealDictCursor
 from db_config import get_db_connection
+import reference_data
+from cache import invalidate
 from endpoints.auth import login_required, verify_identity
 import datetime
 from endpoints.meal_history import create_meal_history
@@ -37,21 +39,9 @@ def get_meal_categories():
               type: string
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute('SELECT * FROM meal_category')
-        categories = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
-
-        return jsonify([dict(category) for category in categories])
+        # Kategorie z rejestru danych słownikowych (reference_data.py) - bez zapytań do bazy
+        return jsonify(reference_data.get_meal_categories())
     except Exception as e:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
         return jsonify({"error": str(e)}), 500
 
 @login_required
@@ -126,8 +116,7 @@ def assign_category_to_meal(meal_id, category_id):
             conn.close()
             return jsonify({"error": "Category is already assigned to this meal"}), 400
 
-        cursor.execute('SELECT * FROM meal_category WHERE id = %s', (category_id,))
-        category = cursor.fetchone()
+        category = reference_data.get_meal_category(category_id)
         if not category:
             cursor.close()
             conn.close()
@@ -138,11 +127,11 @@ def assign_category_to_meal(meal_id, category_id):
             SET category_id = %s, version = version + 1, last_update = %s
             WHERE id = %s
         ''', (category['id'], datetime.datetime.utcnow().isoformat(), meal_id))
-        conn.commit()
 
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -226,11 +215,11 @@ def remove_category_from_meal(meal_id):
             SET category_id = NULL, version = version + 1, last_update = %s
             WHERE id = %s
         ''', (datetime.datetime.utcnow().isoformat(), meal_id))
-        conn.commit()
 
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -309,8 +298,7 @@ def update_category_of_meal(meal_id, category_id):
             conn.close()
             return verifivation
 
-        cursor.execute('SELECT * FROM meal_category WHERE id = %s', (category_id,))
-        category = cursor.fetchone()
+        category = reference_data.get_meal_category(category_id)
         if not category:
             cursor.close()
             conn.close()
@@ -321,11 +309,11 @@ def update_category_of_meal(meal_id, category_id):
             SET category_id = %s, version = version + 1, last_update = %s
             WHERE id = %s
         ''', (category['id'], datetime.datetime.utcnow().isoformat(), meal_id))
-        conn.commit()
 
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -1,5 +1,7 @@
 from flask import request, jsonify
 from db_config import get_db_connection
+import reference_data
+from cache import invalidate
 from psycopg2.extras import RealDictCursor
 from endpoints.auth import login_required, verify_identity
 from endpoints.meal_history import create_meal_history
@@ -77,8 +79,7 @@ def assign_diet_to_meal(meal_id, diet_id):
             conn.close()
             return jsonify({"error": "Diet is already assigned to this meal"}), 400
 
-        cursor.execute('SELECT * FROM diet WHERE id = %s', (diet_id,))
-        diet = cursor.fetchone()
+        diet = reference_data.get_diet(diet_id)
         if not diet:
             cursor.close()
             conn.close()
@@ -89,11 +90,11 @@ def assign_diet_to_meal(meal_id, diet_id):
             SET diet_id = %s, version = version + 1, last_update = %s
             WHERE id = %s
         ''', (diet['id'], datetime.datetime.utcnow().isoformat(), meal_id))
-        conn.commit()
 
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -178,11 +179,11 @@ def remove_diet_from_meal(meal_id):
             SET diet_id = NULL, version = version + 1, last_update = %s
             WHERE id = %s
         ''', (datetime.datetime.utcnow().isoformat(), meal_id))
-        conn.commit()
 
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -261,8 +262,7 @@ def update_diet_of_meal(meal_id, diet_id):
             conn.close()
             return verifivation
 
-        cursor.execute('SELECT * FROM diet WHERE id = %s', (diet_id,))
-        diet = cursor.fetchone()
+        diet = reference_data.get_diet(diet_id)
         if not diet:
             cursor.close()
             conn.close()
@@ -273,11 +273,11 @@ def update_diet_of_meal(meal_id, diet_id):
             SET diet_id = %s, version = version + 1, last_update = %s
             WHERE id = %s
         ''', (diet['id'], datetime.datetime.utcnow().isoformat(), meal_id))
-        conn.commit()
 
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
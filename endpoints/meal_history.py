@@ -1,23 +1,51 @@
-import json
-from datetime import datetime
+# Lista składników wersji posiłku przechowywana jest raz w meal_composition (adresowana skrótem treści)
+# i współdzielona przez wszystkie wersje o identycznym składzie - meal_history trzyma tylko część "meal"
+COMPOSITION_INGREDIENTS_SQL = "COALESCE(mc.ingredients, mh.composition->'ingredients', '[]'::jsonb)"
+COMPOSITION_SQL = f"jsonb_build_object('meal', mh.composition->'meal', 'ingredients', {COMPOSITION_INGREDIENTS_SQL})"
+COMPOSITION_JOIN_SQL = 'LEFT JOIN meal_composition mc ON mc.hash = mh.composition_hash'
 
 def create_meal_history(cursor, meal_id):
-    cursor.execute('SELECT diet_id, category_id, last_update, version FROM meal WHERE id = %s', (meal_id,))
-    updated_meal = cursor.fetchone()
-
-    # Konwertuj last_update na string
-    if updated_meal['last_update'] is not None:
-        updated_meal['last_update'] = updated_meal['last_update'].isoformat()
-
-    cursor.execute('SELECT ingredient_id, unit, quantity FROM meal_ingredients WHERE meal_id = %s', (meal_id,))
-    updated_ingredients = cursor.fetchall()
-
-    composition = {
-        "meal": updated_meal,
-        "ingredients": updated_ingredients
-    }
+    # Migawka wersji budowana w całości przez Postgresa jednym zapytaniem, w transakcji wywołującego
+    cursor.execute('''
+        WITH m AS (
+            SELECT id, version, jsonb_build_object(
+                'diet_id', diet_id,
+                'category_id', category_id,
+                'last_update', last_update,
+                'version', version
+            ) AS meal
+            FROM meal
+            WHERE id = %(meal_id)s
+        ), c AS (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'ingredient_id', ingredient_id,
+                'unit', unit,
+                'quantity', quantity
+            ) ORDER BY ingredient_id), '[]'::jsonb) AS ingredients
+            FROM meal_ingredients
+            WHERE meal_id = %(meal_id)s
+        ), stored AS (
+            INSERT INTO meal_composition (hash, ingredients)
+            SELECT meal_composition_hash(ingredients), ingredients FROM c
+            ON CONFLICT (hash) DO NOTHING
+        )
+        INSERT INTO meal_history (meal_id, meal_version, composition, composition_hash)
+        SELECT m.id, m.version, jsonb_build_object('meal', m.meal), meal_composition_hash(c.ingredients)
+        FROM m, c
+    ''', {"meal_id": meal_id})
 
+def dedup_meal_compositions(cursor):
+    # Przeniesienie list składników zapisanych bezpośrednio w meal_history do meal_composition
+    cursor.execute('''
+        INSERT INTO meal_composition (hash, ingredients)
+        SELECT DISTINCT meal_composition_hash(meal_composition_normalize(composition->'ingredients')), meal_composition_normalize(composition->'ingredients')
+        FROM meal_history
+        WHERE composition ? 'ingredients'
+        ON CONFLICT (hash) DO NOTHING
+    ''')
     cursor.execute('''
-        INSERT INTO meal_history (meal_id, meal_version, composition)
-        VALUES (%s, %s, %s)
-    ''', (meal_id, updated_meal['version'], json.dumps(composition)))
\ No newline at end of file
+        UPDATE meal_history
+        SET composition_hash = meal_composition_hash(meal_composition_normalize(composition->'ingredients')),
+            composition = composition - 'ingredients'
+        WHERE composition ? 'ingredients'
+    ''')
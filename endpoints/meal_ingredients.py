@@ -1,12 +1,42 @@
 from flask import request, jsonify
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from db_config import get_db_connection
+from single_flight import single_flight
+from cache import invalidate
 from endpoints.auth import login_required, verify_identity
 import datetime
 from endpoints.meal_history import create_meal_history
 
+def parse_meal_ingredients(ingredients):
+    # Walidacja listy składników - każdy składnik może wystąpić w posiłku tylko raz
+    if not isinstance(ingredients, list):
+        raise ValueError("Ingredients must be a list")
+    parsed = {}
+    for ingredient in ingredients:
+        try:
+            ingredient_id = int(ingredient['ingredient_id'])
+            unit = ingredient['unit']
+            quantity = float(ingredient['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each ingredient requires ingredient_id, unit and quantity")
+        if ingredient_id in parsed:
+            raise ValueError(f"Ingredient {ingredient_id} is listed more than once")
+        parsed[ingredient_id] = (unit, quantity)
+    return parsed
+
+def upsert_meal_ingredients(cursor, meal_id, ingredients):
+    # Jeden wielowierszowy INSERT ... ON CONFLICT zamiast osobnego zapytania dla każdego składnika
+    if not ingredients:
+        return
+    execute_values(cursor, '''
+        INSERT INTO meal_ingredients (meal_id, ingredient_id, unit, quantity)
+        VALUES %s
+        ON CONFLICT (meal_id, ingredient_id) DO UPDATE SET unit = EXCLUDED.unit, quantity = EXCLUDED.quantity
+    ''', [(meal_id, ingredient_id, unit, quantity) for ingredient_id, (unit, quantity) in ingredients.items()], page_size=len(ingredients))
+
 @login_required
+@single_flight()
 def get_meal_ingredients(meal_id):
     """
     Get ingredients for a meal
@@ -170,7 +200,7 @@ def replace_meal_ingredients(meal_id):
                     type: number
     responses:
       200:
-        description: Meal ingredients updated successfully
+        description: Meal ingredients updated successfully (or unchanged, in which case no new version is created)
         schema:
           type: object
           properties:
@@ -203,7 +233,10 @@ def replace_meal_ingredients(meal_id):
 
         if data.get('ingredients') is None:
             return jsonify({"error": "Ingredients list is required"}), 400
-        ingredients = data['ingredients']
+        try:
+            ingredients = parse_meal_ingredients(data['ingredients'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -221,13 +254,21 @@ def replace_meal_ingredients(meal_id):
             conn.close()
             return verifivation
 
-        cursor.execute('DELETE FROM meal_ingredients WHERE meal_id = %s', (meal_id,))
+        # Różnica względem aktualnego składu - niezmienione wiersze nie są modyfikowane
+        cursor.execute('SELECT ingredient_id, unit, quantity FROM meal_ingredients WHERE meal_id = %s', (meal_id,))
+        current = {row['ingredient_id']: (row['unit'], row['quantity']) for row in cursor.fetchall()}
 
-        for ingredient_data in ingredients:
-            cursor.execute('''
-                INSERT INTO meal_ingredients (meal_id, ingredient_id, unit, quantity)
-                VALUES (%s, %s, %s, %s)
-            ''', (meal_id, ingredient_data['ingredient_id'], ingredient_data['unit'], ingredient_data['quantity']))
+        changed = {ingredient_id: values for ingredient_id, values in ingredients.items() if current.get(ingredient_id) != values}
+        removed = [ingredient_id for ingredient_id in current if ingredient_id not in ingredients]
+
+        if not changed and not removed:
+            cursor.close()
+            conn.close()
+            return jsonify({"message": "Meal ingredients unchanged"}), 200
+
+        upsert_meal_ingredients(cursor, meal_id, changed)
+        if removed:
+            cursor.execute('DELETE FROM meal_ingredients WHERE meal_id = %s AND ingredient_id = ANY(%s)', (meal_id, removed))
 
         cursor.execute('''
             UPDATE meal
@@ -238,6 +279,7 @@ def replace_meal_ingredients(meal_id):
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -348,6 +390,7 @@ def add_meal_ingredient(meal_id):
             create_meal_history(cursor, meal_id)
 
             conn.commit()
+            invalidate('meals', meal_id)
         except psycopg2.IntegrityError:
             conn.rollback()
             cursor.close()
@@ -443,6 +486,7 @@ def remove_meal_ingredient(meal_id, ingredient_id):
             create_meal_history(cursor, meal_id)
 
             conn.commit()
+            invalidate('meals', meal_id)
         except psycopg2.IntegrityError:
             conn.rollback()
             cursor.close()
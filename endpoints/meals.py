@@ -1,11 +1,18 @@
 from flask import request, jsonify
 import datetime
 from db_config import get_db_connection
+from single_flight import single_flight
+import reference_data
+import meal_nutrients
+from cache import invalidate
 from psycopg2.extras import RealDictCursor
 from endpoints.auth import login_required, verify_identity
 from flask_jwt_extended import get_jwt_identity
 import json
-from endpoints.meal_history import create_meal_history
+from endpoints.meal_history import create_meal_history, COMPOSITION_SQL, COMPOSITION_JOIN_SQL
+from endpoints.meal_ingredients import parse_meal_ingredients, upsert_meal_ingredients
+
+SIMILAR_MAX_RESULTS = 50
 
 @login_required
 def get_meals():
@@ -420,6 +427,11 @@ def create_meal():
 
     if not data.get('name'):
         return jsonify({"error": "Name is required"}), 400
+
+    try:
+        ingredients = parse_meal_ingredients(data.get('ingredients', []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     creator_id = get_jwt_identity()
 
@@ -429,8 +441,7 @@ def create_meal():
 
         category_id = data.get('category_id')
         if category_id:
-            cursor.execute('SELECT id FROM meal_category WHERE id = %s', (category_id,))
-            category = cursor.fetchone()
+            category = reference_data.get_meal_category(category_id)
             if not category:
                 cursor.close()
                 conn.close()
@@ -438,8 +449,7 @@ def create_meal():
 
         diet_id = data.get('diet_id')
         if diet_id:
-            cursor.execute('SELECT id FROM diet WHERE id = %s', (diet_id,))
-            diet = cursor.fetchone()
+            diet = reference_data.get_diet(diet_id)
             if not diet:
                 cursor.close()
                 conn.close()
@@ -452,16 +462,12 @@ def create_meal():
         ''', (data.get('name'), data.get('description', ""), creator_id, diet_id, category_id, 1, datetime.datetime.utcnow()))
         new_meal_id = cursor.fetchone()['id']
 
-        ingredients = data.get('ingredients', [])
-        for ingredient in ingredients:
-            cursor.execute('''
-                INSERT INTO meal_ingredients (meal_id, ingredient_id, unit, quantity)
-                VALUES (%s, %s, %s, %s)
-            ''', (new_meal_id, ingredient['ingredient_id'], ingredient['unit'], ingredient['quantity']))
+        upsert_meal_ingredients(cursor, new_meal_id, ingredients)
 
         create_meal_history(cursor, new_meal_id)
 
         conn.commit()
+        invalidate('meals', new_meal_id)
         cursor.close()
         conn.close()
 
@@ -574,6 +580,7 @@ def update_meal(meal_id):
         create_meal_history(cursor, meal_id)
 
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -655,6 +662,7 @@ def delete_meal(meal_id):
 
         cursor.execute('DELETE FROM meal WHERE id = %s', (meal_id,))
         conn.commit()
+        invalidate('meals', meal_id)
         cursor.close()
         conn.close()
 
@@ -694,8 +702,11 @@ def get_meal_versions(meal_id):
                 type: integer
               meal_version:
                 type: integer
-              composition:
+              composition_hash:
                 type: string
+                description: Content hash of the ingredient list, shared by versions with identical ingredients
+              composition:
+                type: object
       404:
         description: Meal not found
         schema:
@@ -715,7 +726,13 @@ def get_meal_versions(meal_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute('SELECT * FROM meal_history WHERE meal_id = %s', (meal_id,))
+        cursor.execute(f'''
+            SELECT mh.id, mh.meal_id, mh.meal_version, mh.composition_hash, {COMPOSITION_SQL} AS composition
+            FROM meal_history mh
+            {COMPOSITION_JOIN_SQL}
+            WHERE mh.meal_id = %s
+            ORDER BY mh.meal_version
+        ''', (meal_id,))
         meal_versions = cursor.fetchall()
 
         cursor.close()
@@ -733,6 +750,7 @@ def get_meal_versions(meal_id):
         return jsonify({"error": str(e)}), 500
 
 @login_required
+@single_flight()
 def get_meal_nutrients(meal_id):
     """
     Get nutrients of a meal
@@ -794,61 +812,157 @@ def get_meal_nutrients(meal_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute('SELECT * FROM meal WHERE id = %s', (meal_id,))
-        meal = cursor.fetchone()
-        if not meal:
-            cursor.close()
-            conn.close()
+        # Sumy z cache dla bieżącej wersji posiłku, przy chybieniu jedno zapytanie z JOIN (meal_nutrients.py)
+        totals = meal_nutrients.get_meal_nutrients(cursor, meal_id)
+
+        cursor.close()
+        conn.close()
+
+        if totals is None:
             return jsonify({"message": "Meal not found"}), 404
 
-        cursor.execute('SELECT * FROM meal_ingredients WHERE meal_id = %s', (meal_id,))
-        ingredients = cursor.fetchall()
+        if totals['total_weight'] == 0:
+            return jsonify({"message": "No ingredients found for this meal"}), 404
+
+        return jsonify(meal_nutrients.nutrient_summary(
+            totals['total_weight'], totals['total_calories'], totals['total_protein'], totals['total_carbs'], totals['total_fat']))
+
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
+@login_required
+def get_similar_meals(meal_id):
+    """
+    Get meals similar to a meal
+    ---
+    tags:
+      - Meals
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: meal_id
+        type: integer
+        required: true
+        description: The ID of the meal to find similar meals for
+      - in: query
+        name: top
+        type: integer
+        description: Number of similar meals to return (max 50)
+        default: 10
+    responses:
+      200:
+        description: Similar meals ordered from the most similar
+        schema:
+          type: object
+          properties:
+            meal_id:
+              type: integer
+            similar:
+              type: array
+              items:
+                type: object
+                properties:
+                  meal:
+                    type: object
+                    properties:
+                      id:
+                        type: integer
+                      name:
+                        type: string
+                      description:
+                        type: string
+                      diet_id:
+                        type: integer
+                      category_id:
+                        type: integer
+                      version:
+                        type: integer
+                  similarity:
+                    type: number
+                    description: Mean of ingredient overlap and macro similarity (1 - identical)
+                  ingredient_overlap:
+                    type: number
+                    description: Estimated Jaccard index of the ingredient sets
+                  macro_distance:
+                    type: number
+                    description: Distance of the per-100g kcal/protein/carbs/fat profiles (0 - identical)
+      400:
+        description: Bad request
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      404:
+        description: Meal not found
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Import przy pierwszym użyciu - indeks i numpy poza grafem importów startu (benchmarks/startup.py)
+    import meal_similarity
 
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        total_weight = 0
+    top = min(request.args.get('top', default=10, type=int), SIMILAR_MAX_RESULTS)
+    if top < 1:
+        return jsonify({"error": "top must be a positive integer"}), 400
 
-        for ingredient in ingredients:
-            cursor.execute('SELECT * FROM ingredients WHERE id = %s', (ingredient['ingredient_id'],))
-            ingredient_details = cursor.fetchone()
-            if not ingredient_details:
-                continue
+    conn = None
+    cursor = None
+    try:
+        # Kandydaci z indeksu w pamięci (meal_similarity.py), z bazy tylko dane zwracanych posiłków
+        result = meal_similarity.similar_meals(meal_id, top)
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if result is None:
+            # Posiłek mógł powstać po wczytaniu macierzy (np. w innym workerze przy wyłączonej szynie) - 404 tylko,
+            # gdy nie ma go w bazie
+            cursor.execute('SELECT id FROM meal WHERE id = %s', (meal_id,))
+            if cursor.fetchone() is None:
+                cursor.close()
+                conn.close()
+                return jsonify({"message": "Meal not found"}), 404
+            result = meal_similarity.similar_meals(meal_id, top, load=True)
+            if result is None:
+                cursor.close()
+                conn.close()
+                return jsonify({"message": "Meal not found"}), 404  # Usunięty w międzyczasie
+        index, rows, similarity, jaccard, distance = result
 
-            quantity = ingredient['quantity']
-            total_weight += quantity
-            total_calories += ingredient_details['kcal_100g'] * quantity / 100
-            total_protein += ingredient_details['protein_100g'] * quantity / 100
-            total_carbs += ingredient_details['carbs_100g'] * quantity / 100
-            total_fat += ingredient_details['fat_100g'] * quantity / 100
+        meal_ids = index.meal_ids[rows].tolist()
+        cursor.execute('SELECT id, name, description, diet_id, category_id, version FROM meal WHERE id = ANY(%s)', (meal_ids,))
+        meals = {meal['id']: dict(meal) for meal in cursor.fetchall()}
 
         cursor.close()
         conn.close()
 
-        if total_weight == 0:
-            return jsonify({"message": "No ingredients found for this meal"}), 404
-
-        response = {
-            "nutrients": {
-                "total_calories": total_calories,
-                "total_protein": total_protein,
-                "total_carbs": total_carbs,
-                "total_fat": total_fat
-            },
-            "nutrients_per_100g": {
-                "calories": total_calories / total_weight * 100,
-                "protein": total_protein / total_weight * 100,
-                "carbs": total_carbs / total_weight * 100,
-                "fat": total_fat / total_weight * 100
+        similar = [
+            {
+                "meal": meals[similar_id],
+                "similarity": round(score, 4),
+                "ingredient_overlap": round(overlap, 4),
+                "macro_distance": round(macro_distance, 4) if macro_distance == macro_distance else None  # NaN - posiłek bez wagi
             }
-        }
-
-        return jsonify(response)
+            for similar_id, score, overlap, macro_distance in zip(meal_ids, similarity.tolist(), jaccard.tolist(), distance.tolist())
+            if similar_id in meals  # Posiłek usunięty po zbudowaniu indeksu
+        ]
 
+        return jsonify({"meal_id": meal_id, "similar": similar})
     except Exception as e:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,17 @@
+from flask import Response
+from metrics import render
+
+def get_metrics():
+    """
+    Prometheus metrics
+    ---
+    tags:
+      - Monitoring
+    security: []
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics of all worker processes in the Prometheus text exposition format
+    """
+    return Response(render(), mimetype='text/plain; version=0.0.4')
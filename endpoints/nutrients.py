@@ -0,0 +1,115 @@
+from flask import request, jsonify
+import ingredient_macros
+from meal_nutrients import nutrient_summary
+from endpoints.auth import login_required
+from endpoints.meal_ingredients import parse_meal_ingredients
+
+# Stan konta z cache (login_required(cached=True)) - przy trafieniach w pamięci obliczenie nie wykonuje żadnego zapytania
+@login_required(cached=True)
+def compute_nutrients():
+    """
+    Compute nutrients of an unsaved ingredient list
+    ---
+    tags:
+      - Nutrients
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          required:
+            - ingredients
+          properties:
+            ingredients:
+              type: array
+              items:
+                type: object
+                required:
+                  - ingredient_id
+                  - unit
+                  - quantity
+                properties:
+                  ingredient_id:
+                    type: integer
+                  unit:
+                    type: string
+                  quantity:
+                    type: number
+    responses:
+      200:
+        description: Nutrients of the ingredient list
+        schema:
+          type: object
+          properties:
+            nutrients:
+              type: object
+              properties:
+                total_calories:
+                  type: number
+                total_protein:
+                  type: number
+                total_carbs:
+                  type: number
+                total_fat:
+                  type: number
+            nutrients_per_100g:
+              type: object
+              properties:
+                calories:
+                  type: number
+                protein:
+                  type: number
+                carbs:
+                  type: number
+                fat:
+                  type: number
+      400:
+        description: Invalid ingredient list
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      404:
+        description: Some ingredients do not exist
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+            ingredient_ids:
+              type: array
+              items:
+                type: integer
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        ingredients = parse_meal_ingredients(data.get('ingredients'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not ingredients:
+        return jsonify({"error": "At least one ingredient is required"}), 400
+
+    try:
+        totals, missing = ingredient_macros.totals(list(ingredients), [quantity for unit, quantity in ingredients.values()])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    if missing:
+        return jsonify({"error": "Ingredients not found", "ingredient_ids": missing}), 404
+
+    total_weight, total_calories, total_protein, total_carbs, total_fat = totals.tolist()
+    if total_weight <= 0:
+        return jsonify({"error": "Total quantity must be positive"}), 400
+
+    return jsonify(nutrient_summary(total_weight, total_calories, total_protein, total_carbs, total_fat))
@@ -1,10 +1,15 @@
 from flask import request, jsonify
 from datetime import datetime, timedelta
 from db_config import get_db_connection
+from single_flight import single_flight
 from psycopg2.extras import RealDictCursor
 from endpoints.auth import login_required, verify_identity
+from flask_jwt_extended import get_jwt_identity
+from endpoints.food_schedule import SCHEDULE_SLOTS_SQL
+from endpoints.meal_history import COMPOSITION_SQL, COMPOSITION_JOIN_SQL
 
 @login_required
+@single_flight(scope=get_jwt_identity)
 def generate_shopping_list(user_id):
     """
     Generate a shopping list for a user
@@ -128,6 +133,7 @@ def generate_shopping_list(user_id):
             error:
               type: string
     """
+    import numpy as np
     # verifivation = verify_identity(user_id, 'You can only generate shopping list for yourself')
     # if verifivation is not None:
         # return verifivation
@@ -143,86 +149,68 @@ def generate_shopping_list(user_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Pobierz zaplanowane posiłki dla użytkownika na X dni w przód
-        cursor.execute('''
-            SELECT fs.meal_history_id
-            FROM food_schedule fs
-            WHERE fs.user_id = %s AND fs.at >= %s AND fs.at < %s
-        ''', (user_id, start_date, end_date))
+        # Pobierz zaplanowane posiłki dla użytkownika na X dni w przód (razem z wystąpieniami reguł cyklicznych)
+        cursor.execute(f'SELECT s.meal_history_id FROM ({SCHEDULE_SLOTS_SQL}) s', {"user_id": user_id, "start": start_date, "end": end_date})
         food_schedules = cursor.fetchall()
 
-        meals = []
-        ingredients_summary = {}
-
-        for schedule in food_schedules:
-            meal_history_id = schedule['meal_history_id']
-            cursor.execute('SELECT composition FROM meal_history WHERE id = %s', (meal_history_id,))
-            meal_history = cursor.fetchone()
-            if not meal_history:
-                continue
-
-            print(meal_history)
-
-            composition = meal_history['composition']
-            meal = composition['meal']
-            meal_ingredients = composition['ingredients']
-
-            meal_details = {
-                "meal": meal,
-                "ingredients": []
+        # Składy wszystkich zaplanowanych wersji posiłków jednym zapytaniem
+        cursor.execute(f'SELECT mh.id, {COMPOSITION_SQL} AS composition FROM meal_history mh {COMPOSITION_JOIN_SQL} WHERE mh.id = ANY(%s)',
+                       (list({schedule['meal_history_id'] for schedule in food_schedules}),))
+        compositions = {row['id']: row['composition'] for row in cursor.fetchall()}
+        scheduled = [compositions[schedule['meal_history_id']] for schedule in food_schedules if schedule['meal_history_id'] in compositions]
+
+        # Szczegóły wszystkich składników jednym zapytaniem; usuniętych składników nie ma na liście
+        meal_ingredients = [meal_ingredient for composition in scheduled for meal_ingredient in composition['ingredients']]
+        cursor.execute('SELECT * FROM ingredients WHERE id = ANY(%s)', (list({meal_ingredient['ingredient_id'] for meal_ingredient in meal_ingredients}),))
+        ingredients = {}
+        for ingredient in cursor.fetchall():
+            ingredients[ingredient['id']] = {
+                "id": ingredient['id'],
+                "product_name": ingredient['product_name'],
+                "generic_name": ingredient['generic_name'],
+                "kcal_100g": ingredient['kcal_100g'],
+                "protein_100g": ingredient['protein_100g'],
+                "carbs_100g": ingredient['carbs_100g'],
+                "fat_100g": ingredient['fat_100g'],
+                "brand": ingredient['brand'],
+                "barcode": ingredient['barcode'],
+                "image_url": ingredient['image_url'],
+                "labels_tags": ingredient['labels_tags'],
+                "product_quantity": ingredient['product_quantity'],
+                "allergens": ingredient['allergens'],
+                "tsv": ingredient['tsv']
             }
 
-            for meal_ingredient in meal_ingredients:
-                ingredient_id = meal_ingredient['ingredient_id']
-                cursor.execute('SELECT * FROM ingredients WHERE id = %s', (ingredient_id,))
-                ingredient = cursor.fetchone()
-                if not ingredient:
-                    continue
-
-                ingredient_details = {
-                    "ingredient": {
-                        "id": ingredient['id'],
-                        "product_name": ingredient['product_name'],
-                        "generic_name": ingredient['generic_name'],
-                        "kcal_100g": ingredient['kcal_100g'],
-                        "protein_100g": ingredient['protein_100g'],
-                        "carbs_100g": ingredient['carbs_100g'],
-                        "fat_100g": ingredient['fat_100g'],
-                        "brand": ingredient['brand'],
-                        "barcode": ingredient['barcode'],
-                        "image_url": ingredient['image_url'],
-                        "labels_tags": ingredient['labels_tags'],
-                        "product_quantity": ingredient['product_quantity'],
-                        "allergens": ingredient['allergens'],
-                        "tsv": ingredient['tsv']
-                    },
-                    "quantity": meal_ingredient['quantity'],
-                    "unit": meal_ingredient['unit']
-                }
-                meal_details["ingredients"].append(ingredient_details)
-
-                # Dodaj do zbiorczej listy produktów
-                if ingredient['id'] not in ingredients_summary:
-                    ingredients_summary[ingredient['id']] = {
-                        "ingredient": ingredient_details["ingredient"],
-                        "total_quantity": 0,
-                        "unit": meal_ingredient['unit']
-                    }
-                ingredients_summary[ingredient['id']]["total_quantity"] += meal_ingredient['quantity']
-
-            meals.append(meal_details)
-
         cursor.close()
         conn.close()
 
-        # Konwertuj zbiorczą listę produktów do formatu listy
+        meals = []
+        for composition in scheduled:
+            meals.append({
+                "meal": composition['meal'],
+                "ingredients": [
+                    {
+                        "ingredient": ingredients[meal_ingredient['ingredient_id']],
+                        "quantity": meal_ingredient['quantity'],
+                        "unit": meal_ingredient['unit']
+                    }
+                    for meal_ingredient in composition['ingredients'] if meal_ingredient['ingredient_id'] in ingredients
+                ]
+            })
+
+        # Zbiorcza lista produktów: ilości sumowane wektorowo, kolejność i jednostka według pierwszego wystąpienia
+        meal_ingredients = [meal_ingredient for meal_ingredient in meal_ingredients if meal_ingredient['ingredient_id'] in ingredients]
+        ingredient_ids = np.array([meal_ingredient['ingredient_id'] for meal_ingredient in meal_ingredients], dtype=np.int64)
+        quantities = np.array([meal_ingredient['quantity'] or 0 for meal_ingredient in meal_ingredients], dtype=np.float64)
+        unique_ids, first, inverse = np.unique(ingredient_ids, return_index=True, return_inverse=True)
+        total_quantities = np.bincount(inverse, weights=quantities, minlength=len(unique_ids))
         ingredients_summary_list = [
             {
-                "ingredient": details["ingredient"],
-                "total_quantity": details["total_quantity"],
-                "unit": details["unit"]
+                "ingredient": ingredients[int(unique_ids[i])],
+                "total_quantity": float(total_quantities[i]),
+                "unit": meal_ingredients[first[i]]['unit']
             }
-            for details in ingredients_summary.values()
+            for i in np.argsort(first)
         ]
 
         return jsonify({
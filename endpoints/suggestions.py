@@ -0,0 +1,199 @@
+from flask import request, jsonify
+from datetime import datetime, timedelta
+from db_config import get_db_connection
+from psycopg2.extras import RealDictCursor
+from endpoints.auth import login_required, verify_identity
+from endpoints.food_logs import get_logged_totals
+
+SUGGESTIONS_MAX_RESULTS = 50
+
+@login_required
+def get_meal_suggestions(user_id):
+    """
+    Suggest meals that fit the remaining daily goals
+    ---
+    tags:
+      - Suggestions
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: user_id
+        type: integer
+        required: true
+        description: The ID of the user
+      - in: query
+        name: date
+        type: string
+        description: The date in 'DD-MM-YYYY' format (default today, UTC)
+      - in: query
+        name: mealsLeft
+        type: integer
+        description: Number of meals left that day - the remaining goals are split evenly between them
+        default: 1
+      - in: query
+        name: top
+        type: integer
+        description: Number of suggestions to return (max 50)
+        default: 10
+      - in: query
+        name: allowMore
+        type: boolean
+        description: Include meals of diets the user has not explicitly allowed (only disallowed diets are excluded)
+        default: false
+    responses:
+      200:
+        description: Meals ordered from the best fit
+        schema:
+          type: object
+          properties:
+            date:
+              type: string
+            remaining:
+              type: object
+              properties:
+                kcal:
+                  type: number
+                protein:
+                  type: number
+                carbs:
+                  type: number
+                fat:
+                  type: number
+            suggestions:
+              type: array
+              items:
+                type: object
+                properties:
+                  meal:
+                    type: object
+                    properties:
+                      id:
+                        type: integer
+                      name:
+                        type: string
+                      description:
+                        type: string
+                      diet_id:
+                        type: integer
+                      category_id:
+                        type: integer
+                      version:
+                        type: integer
+                  nutrients:
+                    type: object
+                    properties:
+                      total_calories:
+                        type: number
+                      total_protein:
+                        type: number
+                      total_carbs:
+                        type: number
+                      total_fat:
+                        type: number
+                  distance:
+                    type: number
+                    description: Relative distance from the target (0 - exact fit)
+      400:
+        description: Bad request
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      403:
+        description: Unauthorized
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+            message:
+              type: string
+      500:
+        description: Internal server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    # Import przy pierwszym użyciu - macierz posiłków i numpy poza grafem importów startu (benchmarks/startup.py)
+    import meal_suggestions
+
+    verifivation = verify_identity(user_id, 'You can only get suggestions for your own account')
+    if verifivation is not None:
+        return verifivation
+
+    meals_left = request.args.get('mealsLeft', default=1, type=int)
+    top = min(request.args.get('top', default=10, type=int), SUGGESTIONS_MAX_RESULTS)
+    allow_more = request.args.get('allowMore', 'false').lower() == 'true'
+    if meals_left < 1 or top < 1:
+        return jsonify({"error": "mealsLeft and top must be positive integers"}), 400
+
+    date = request.args.get('date')
+    try:
+        start_date = datetime.strptime(date, '%d-%m-%Y') if date else datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use 'DD-MM-YYYY'"}), 400
+    end_date = start_date + timedelta(days=1)
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        cursor.execute('SELECT kcal_goal, protein_goal, carb_goal, fat_goal FROM user_details WHERE user_id = %s', (user_id,))
+        details = cursor.fetchone()
+        goals = [float(details[goal] or 0) for goal in ('kcal_goal', 'protein_goal', 'carb_goal', 'fat_goal')] if details else [0] * 4
+        if not any(goals):
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Set kcal, protein, carb or fat goals in user details first"}), 400
+
+        cursor.execute('SELECT diet_id, allowed FROM user_diets WHERE user_id = %s', (user_id,))
+        user_diets = cursor.fetchall()
+        excluded_diets = [diet['diet_id'] for diet in user_diets if not diet['allowed']]
+        allowed_diets = None if allow_more else [diet['diet_id'] for diet in user_diets if diet['allowed']]
+
+        # Cel posiłku: brakujące do celów dziennych, podzielone równo na pozostałe posiłki
+        eaten = get_logged_totals(cursor, user_id, start_date, end_date)[1:]
+        remaining = [max(goal - value, 0) for goal, value in zip(goals, eaten.tolist())]
+        matrix, rows, distances = meal_suggestions.suggest(
+            [value / meals_left for value in remaining], goals, allowed_diets, excluded_diets, top)
+
+        meal_ids = matrix.meal_ids[rows].tolist()
+        cursor.execute('SELECT id, name, description, diet_id, category_id, version FROM meal WHERE id = ANY(%s)', (meal_ids,))
+        meals = {meal['id']: dict(meal) for meal in cursor.fetchall()}
+
+        cursor.close()
+        conn.close()
+
+        totals = matrix.totals[rows].round(2).tolist()
+        suggestions = [
+            {
+                "meal": meals[meal_id],
+                "nutrients": {
+                    "total_calories": calories,
+                    "total_protein": protein,
+                    "total_carbs": carbs,
+                    "total_fat": fat
+                },
+                "distance": round(distance, 4)
+            }
+            for meal_id, (weight, calories, protein, carbs, fat), distance in zip(meal_ids, totals, distances.tolist())
+            if meal_id in meals  # Posiłek usunięty po zbudowaniu macierzy
+        ]
+
+        return jsonify({
+            "date": start_date.strftime('%d-%m-%Y'),
+            "remaining": dict(zip(('kcal', 'protein', 'carbs', 'fat'), [round(value, 2) for value in remaining])),
+            "suggestions": suggestions
+        })
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        return jsonify({"error": str(e)}), 500
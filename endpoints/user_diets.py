@@ -3,6 +3,7 @@ import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 from db_config import get_db_connection
+import reference_data
 from endpoints.auth import login_required, verify_identity
 
 @login_required
@@ -83,8 +84,7 @@ def assign_diet_to_user(user_id):
             conn.close()
             return jsonify({"message": "User not found"}), 404
 
-        cursor.execute('SELECT id FROM diet WHERE id = %s', (data['diet_id'],))
-        diet = cursor.fetchone()
+        diet = reference_data.get_diet(data['diet_id'])
         if not diet:
             cursor.close()
             conn.close()
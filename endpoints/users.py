@@ -1,12 +1,15 @@
 from db_config import get_db_connection
+import reference_data
+from cache import invalidate
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask import request, jsonify
 import uuid
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
-from werkzeug.security import generate_password_hash, check_password_hash
-from endpoints.auth import get_logged_user, login_required, anonymous_required, verify_identity
+from db_routing import primary_required
+from passwords import hash_password, verify_password, PasswordHashingBusy
+from endpoints.auth import get_logged_user, login_required, anonymous_required, verify_identity, too_many_requests
 import datetime
 
 @login_required
@@ -104,6 +107,13 @@ def create_user():
           properties:
             error:
               type: string
+      429:
+        description: Too many concurrent password operations, retry later
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
       500:
         description: Internal server error
         schema:
@@ -132,7 +142,7 @@ def create_user():
         if cursor.fetchone():
             raise ValueError("Email already exists")
 
-        hashed_password = generate_password_hash(data['password'])
+        hashed_password = hash_password(data['password'])
 
         cursor.execute('''
             INSERT INTO "user" (email, password, email_confirmed, active, created_at)
@@ -146,10 +156,11 @@ def create_user():
 
         cursor.execute('''
             INSERT INTO links (user_id, code, type_id, used, expire_at)
-            VALUES (%s, %s, (SELECT id FROM link_types WHERE type = 'activate'), %s, %s)
-        ''', (new_user_id, activation_code, False, expire_at))
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (new_user_id, activation_code, reference_data.get_link_type_id('activate'), False, expire_at))
 
         conn.commit()
+        invalidate('users', new_user_id)
         cursor.close()
         conn.close()
 
@@ -162,6 +173,11 @@ def create_user():
         if conn:
             conn.rollback()
         return jsonify({"error": "User with this email already exists"}), 400
+
+    except PasswordHashingBusy:
+        cursor.close()
+        conn.close()
+        return too_many_requests()
     
     except Exception as e:
         return jsonify({"error": "An error occurred while creating the user", "message": str(e)}), 500
@@ -337,6 +353,7 @@ def get_user(user_id):
         return jsonify({"error": str(e)}), 500
 
 @anonymous_required
+@primary_required
 def activate_user(user_id):
     """
     Activate a user
@@ -415,9 +432,8 @@ def activate_user(user_id):
         cursor.execute('''
             SELECT links.id, links.expire_at, links.type_id
             FROM links
-            JOIN link_types ON links.type_id = link_types.id
-            WHERE links.user_id = %s AND links.code = %s AND link_types.type = 'activate'
-        ''', (user_id, code))
+            WHERE links.user_id = %s AND links.code = %s AND links.type_id = %s
+        ''', (user_id, code, reference_data.get_link_type_id('activate')))
         link = cursor.fetchone()
 
         if not link:
@@ -429,6 +445,7 @@ def activate_user(user_id):
             cursor.execute('DELETE FROM links WHERE id = %s', (link['id'],))
             cursor.execute('DELETE FROM "user" WHERE id = %s', (user_id,))
             conn.commit()
+            invalidate('users', user_id)
             cursor.close()
             conn.close()
             return jsonify({"error": "Link expired and user deleted"}), 400
@@ -436,6 +453,7 @@ def activate_user(user_id):
         cursor.execute('UPDATE "user" SET active = %s, email_confirmed = %s WHERE id = %s', (True, True, user_id))
         cursor.execute('DELETE FROM links WHERE id = %s', (link['id'],))
         conn.commit()
+        invalidate('users', user_id)
         cursor.close()
         conn.close()
 
@@ -508,6 +526,13 @@ def deactivate_user(user_id):
           properties:
             message:
               type: string
+      429:
+        description: Too many concurrent password operations, retry later
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
       500:
         description: Internal server error
         schema:
@@ -537,17 +562,22 @@ def deactivate_user(user_id):
             conn.close()
             return jsonify({"message": "User not found"}), 404
 
-        if not check_password_hash(user['password'], password):
+        if not verify_password(user['password'], password):
             cursor.close()
             conn.close()
             return jsonify({"error": "Incorrect password"}), 401
 
         cursor.execute('UPDATE "user" SET active = %s WHERE id = %s', (False, user_id))
         conn.commit()
+        invalidate('users', user_id)
         cursor.close()
         conn.close()
 
         return jsonify({"message": "User deactivated"})
+    except PasswordHashingBusy:
+        cursor.close()
+        conn.close()
+        return too_many_requests()
     except Exception as e:
         if cursor:
             cursor.close()
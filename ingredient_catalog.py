@@ -0,0 +1,147 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger('nutri.catalog')
+
+# Katalog składników w pliku mapowanym do pamięci (budowany przez build_catalog.py). Wszystkie workery na hoście
+# mapują ten sam plik tylko do odczytu, więc strony są współdzielone, a koszt pamięci nie rośnie z liczbą workerów.
+# Zawartość: posortowane id, wartości odżywcze (float32 N x 4, jak w ingredient_macros.py), nazwa i marka
+# (UTF-8, z tablicami przesunięć) oraz kolejność wierszy według nazwy dla podpowiedzi (typeahead).
+#
+# Nowy plik zapisywany jest obok i podmieniany przez os.replace(). Worker co INGREDIENT_CATALOG_CHECK_S sekund
+# sprawdza os.stat() i mapuje nowy plik; stare mapowanie znika, gdy nic go już nie używa.
+#
+# INGREDIENT_CATALOG_PATH nieustawione (domyślnie) - katalog nie jest używany.
+#
+# numpy importowany jest w funkcjach, tak jak w ingredient_macros.py - moduł ładuje się przy starcie aplikacji.
+
+INGREDIENT_CATALOG_PATH = os.getenv('INGREDIENT_CATALOG_PATH', '')
+INGREDIENT_CATALOG_CHECK_S = float(os.getenv('INGREDIENT_CATALOG_CHECK_S', 5))
+# Zapas na transakcje zatwierdzone po rozpoczęciu budowy: worker pobiera ponownie składniki z updated_at od
+# built_at - INGREDIENT_CATALOG_OVERLAP_S
+INGREDIENT_CATALOG_OVERLAP_S = float(os.getenv('INGREDIENT_CATALOG_OVERLAP_S', 300))
+# Jak długo trzymane są id usuniętych składników (ingredients_deleted); starszy katalog nie jest używany
+INGREDIENT_CATALOG_RETENTION_S = float(os.getenv('INGREDIENT_CATALOG_RETENTION_S', 7 * 86400))
+
+MAGIC = b'NUTRICAT'
+FORMAT_VERSION = 2
+# magic, wersja formatu, czas rozpoczęcia budowy (zegar bazy, sekundy od epoki), liczba składników, rozmiar nazw, rozmiar marek
+HEADER = struct.Struct('<8sI4xdQQQ')
+ALIGN = 8
+
+def search_key(text):
+    # Klucz porównań podpowiedzi - ten sam przy budowie (sortowanie), przy wyszukiwaniu i w zapytaniu bez katalogu
+    # (lower() w SQL; casefold() różni się np. dla 'ß')
+    return (text or '').lower()
+
+def layout(count, names_size, brands_size):
+    # Sekcje pliku w kolejności zapisu: (nazwa, dtype, kształt, przesunięcie); zwraca też rozmiar pliku
+    import numpy as np
+    sections = [
+        ('ids', np.int64, (count,)),
+        ('values', np.float32, (count, 4)),
+        ('name_offsets', np.int64, (count + 1,)),
+        ('brand_offsets', np.int64, (count + 1,)),
+        ('name_order', np.int32, (count,)),
+        ('names', np.uint8, (names_size,)),
+        ('brands', np.uint8, (brands_size,)),
+    ]
+    result = []
+    offset = HEADER.size
+    for name, dtype, shape in sections:
+        offset = -(-offset // ALIGN) * ALIGN
+        result.append((name, dtype, shape, offset))
+        offset += np.dtype(dtype).itemsize * int(np.prod(shape))
+    return result, offset
+
+def find_rows(sorted_ids, ingredient_ids):
+    # Pozycje ingredient_ids w posortowanej tablicy id; -1 dla brakujących
+    import numpy as np
+    ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+    if not len(sorted_ids):
+        return np.full(len(ingredient_ids), -1, dtype=np.int64)
+    rows = np.minimum(np.searchsorted(sorted_ids, ingredient_ids), len(sorted_ids) - 1)
+    rows[sorted_ids[rows] != ingredient_ids] = -1
+    return rows
+
+class IngredientCatalog:
+    def __init__(self, path):
+        import numpy as np
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.built_at, self.count, names_size, brands_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not an ingredient catalog (format {FORMAT_VERSION})')
+        sections, size = layout(self.count, names_size, brands_size)
+        if len(self._mmap) < size:
+            raise ValueError(f'{path} is truncated')
+        # Tablice bez kopiowania - widoki tylko do odczytu na zmapowany plik
+        for name, dtype, shape, offset in sections:
+            array = np.frombuffer(self._mmap, dtype=dtype, count=int(np.prod(shape)), offset=offset)
+            setattr(self, name, array.reshape(shape))
+
+    def macros(self, ingredient_ids):
+        # (wartości (k, 4) float32, maska znalezionych)
+        import numpy as np
+        rows = find_rows(self.ids, ingredient_ids)
+        found = rows >= 0
+        values = np.zeros((len(rows), 4), dtype=np.float32)
+        values[found] = self.values[rows[found]]
+        return values, found
+
+    def name(self, row):
+        return bytes(self.names[self.name_offsets[row]:self.name_offsets[row + 1]]).decode('utf-8')
+
+    def brand(self, row):
+        return bytes(self.brands[self.brand_offsets[row]:self.brand_offsets[row + 1]]).decode('utf-8')
+
+    def typeahead(self, prefix, limit, offset=0):
+        # Wiersze składników, których nazwa zaczyna się od prefix (bez rozróżniania wielkości liter), w kolejności nazw,
+        # z pominięciem pierwszych offset. Wyszukiwanie binarne po name_order - dekodowanych jest O(log N + limit) nazw
+        prefix = search_key(prefix)
+        order = self.name_order
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if search_key(self.name(order[middle])) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        rows = []
+        for position in range(low + offset, len(order)):
+            row = int(order[position])
+            if not search_key(self.name(row)).startswith(prefix) or len(rows) == limit:
+                break
+            rows.append(row)
+        return rows
+
+_catalog = None
+_checked_at = None
+_lock = threading.Lock()
+
+def get_catalog():
+    # Aktualnie zmapowany katalog albo None (katalog wyłączony lub plik jeszcze nie istnieje)
+    global _catalog, _checked_at
+    if not INGREDIENT_CATALOG_PATH:
+        return None
+    if _checked_at is not None and time.monotonic() - _checked_at < INGREDIENT_CATALOG_CHECK_S:
+        return _catalog
+    with _lock:
+        if _checked_at is not None and time.monotonic() - _checked_at < INGREDIENT_CATALOG_CHECK_S:
+            return _catalog
+        _checked_at = time.monotonic()
+        try:
+            stat = os.stat(INGREDIENT_CATALOG_PATH)
+        except FileNotFoundError:
+            return _catalog  # Plik usunięty - zostaje ostatnie mapowanie
+        if _catalog is None or (stat.st_ino, stat.st_mtime_ns) != (_catalog.stat.st_ino, _catalog.stat.st_mtime_ns):
+            try:
+                _catalog = IngredientCatalog(INGREDIENT_CATALOG_PATH)
+            except (OSError, ValueError) as e:
+                logger.warning('cannot map ingredient catalog: %s', e)
+        return _catalog
@@ -0,0 +1,227 @@
+import os
+import threading
+import time
+
+import ingredient_catalog
+from cache import FLUSH_VERSION, INVALIDATION_LISTENERS
+from db_config import connect
+from ingredient_catalog import INGREDIENT_CATALOG_OVERLAP_S, INGREDIENT_CATALOG_RETENTION_S, find_rows
+from metrics import cache_hit, cache_miss
+
+# Wartości odżywcze składników (kcal, białko, węglowodany, tłuszcz na 100 g) w pamięci procesu, w ciągłych
+# tablicach: posortowane id składników i macierz float32 N x 4 (brak wartości w bazie = 0). Pozycję składnika
+# wyznacza np.searchsorted, więc sumy dla wielu par (składnik, ilość) liczone są jednym mnożeniem macierzy,
+# bez słownika dla każdego wiersza.
+#
+# Gdy dostępny jest katalog mapowany do pamięci (ingredient_catalog.py), jego tablice współdzielone przez workery
+# są bazą, a pamięć procesu trzyma tylko nakładkę: składniki zmienione od zbudowania katalogu (wiersz NaN =
+# składnik usunięty). Bez katalogu w nakładce są wszystkie składniki.
+#
+# Kopia wczytywana jest przy pierwszym użyciu (fabryka aplikacji musi działać bez bazy) i dalej uzupełniana
+# przyrostowo. Tablice nie są modyfikowane w miejscu, tylko podmieniane, więc odczyty nie wymagają blokady:
+#   - zdarzenie 'ingredients' z id (invalidation_bus.py) - przy następnym odczycie pobierane są tylko zmienione składniki,
+#   - zdarzenie bez id (np. duży import) - ponowne wczytanie całości; katalog zbudowany wcześniej przestaje być używany,
+#   - unieważnienie po ponownym połączeniu szyny (FLUSH_VERSION) i nowy plik katalogu - nakładka budowana od nowa
+#     ze składników zmienionych od zbudowania katalogu (ingredients.updated_at, ingredients_deleted), więc zmiany
+#     z czasu przerwy albo sprzed startu workera nie zostają nieaktualne,
+#   - składniki spoza kopii - dociągane jednym zapytaniem przy odczycie,
+#   - co INGREDIENT_MACROS_REFRESH_S sekund - nowe składniki (id większe od największego w kopii), gdy szyna jest wyłączona.
+#
+# numpy importowany jest w funkcjach - moduł (z listenerem) ładuje się przy starcie aplikacji, a import numpy
+# (ok. 90 ms) nie mieści się w budżecie startu workera (benchmarks/startup.py).
+
+INGREDIENT_MACROS_REFRESH_S = float(os.getenv('INGREDIENT_MACROS_REFRESH_S', 60))
+LOAD_BATCH_SIZE = 50000
+
+MACROS_SQL = '''
+    SELECT id, COALESCE(kcal_100g, 0), COALESCE(protein_100g, 0), COALESCE(carbs_100g, 0), COALESCE(fat_100g, 0)
+    FROM ingredients
+'''
+
+class MacroSnapshot:
+    def __init__(self, ids, values, catalog=None):
+        self.ids = ids          # np.int64, rosnąco
+        self.values = values    # np.float32, kształt (len(ids), 4)
+        self.catalog = catalog  # IngredientCatalog pod nakładką albo None
+
+    def macros(self, ingredient_ids):
+        # (wartości (k, 4) float32, maska składników istniejących w bazie)
+        import numpy as np
+        ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+        rows = find_rows(self.ids, ingredient_ids)
+        own = rows >= 0
+        values = np.zeros((len(ingredient_ids), 4), dtype=np.float32)
+        found = np.zeros(len(ingredient_ids), dtype=bool)
+        values[own] = self.values[rows[own]]
+        found[own] = ~np.isnan(values[own, 0])
+        if self.catalog is not None and not own.all():
+            values[~own], found[~own] = self.catalog.macros(ingredient_ids[~own])
+        values[~found] = 0
+        return values, found
+
+    def max_id(self):
+        candidates = [int(self.ids[-1])] if len(self.ids) else [0]
+        if self.catalog is not None and len(self.catalog.ids):
+            candidates.append(int(self.catalog.ids[-1]))
+        return max(candidates)
+
+_snapshot = None
+_refreshed_at = 0
+_lock = threading.Lock()
+# Zmiany zgłoszone przez listener (wątek szyny) - stosowane przy następnym odczycie
+_pending = set()
+_reload = False
+_pending_lock = threading.Lock()
+# Tylko przy katalogu: czas ostatniego unieważnienia całości (time.time())
+_stale_since = 0
+
+def _fetch(where='', params=None, deleted_since=None):
+    # Zawsze serwer główny - odczyt z opóźnionej repliki utrwaliłby w kopii nieaktualne wartości.
+    # Z deleted_since zwraca też id składników usuniętych od tego czasu (epoka, zegar bazy)
+    import numpy as np
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'{MACROS_SQL} {where} ORDER BY id', params)
+        ids, values = [], []
+        while True:
+            batch = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not batch:
+                break
+            array = np.array(batch, dtype=np.float64)
+            ids.append(array[:, 0].astype(np.int64))
+            values.append(array[:, 1:].astype(np.float32))
+        if deleted_since is not None:
+            cursor.execute('SELECT id FROM ingredients_deleted WHERE deleted_at >= to_timestamp(%s)', (deleted_since,))
+            deleted = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    finally:
+        cursor.close()
+        conn.close()
+    if not ids:
+        result = np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float32)
+    else:
+        result = np.concatenate(ids), np.concatenate(values)
+    return result if deleted_since is None else (*result, deleted)
+
+def _merge(snapshot, changed_ids, ids, values):
+    # Nowa kopia bez składników changed_ids i z wierszami pobranymi ponownie; składniki z changed_ids, których
+    # już nie ma w bazie, przesłaniają katalog wierszem NaN
+    import numpy as np
+    if snapshot.catalog is not None:
+        deleted = np.setdiff1d(changed_ids, ids)
+        ids = np.concatenate([ids, deleted])
+        values = np.concatenate([values, np.full((len(deleted), 4), np.nan, dtype=np.float32)])
+    keep = ~np.isin(snapshot.ids, changed_ids)
+    merged_ids = np.concatenate([snapshot.ids[keep], ids])
+    merged_values = np.concatenate([snapshot.values[keep], values])
+    order = np.argsort(merged_ids, kind='stable')
+    return MacroSnapshot(merged_ids[order], merged_values[order], snapshot.catalog)
+
+def _usable_catalog():
+    # Katalog zbudowany przed ostatnim unieważnieniem całości nie zawiera tej zmiany, a dla starszego niż
+    # INGREDIENT_CATALOG_RETENTION_S nie ma już pełnej listy usuniętych składników
+    catalog = ingredient_catalog.get_catalog()
+    if catalog is None or catalog.built_at <= max(_stale_since, time.time() - INGREDIENT_CATALOG_RETENTION_S):
+        return None
+    return catalog
+
+def _catalog_overlay(catalog):
+    # Nakładka ze składników zmienionych, dodanych i usuniętych od rozpoczęcia budowy katalogu (z zapasem na
+    # transakcje zatwierdzone później) - nie zależy od zdarzeń szyny, które mogły nie dotrzeć
+    import numpy as np
+    since = catalog.built_at - INGREDIENT_CATALOG_OVERLAP_S
+    ids, values, deleted = _fetch('WHERE updated_at >= to_timestamp(%s)', (since,), deleted_since=since)
+    empty = MacroSnapshot(np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float32), catalog)
+    return _merge(empty, np.union1d(ids, deleted), ids, values)
+
+def _apply_changes():
+    # Wywoływane pod _lock
+    global _snapshot, _refreshed_at, _reload
+    import numpy as np
+    catalog = _usable_catalog()
+    with _pending_lock:
+        reload = _reload or _snapshot is None or _snapshot.catalog is not catalog
+        changed = list(_pending)
+        _reload = False
+        _pending.clear()
+    try:
+        if reload:
+            _snapshot = _catalog_overlay(catalog) if catalog is not None else MacroSnapshot(*_fetch())
+            _refreshed_at = time.monotonic()
+        if changed and not reload:
+            changed = np.array(changed, dtype=np.int64)
+            _snapshot = _merge(_snapshot, changed, *_fetch('WHERE id = ANY(%s)', (changed.tolist(),)))
+    except Exception:
+        with _pending_lock:
+            _reload = _reload or reload
+            _pending.update(int(ingredient_id) for ingredient_id in changed)
+        raise
+    if time.monotonic() - _refreshed_at >= INGREDIENT_MACROS_REFRESH_S:
+        ids, values = _fetch('WHERE id > %s', (_snapshot.max_id(),))
+        _snapshot = _merge(_snapshot, ids, ids, values)
+        _refreshed_at = time.monotonic()
+
+def snapshot():
+    current = _snapshot
+    if (current is not None and not _pending and not _reload and current.catalog is _usable_catalog()
+            and time.monotonic() - _refreshed_at < INGREDIENT_MACROS_REFRESH_S):
+        return current
+    if current is not None and not _lock.acquire(blocking=False):
+        return current  # Inny wątek właśnie uzupełnia kopię - do tego czasu wystarczy poprzednia
+    if current is None:
+        _lock.acquire()
+    try:
+        if _snapshot is None or _snapshot is current:
+            _apply_changes()
+        return _snapshot
+    finally:
+        _lock.release()
+
+def _load_missing(ingredient_ids):
+    global _snapshot
+    with _lock:
+        missing = ingredient_ids[~_snapshot.macros(ingredient_ids)[1]]
+        if len(missing):
+            ids, values = _fetch('WHERE id = ANY(%s)', (missing.tolist(),))
+            _snapshot = _merge(_snapshot, ids, ids, values)
+        return _snapshot
+
+def macros(ingredient_ids):
+    # (wartości (k, 4) float32 na 100 g, maska składników istniejących w bazie); składniki spoza kopii dociągane są jednym zapytaniem
+    import numpy as np
+    ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+    values, found = snapshot().macros(ingredient_ids)
+    if found.all():
+        cache_hit('ingredient_macros')
+        return values, found
+    cache_miss('ingredient_macros')
+    return _load_missing(ingredient_ids).macros(ingredient_ids)
+
+def totals(ingredient_ids, quantities):
+    # Sumy dla par (składnik, ilość w gramach): (np.array([waga, kcal, białko, węglowodany, tłuszcz]), brakujące id).
+    # Składniki, których nie ma w bazie, są pomijane - także w wadze. Wynik zaokrąglony do 0.01 - dalsze cyfry
+    # pochodziłyby z zapisu wartości w float32, a nie z danych
+    import numpy as np
+    ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+    if not len(ingredient_ids):
+        return np.zeros(5), []
+    values, found = macros(ingredient_ids)
+    quantities = np.asarray(quantities, dtype=np.float64)[found]
+    result = np.concatenate(([quantities.sum()], quantities @ values[found] / 100))
+    return np.round(result, 2), ingredient_ids[~found].tolist()
+
+def _on_invalidate(namespace, key, version):
+    global _reload, _stale_since
+    if namespace != 'ingredients':
+        return
+    with _pending_lock:
+        if key is None:
+            _reload = True
+            # Po ponownym połączeniu szyny wystarczy nakładka odbudowana po updated_at - bez katalogu przeładowanie
+            # pobierałoby całą tabelę w każdym workerze
+            if ingredient_catalog.INGREDIENT_CATALOG_PATH and version != FLUSH_VERSION:
+                _stale_since = time.time()
+        else:
+            _pending.add(int(key))
+
+INVALIDATION_LISTENERS.append(_on_invalidate)
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+from cache import invalidate, invalidate_all
+from db_config import connect
+from metrics import inc
+
+logger = logging.getLogger('nutri.invalidation')
+
+# Szyna unieważniania cache oparta o LISTEN/NOTIFY. Wyzwalacze z db_create_all() wysyłają po zatwierdzeniu
+# transakcji zdarzenia {"entity": przestrzeń, "id": klucz lub null, "version": wersja} na kanale
+# INVALIDATION_CHANNEL. Każdy worker ma wątek z osobnym połączeniem, który nasłuchuje kanału i usuwa
+# odpowiadające klucze (cache.invalidate - także z kopii w pamięci, np. reference_data.py).
+#
+# Zdarzenia wysłane, gdy połączenie było zerwane, przepadają - dlatego po ponownym połączeniu unieważniane są
+# wszystkie przestrzenie. Pierwsze połączenie workera unieważnia tylko stan procesu (kopie w pamięci mogły się
+# zapełnić, zanim szyna zaczęła nasłuchiwać) - przy Redisie podbicie wersji przestrzeni przy każdym starcie workera
+# (np. kolejne workery przy wdrożeniu) czyściłoby cache współdzielony przez wszystkie procesy.
+#
+# INVALIDATION_BUS=0 wyłącza nasłuchiwanie (np. gdy cache nie jest używany).
+
+INVALIDATION_CHANNEL = 'cache_invalidation'
+INVALIDATION_BUS = os.getenv('INVALIDATION_BUS', '1').lower() not in ('0', 'false')
+# Co tyle sekund bez zdarzeń połączenie jest sprawdzane zapytaniem (wykrycie zerwanego połączenia)
+INVALIDATION_KEEPALIVE_S = float(os.getenv('INVALIDATION_KEEPALIVE_S', 30))
+RECONNECT_MIN_S = 0.5
+RECONNECT_MAX_S = 30
+
+_thread_pid = None
+_listened = False  # Czy wątek tego procesu nasłuchiwał już kanału - tylko wtedy zdarzenia mogły przepaść
+_lock = threading.Lock()
+
+def handle_event(payload):
+    try:
+        event = json.loads(payload)
+        namespace = event['entity']
+    except (ValueError, KeyError, TypeError):
+        logger.warning('invalid invalidation event: %r', payload)
+        return
+    inc('cache_invalidation_events_total', (namespace,))
+    invalidate(namespace, event.get('id'), event.get('version'))
+
+def _listen_once():
+    global _listened
+    # Zawsze serwer główny - repliki nie przekazują NOTIFY
+    conn = connect()
+    try:
+        conn.autocommit = True
+        # Kursor bez instrumentacji - zapytania szyny nie trafiają do statystyk żądań
+        cursor = psycopg2.extensions.cursor(conn)
+        cursor.execute(f'LISTEN {INVALIDATION_CHANNEL}')
+
+        if _listened:
+            inc('cache_invalidation_flushes_total')
+            invalidate_all()
+        else:
+            invalidate_all(shared=False)
+        _listened = True
+
+        while True:
+            if select.select([conn], [], [], INVALIDATION_KEEPALIVE_S) == ([], [], []):
+                cursor.execute('SELECT 1')
+                continue
+            conn.poll()
+            while conn.notifies:
+                handle_event(conn.notifies.pop(0).payload)
+    finally:
+        conn.close()
+
+def _listen_forever():
+    delay = RECONNECT_MIN_S
+    while True:
+        started = time.monotonic()
+        try:
+            _listen_once()
+        except Exception as e:
+            logger.warning('invalidation listener disconnected: %s', e)
+        # Ponowne połączenie z wykładniczym odstępem, zerowanym po dłuższym poprawnym działaniu
+        delay = RECONNECT_MIN_S if time.monotonic() - started > RECONNECT_MAX_S else min(delay * 2, RECONNECT_MAX_S)
+        time.sleep(delay)
+
+def ensure_listener():
+    # Wątek uruchamiany leniwie w każdym procesie - po fork() wątki rodzica nie istnieją
+    global _thread_pid
+    if _thread_pid == os.getpid():
+        return
+    with _lock:
+        if _thread_pid != os.getpid():
+            threading.Thread(target=_listen_forever, name='cache-invalidation', daemon=True).start()
+            _thread_pid = os.getpid()
+
+def init_invalidation_bus(app):
+    if INVALIDATION_BUS:
+        app.before_request(ensure_listener)
@@ -0,0 +1,77 @@
+import os
+
+import ingredient_macros
+from cache import INVALIDATION_LISTENERS, get_cache
+
+# Wartości odżywcze posiłków w cache pod kluczem (meal_id, version). Każda zmiana składu posiłku podnosi
+# meal.version, więc wpis dla danej wersji nigdy nie jest nieaktualny i może po prostu wypaść z LRU.
+# Wyjątkiem jest zmiana wartości samego składnika - wtedy czyszczona jest cała przestrzeń.
+
+MEAL_NUTRIENTS_NAMESPACE = 'meal_nutrients'
+# TTL tylko po to, żeby backend Redis mógł usuwać wpisy (polityka volatile-lru)
+MEAL_NUTRIENTS_TTL = float(os.getenv('MEAL_NUTRIENTS_TTL', 24 * 3600))
+# Ile razy ponawiany jest odczyt wersji, gdy posiłek zmienia się w trakcie obliczania - potem wynik bez cache
+MEAL_NUTRIENTS_ATTEMPTS = 3
+
+# Skład wersji posiłku jednym zapytaniem (dwie tablice zamiast wiersza na składnik); sumy liczy ingredient_macros.py.
+# Pozycje bez składnika w bazie są pomijane (także w wadze), brakujące wartości odżywcze liczone są jako 0.
+# version None - bieżąca wersja, jakakolwiek jest
+MEAL_COMPOSITION_QUERY = '''
+    SELECT
+        m.version,
+        COALESCE(array_agg(mi.ingredient_id) FILTER (WHERE mi.ingredient_id IS NOT NULL), '{}') AS ingredient_ids,
+        COALESCE(array_agg(COALESCE(mi.quantity, 0)) FILTER (WHERE mi.ingredient_id IS NOT NULL), '{}') AS quantities
+    FROM meal m
+    LEFT JOIN meal_ingredients mi ON mi.meal_id = m.id
+    WHERE m.id = %(meal_id)s AND (%(any_version)s OR m.version IS NOT DISTINCT FROM %(version)s)
+    GROUP BY m.id
+'''
+
+_cache = get_cache(MEAL_NUTRIENTS_NAMESPACE, MEAL_NUTRIENTS_TTL)
+
+def _compute(cursor, meal_id, version, any_version=False):
+    cursor.execute(MEAL_COMPOSITION_QUERY, {"meal_id": meal_id, "version": version, "any_version": any_version})
+    row = cursor.fetchone()
+    if not row:
+        return None
+    totals, missing = ingredient_macros.totals(row['ingredient_ids'], row['quantities'])
+    return dict(zip(('total_weight', 'total_calories', 'total_protein', 'total_carbs', 'total_fat'), totals.tolist()))
+
+def get_meal_nutrients(cursor, meal_id):
+    # Zwraca sumy (total_weight, total_calories, total_protein, total_carbs, total_fat) albo None, gdy posiłku nie ma
+    for _ in range(MEAL_NUTRIENTS_ATTEMPTS):
+        cursor.execute('SELECT version FROM meal WHERE id = %s', (meal_id,))
+        meal = cursor.fetchone()
+        if not meal:
+            return None
+        version = meal['version']
+        # Równoczesne chybienia dla tego samego klucza liczy jeden wątek/proces (Cache.get_or_set)
+        nutrients = _cache.get_or_set(f'{meal_id}:{version}', lambda: _compute(cursor, meal_id, version))
+        if nutrients is not None:
+            return nutrients
+        # Posiłek zmienił się między odczytem wersji a obliczeniem - ponowny odczyt wersji
+    # Posiłek zmienia się bez przerwy - wynik dla bieżącej wersji bez cache (None, gdy posiłek usunięto)
+    return _compute(cursor, meal_id, None, any_version=True)
+
+def nutrient_summary(total_weight, total_calories, total_protein, total_carbs, total_fat):
+    # Odpowiedź get_meal_nutrients / compute_nutrients: sumy i wartości na 100 g (total_weight > 0)
+    return {
+        "nutrients": {
+            "total_calories": total_calories,
+            "total_protein": total_protein,
+            "total_carbs": total_carbs,
+            "total_fat": total_fat
+        },
+        "nutrients_per_100g": {
+            "calories": total_calories / total_weight * 100,
+            "protein": total_protein / total_weight * 100,
+            "carbs": total_carbs / total_weight * 100,
+            "fat": total_fat / total_weight * 100
+        }
+    }
+
+def _on_invalidate(namespace, key, version):
+    if namespace == 'ingredients':
+        _cache.clear()
+
+INVALIDATION_LISTENERS.append(_on_invalidate)
@@ -0,0 +1,231 @@
+import os
+import threading
+
+import numpy as np
+
+import meal_suggestions
+from ingredient_catalog import find_rows
+
+# Indeks podobnych posiłków nad macierzą z meal_suggestions.py. Podobieństwo dwóch posiłków to średnia z:
+#   - podobieństwa zbiorów składników - estymata współczynnika Jaccarda z sygnatur MinHash (SIGNATURE_SIZE funkcji
+#     skrótu na meal_ingredients.ingredient_id),
+#   - podobieństwa składu - 1 - 2 * odległość euklidesowa wektorów (kcal, białko, węglowodany, tłuszcz) na 100 g
+#     przeskalowanych do [0, 1] (odległość 0.5 i więcej = 0).
+#
+# Do SIMILARITY_CANDIDATES_MAX posiłków oceniane są wszystkie (wynik dokładny). Przy większej liczbie kandydatów
+# wskazują dwa indeksy zamiast przeglądania wszystkich posiłków:
+#   - LSH - sygnatura dzielona jest na BANDS pasm po ROWS wartości; posiłki o identycznym paśmie trafiają do jednego
+#     kubełka (para o współczynniku Jaccarda J jest kandydatem z prawdopodobieństwem 1 - (1 - J^ROWS)^BANDS),
+#   - siatka - każdy wymiar wektora składu dzielony na GRID przedziałów o równej liczbie posiłków (kwantyle);
+#     kandydatami są posiłki z kolejnych pierścieni komórek wokół komórki posiłku (najbliższe najpierw), aż do
+#     SIMILARITY_CANDIDATES_MAX.
+# Oba indeksy to posortowane tablice kluczy (np.searchsorted), więc zapytanie nie zależy liniowo od liczby posiłków.
+# Wynik jest wtedy przybliżony - pominięty może zostać posiłek o średnim pokryciu składników i dalekim składzie;
+# zmierzona trafność (readme.md) dotyczy domyślnych parametrów.
+#
+# Aktualizacja przyrostowa: po zmianie posiłków (meal_suggestions.changes_since) liczone są tylko ich sygnatury,
+# a posiłki zmienione od zbudowania indeksów trafiają do listy "dirty" - są pomijane w indeksach i sprawdzane
+# bezpośrednio. Po zmianie wartości składników budowana jest od nowa tylko siatka (sygnatury zależą wyłącznie od
+# id składników). Oba indeksy budowane są od nowa, gdy lista przekroczy SIMILARITY_DIRTY_MAX posiłków albo po
+# ponownym wczytaniu macierzy.
+
+SIGNATURE_SIZE = 32
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+GRID = 8
+# Skala wektora składu na 100 g: kcal, białko, węglowodany, tłuszcz
+FEATURE_SCALE = np.array([900, 100, 100, 100], dtype=np.float64)
+SIMILARITY_DIRTY_MAX = int(os.getenv('SIMILARITY_DIRTY_MAX', 1000))
+SIMILARITY_CANDIDATES_MAX = int(os.getenv('SIMILARITY_CANDIDATES_MAX', 5000))
+MINHASH_CHUNK = 65536
+
+EMPTY = np.iinfo(np.uint32).max  # Sygnatura posiłku bez składników
+_PRIME = np.uint64(4294967311)  # Liczba pierwsza > 2^32
+# Stałe ziarno - te same funkcje skrótu we wszystkich workerach
+_random = np.random.default_rng(20240601)
+_HASH_A = _random.integers(1, int(_PRIME), SIGNATURE_SIZE, dtype=np.uint64)
+_HASH_B = _random.integers(0, int(_PRIME), SIGNATURE_SIZE, dtype=np.uint64)
+
+def minhash(meal_ids, pair_meal_ids, pair_ingredient_ids):
+    # Sygnatury (len(meal_ids), SIGNATURE_SIZE) uint32 dla posiłków meal_ids z par (posiłek, składnik)
+    signatures = np.full((len(meal_ids), SIGNATURE_SIZE), EMPTY, dtype=np.uint32)
+    rows = find_rows(meal_ids, pair_meal_ids)
+    valid = rows >= 0
+    order = np.argsort(rows[valid], kind='stable')
+    rows = rows[valid][order]
+    ingredient_ids = pair_ingredient_ids[valid][order].astype(np.uint64)
+    for start in range(0, len(rows), MINHASH_CHUNK):
+        chunk_rows = rows[start:start + MINHASH_CHUNK]
+        hashes = ((ingredient_ids[start:start + MINHASH_CHUNK, None] * _HASH_A + _HASH_B) % _PRIME).astype(np.uint32)
+        # Pary posortowane po posiłku - minimum w każdej grupie; posiłek przecięty granicą porcji łączy np.minimum
+        starts = np.flatnonzero(np.r_[True, chunk_rows[1:] != chunk_rows[:-1]])
+        targets = chunk_rows[starts]
+        signatures[targets] = np.minimum(signatures[targets], np.minimum.reduceat(hashes, starts, axis=0))
+    return signatures
+
+def features(matrix):
+    # Wektory składu na 100 g w [0, 1]; NaN dla posiłków bez składników
+    weights = matrix.totals[:, :1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vectors = np.clip(matrix.totals[:, 1:] / weights * 100 / FEATURE_SCALE, 0, 1)
+    vectors[weights[:, 0] <= 0] = np.nan
+    return vectors
+
+def _band_keys(signatures):
+    # Klucze pasm (len, BANDS) uint64 - ROWS = 2 wartości uint32 w jednym kluczu
+    bands = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    return (bands[:, :, 0] << np.uint64(32)) | bands[:, :, 1]
+
+# Przesunięcia komórek siatki w pierścieniach: _OFFSETS[_RINGS[r]:_RINGS[r + 1]] - komórki odległe o r w najdalszym
+# wymiarze, w pierścieniu najpierw najbliższe (suma przesunięć)
+_offsets = np.stack(np.meshgrid(*[np.arange(1 - GRID, GRID)] * 4, indexing='ij'), axis=-1).reshape(-1, 4)
+_order = np.lexsort((np.abs(_offsets).sum(axis=1), np.abs(_offsets).max(axis=1)))
+_OFFSETS = _offsets[_order]
+_RINGS = np.searchsorted(np.abs(_OFFSETS).max(axis=1), np.arange(GRID + 1))
+
+class BandIndex:
+    # Posortowane klucze pasm LSH dla posiłków w chwili budowy
+    def __init__(self, meal_ids, signatures):
+        with_ingredients = np.flatnonzero(signatures[:, 0] != EMPTY)
+        keys = _band_keys(signatures[with_ingredients])
+        order = np.argsort(keys, axis=0, kind='stable')
+        self.band_keys = np.take_along_axis(keys, order, axis=0).T.copy()   # (BANDS, n)
+        self.band_meal_ids = meal_ids[with_ingredients][order].T.copy()
+
+    def candidates(self, signature):
+        found = []
+        if signature[0] != EMPTY:
+            keys = _band_keys(signature[None, :])[0]
+            for band in range(BANDS):
+                low = np.searchsorted(self.band_keys[band], keys[band], side='left')
+                high = np.searchsorted(self.band_keys[band], keys[band], side='right')
+                found.append(self.band_meal_ids[band, low:high])
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+class GridIndex:
+    # Posortowane komórki siatki składu dla posiłków w chwili budowy
+    def __init__(self, meal_ids, vectors):
+        with_weight = np.flatnonzero(~np.isnan(vectors[:, 0]))
+        if len(with_weight):
+            self.edges = np.quantile(vectors[with_weight], np.arange(1, GRID) / GRID, axis=0).T   # (4, GRID - 1)
+        else:
+            self.edges = np.zeros((4, GRID - 1))
+        cells = self._bins(vectors[with_weight]) @ (GRID ** np.arange(4))
+        order = np.argsort(cells, kind='stable')
+        # Posiłki komórki c: cell_meal_ids[starts[c]:starts[c + 1]]
+        self.starts = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=GRID ** 4))))
+        self.cell_meal_ids = meal_ids[with_weight][order]
+
+    def _bins(self, vectors):
+        return np.stack([np.searchsorted(self.edges[dimension], vectors[:, dimension], side='right') for dimension in range(4)], axis=1)
+
+    def candidates(self, vector, limit):
+        # Do limit posiłków z pierścieni komórek wokół komórki wektora - najbliższe najpierw, aż do zebrania limitu
+        if np.isnan(vector[0]):
+            return np.empty(0, dtype=np.int64)
+        home = self._bins(vector[None, :])[0]
+        found = []
+        for radius in range(GRID):
+            neighbours = home + _OFFSETS[_RINGS[radius]:_RINGS[radius + 1]]
+            neighbours = neighbours[((neighbours >= 0) & (neighbours < GRID)).all(axis=1)]
+            if not len(neighbours):
+                break
+            cells = neighbours @ (GRID ** np.arange(4))
+            lows = self.starts[cells]
+            counts = self.starts[cells + 1] - lows
+            # Pozycje wszystkich posiłków z niepustych komórek pierścienia, po kolei
+            positions = np.arange(counts.sum()) + np.repeat(lows - np.cumsum(counts) + counts, counts)
+            found.append(self.cell_meal_ids[positions[:limit]])
+            limit -= len(positions)
+            if limit <= 0:
+                break
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+class SimilarityIndex:
+    def __init__(self, matrix, signatures, bands, grid, dirty):
+        self.generation = matrix.generation
+        self.meal_ids = matrix.meal_ids
+        self.signatures = signatures
+        self.vectors = features(matrix)
+        self.bands = bands or BandIndex(matrix.meal_ids, signatures)
+        self.grid = grid or GridIndex(matrix.meal_ids, self.vectors)
+        self.dirty = dirty if bands else np.empty(0, dtype=np.int64)   # id posiłków zmienionych od zbudowania bands
+
+    def similar(self, row, top):
+        # Wiersze posiłków najbardziej podobnych do posiłku w wierszu row: (wiersze, podobieństwo, Jaccard, odległość)
+        if len(self.meal_ids) <= SIMILARITY_CANDIDATES_MAX:
+            candidates = np.arange(len(self.meal_ids))
+        else:
+            candidates = np.unique(np.concatenate([self.bands.candidates(self.signatures[row]),
+                                                   self.grid.candidates(self.vectors[row], SIMILARITY_CANDIDATES_MAX)]))
+            if len(self.dirty):
+                candidates = np.union1d(candidates[~np.isin(candidates, self.dirty)], self.dirty)
+            candidates = find_rows(self.meal_ids, candidates)
+        candidates = candidates[(candidates >= 0) & (candidates != row)]
+        if not len(candidates) or top < 1:
+            return candidates[:0], np.empty(0), np.empty(0), np.empty(0)
+
+        signature = self.signatures[row]
+        jaccard = (self.signatures[candidates] == signature).mean(axis=1)
+        jaccard[(signature[0] == EMPTY) | (self.signatures[candidates, 0] == EMPTY)] = 0
+        distance = np.linalg.norm(self.vectors[candidates] - self.vectors[row], axis=1)
+        macro_similarity = np.nan_to_num(np.clip(1 - 2 * distance, 0, 1))
+        similarity = (jaccard + macro_similarity) / 2
+
+        best = np.argpartition(-similarity, top)[:top] if len(candidates) > top else np.arange(len(candidates))
+        best = best[np.argsort(-similarity[best], kind='stable')]
+        return candidates[best], similarity[best], jaccard[best], distance[best]
+
+_index = None
+_lock = threading.Lock()
+
+def _update(index, matrix):
+    changes = meal_suggestions.changes_since(index.generation, matrix.generation) if index is not None else None
+    if changes is None or any(kind == 'reload' for kind, meal_ids in changes):
+        return SimilarityIndex(matrix, minhash(matrix.meal_ids, matrix.pair_meal_ids, matrix.pair_ingredient_ids), None, None, None)
+
+    changed = np.unique(np.concatenate([meal_ids for kind, meal_ids in changes if kind == 'meals'] or [np.empty(0, dtype=np.int64)]))
+    # Sygnatury niezmienionych posiłków przepisywane z poprzedniego indeksu, zmienione liczone od nowa
+    signatures = np.full((len(matrix.meal_ids), SIGNATURE_SIZE), EMPTY, dtype=np.uint32)
+    previous = find_rows(index.meal_ids, matrix.meal_ids)
+    keep = (previous >= 0) & ~np.isin(matrix.meal_ids, changed)
+    signatures[keep] = index.signatures[previous[keep]]
+    changed_rows = np.flatnonzero(~keep)
+    if len(changed_rows):
+        pairs = np.isin(matrix.pair_meal_ids, matrix.meal_ids[changed_rows])
+        signatures[changed_rows] = minhash(matrix.meal_ids[changed_rows], matrix.pair_meal_ids[pairs], matrix.pair_ingredient_ids[pairs])
+
+    dirty = np.union1d(index.dirty, changed)
+    if len(dirty) > SIMILARITY_DIRTY_MAX:
+        return SimilarityIndex(matrix, signatures, None, None, None)
+    # Nowe wartości składników zmieniają tylko wektory składu - pasma LSH zostają
+    grid = None if any(kind == 'recompute' for kind, meal_ids in changes) else index.grid
+    return SimilarityIndex(matrix, signatures, index.bands, grid, dirty)
+
+def get_index(matrix=None):
+    # Z podaną macierzą czeka na blokadę, aż indeks będzie jej odpowiadał
+    global _index
+    wait = matrix is not None
+    matrix = matrix or meal_suggestions.matrix()
+    current = _index
+    if current is not None and current.generation == matrix.generation:
+        return current
+    if current is not None and not wait and not _lock.acquire(blocking=False):
+        return current  # Inny wątek właśnie aktualizuje indeks - do tego czasu wystarczy poprzedni
+    if current is None or wait:
+        _lock.acquire()
+    try:
+        if _index is None or _index.generation < matrix.generation:
+            _index = _update(_index, matrix)
+        return _index
+    finally:
+        _lock.release()
+
+def similar_meals(meal_id, top, load=False):
+    # (indeks, wiersze, podobieństwo, Jaccard, odległość) albo None, gdy posiłku nie ma w macierzy. load=True -
+    # posiłek istnieje w bazie, więc jest najpierw dociągany do macierzy (meal_suggestions.load_meals)
+    index = get_index(meal_suggestions.load_meals([meal_id]) if load else None)
+    row = find_rows(index.meal_ids, [meal_id])[0]
+    if row < 0:
+        return None
+    return (index, *index.similar(row, top))
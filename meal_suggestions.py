@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import ingredient_macros
+from cache import INVALIDATION_LISTENERS
+from db_config import connect
+from ingredient_catalog import find_rows
+
+# Macierz wartości odżywczych aktualnych wersji wszystkich posiłków w pamięci procesu: dla każdego posiłku
+# (posortowane id) dieta i sumy (waga, kcal, białko, węglowodany, tłuszcz) całej porcji. Propozycje posiłków
+# liczone są wektorowo na całej macierzy - odległość od brakujących do celu makroskładników i np.argpartition.
+#
+# Sumy liczone są z par (posiłek, składnik, ilość) trzymanych w pamięci (ok. 12 B na parę) i wartości składników
+# z ingredient_macros.py, więc:
+#   - zdarzenie 'meals' z id (zapis posiłku lub jego składników) - przy następnym odczycie pobierane są tylko te posiłki,
+#   - zdarzenie 'meals' bez id - ponowne wczytanie całości,
+#   - zdarzenie 'ingredients' - przeliczenie sum z par w pamięci, bez zapytań,
+#   - co MEAL_MATRIX_REFRESH_S sekund - nowe posiłki (id większe od największego w kopii), gdy szyna jest wyłączona,
+#   - load_meals() - wskazane posiłki od razu (widok wie z bazy, że posiłek istnieje, a nie ma go w kopii).
+#
+# Moduł importowany jest przez widoki przy pierwszym użyciu (z numpy, poza startem workera). Zdarzenia sprzed importu
+# nie są potrzebne - macierz wczytywana jest wtedy w całości.
+#
+# Każda nowa macierz dostaje kolejny numer generacji, a changes_since() zwraca zmiany między generacjami - indeksy
+# zbudowane na macierzy (meal_similarity.py) aktualizują tylko zmienione posiłki.
+
+MEAL_MATRIX_REFRESH_S = float(os.getenv('MEAL_MATRIX_REFRESH_S', 60))
+LOAD_BATCH_SIZE = 50000
+NO_DIET = -1
+MATRIX_CHANGES_KEPT = 1000
+
+class MealMatrix:
+    def __init__(self, meal_ids, diet_ids, pair_meal_ids, pair_ingredient_ids, pair_quantities, totals=None):
+        self.meal_ids = meal_ids                        # np.int64, rosnąco
+        self.diet_ids = diet_ids                        # np.int64, NO_DIET dla posiłków bez diety
+        self.pair_meal_ids = pair_meal_ids              # np.int32 - pary (posiłek, składnik, ilość)
+        self.pair_ingredient_ids = pair_ingredient_ids  # np.int32
+        self.pair_quantities = pair_quantities          # np.float32
+        self.totals = _totals(meal_ids, pair_meal_ids, pair_ingredient_ids, pair_quantities) if totals is None else totals
+        self.generation = 0
+
+def _totals(meal_ids, pair_meal_ids, pair_ingredient_ids, pair_quantities):
+    # Sumy (waga, kcal, białko, węglowodany, tłuszcz) dla każdego posiłku; składniki, których nie ma w bazie, są pomijane
+    totals = np.zeros((len(meal_ids), 5))
+    if not len(pair_meal_ids):
+        return totals
+    rows = find_rows(meal_ids, pair_meal_ids)
+    values, found = ingredient_macros.macros(pair_ingredient_ids)
+    valid = (rows >= 0) & found
+    rows = rows[valid]
+    quantities = pair_quantities[valid].astype(np.float64)
+    values = values[valid]
+    totals[:, 0] = np.bincount(rows, weights=quantities, minlength=len(meal_ids))
+    for column in range(4):
+        totals[:, column + 1] = np.bincount(rows, weights=quantities * values[:, column] / 100, minlength=len(meal_ids))
+    return totals
+
+_matrix = None
+_refreshed_at = 0
+_lock = threading.Lock()
+# Zmiany zgłoszone przez listener (wątek szyny) - stosowane przy następnym odczycie
+_pending = set()
+_reload = False
+_recompute = False
+_pending_lock = threading.Lock()
+# (generacja, rodzaj zmiany, id posiłków): 'reload' - nowa macierz, 'recompute' - nowe sumy, 'meals' - zmienione posiłki
+_changes = deque(maxlen=MATRIX_CHANGES_KEPT)
+
+def _fetch(where='', params=None):
+    # Zawsze serwer główny - odczyt z opóźnionej repliki utrwaliłby w kopii nieaktualne wartości
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'SELECT id, COALESCE(diet_id, {NO_DIET}) FROM meal {where} ORDER BY id', params)
+        meals = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        cursor.execute(f'''
+            SELECT mi.meal_id, mi.ingredient_id, COALESCE(mi.quantity, 0)
+            FROM meal_ingredients mi
+            JOIN meal ON meal.id = mi.meal_id
+            {where}
+        ''', params)
+        pairs = []
+        while True:
+            batch = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not batch:
+                break
+            pairs.append(np.array(batch, dtype=np.float64))
+    finally:
+        cursor.close()
+        conn.close()
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 3))
+    return (meals[:, 0], meals[:, 1],
+            pairs[:, 0].astype(np.int32), pairs[:, 1].astype(np.int32), pairs[:, 2].astype(np.float32))
+
+def _merge(matrix, changed_ids, fetched):
+    # Nowa macierz bez posiłków changed_ids (zmienionych lub usuniętych) i z posiłkami pobranymi ponownie
+    update = MealMatrix(*fetched)
+    keep = ~np.isin(matrix.meal_ids, changed_ids)
+    keep_pairs = ~np.isin(matrix.pair_meal_ids, changed_ids)
+    meal_ids = np.concatenate([matrix.meal_ids[keep], update.meal_ids])
+    order = np.argsort(meal_ids, kind='stable')
+    return MealMatrix(
+        meal_ids[order],
+        np.concatenate([matrix.diet_ids[keep], update.diet_ids])[order],
+        np.concatenate([matrix.pair_meal_ids[keep_pairs], update.pair_meal_ids]),
+        np.concatenate([matrix.pair_ingredient_ids[keep_pairs], update.pair_ingredient_ids]),
+        np.concatenate([matrix.pair_quantities[keep_pairs], update.pair_quantities]),
+        np.concatenate([matrix.totals[keep], update.totals])[order]
+    )
+
+def _publish(matrix, kind, meal_ids=None):
+    # Wywoływane pod _lock
+    global _matrix
+    matrix.generation = (_matrix.generation if _matrix is not None else 0) + 1
+    _changes.append((matrix.generation, kind, meal_ids))
+    _matrix = matrix
+
+def changes_since(generation, until):
+    # Zmiany macierzy w generacjach (generation, until] jako lista (rodzaj, id posiłków) albo None, gdy historia
+    # nie sięga tak daleko
+    changes = list(_changes)
+    if not changes or changes[0][0] > generation + 1:
+        return None
+    return [(kind, meal_ids) for changed_in, kind, meal_ids in changes if generation < changed_in <= until]
+
+def _apply_changes():
+    # Wywoływane pod _lock
+    global _refreshed_at, _reload, _recompute
+    with _pending_lock:
+        reload, recompute, changed = _reload or _matrix is None, _recompute, list(_pending)
+        _reload = _recompute = False
+        _pending.clear()
+    try:
+        if reload:
+            _publish(MealMatrix(*_fetch()), 'reload')
+            _refreshed_at = time.monotonic()
+            return
+        if recompute:
+            _publish(MealMatrix(_matrix.meal_ids, _matrix.diet_ids, _matrix.pair_meal_ids, _matrix.pair_ingredient_ids, _matrix.pair_quantities), 'recompute')
+        if changed:
+            changed = np.array(changed, dtype=np.int64)
+            _publish(_merge(_matrix, changed, _fetch('WHERE meal.id = ANY(%s)', (changed.tolist(),))), 'meals', changed)
+    except Exception:
+        with _pending_lock:
+            _reload, _recompute = _reload or reload, _recompute or recompute
+            _pending.update(int(meal_id) for meal_id in changed)
+        raise
+    if time.monotonic() - _refreshed_at >= MEAL_MATRIX_REFRESH_S:
+        max_id = int(_matrix.meal_ids[-1]) if len(_matrix.meal_ids) else 0
+        fetched = _fetch('WHERE meal.id > %s', (max_id,))
+        if len(fetched[0]):
+            _publish(_merge(_matrix, fetched[0], fetched), 'meals', fetched[0])
+        _refreshed_at = time.monotonic()
+
+def matrix():
+    current = _matrix
+    if (current is not None and not _pending and not _reload and not _recompute
+            and time.monotonic() - _refreshed_at < MEAL_MATRIX_REFRESH_S):
+        return current
+    if current is not None and not _lock.acquire(blocking=False):
+        return current  # Inny wątek właśnie uzupełnia kopię - do tego czasu wystarczy poprzednia
+    if current is None:
+        _lock.acquire()
+    try:
+        if _matrix is None or _matrix is current:
+            _apply_changes()
+        return _matrix
+    finally:
+        _lock.release()
+
+def load_meals(meal_ids):
+    # Dociąga od razu posiłki spoza macierzy (np. zapisane w innym workerze przy wyłączonej szynie) - czeka na
+    # blokadę zamiast zwracać poprzednią macierz
+    with _pending_lock:
+        _pending.update(int(meal_id) for meal_id in meal_ids)
+    with _lock:
+        _apply_changes()
+        return _matrix
+
+def suggest(target, scale, allowed_diets, excluded_diets, top):
+    # Indeksy posiłków najbliższych celowi: target - brakujące (kcal, białko, węglowodany, tłuszcz), scale - skala
+    # każdej wartości (cel dzienny; 0 = wartość pomijana). allowed_diets=None oznacza wszystkie diety poza excluded_diets.
+    # Zwraca (macierz, indeksy wierszy od najlepszego, odległości)
+    current = matrix()
+    candidates = (current.diet_ids != NO_DIET) & (current.totals[:, 0] > 0)
+    if allowed_diets is not None:
+        candidates &= np.isin(current.diet_ids, allowed_diets)
+    if excluded_diets:
+        candidates &= ~np.isin(current.diet_ids, excluded_diets)
+    rows = np.flatnonzero(candidates)
+    if not len(rows) or top < 1:
+        return current, rows[:0], np.empty(0)
+
+    # Odległość względna: różnica każdej wartości podzielona przez cel dzienny, żeby kcal nie dominowały
+    scale = np.asarray(scale, dtype=np.float64)
+    weights = np.divide(1, scale, out=np.zeros_like(scale), where=scale > 0)
+    distances = np.sqrt((((current.totals[rows, 1:] - np.asarray(target, dtype=np.float64)) * weights) ** 2).sum(axis=1))
+    if len(rows) > top:
+        best = np.argpartition(distances, top)[:top]
+    else:
+        best = np.arange(len(rows))
+    best = best[np.argsort(distances[best], kind='stable')]
+    return current, rows[best], distances[best]
+
+def _on_invalidate(namespace, key, version):
+    global _reload, _recompute
+    if namespace not in ('meals', 'ingredients'):
+        return
+    with _pending_lock:
+        if namespace == 'ingredients':
+            _recompute = True
+        elif key is None:
+            _reload = True
+        else:
+            _pending.add(int(key))
+
+INVALIDATION_LISTENERS.append(_on_invalidate)
@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+
+from db_config import CONNECTION_LISTENERS, QUERY_LISTENERS
+
+# Metryki w formacie Prometheusa bez zewnętrznych zależności.
+#
+# Zapis próbki to inkrementacja w słowniku wątku (bez blokad) - wątki nigdy nie piszą do wspólnych struktur.
+# Przy wielu procesach (gunicorn) każdy proces co METRICS_FLUSH_SECONDS zapisuje swój stan do
+# METRICS_DIR/<pid>.json, a /metrics sumuje pliki wszystkich procesów. Bez METRICS_DIR raportowany
+# jest tylko bieżący proces.
+
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nazwa: (typ, opis, etykiety)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status', ('route', 'method', 'status')),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency', ('route', 'method')),
+    'db_queries_total': ('counter', 'SQL statements executed by route', ('route',)),
+    'db_query_duration_seconds': ('histogram', 'SQL statement duration by route', ('route',)),
+    'db_connections_opened_total': ('counter', 'Database connections opened', ()),
+    'db_connections_closed_total': ('counter', 'Database connections closed', ()),
+    'db_connect_duration_seconds': ('histogram', 'Time spent waiting for a new database connection', ()),
+    'db_connections_in_use': ('gauge', 'Database connections currently open', ()),
+    'db_reads_total': ('counter', 'Connections opened by read-only requests with replicas configured, by target and reason', ('target', 'reason')),
+    'single_flight_requests_total': ('counter', 'Requests to coalesced views by role (leader executed the view, follower shared its response)', ('route', 'role')),
+    'cache_requests_total': ('counter', 'In-process cache lookups by result', ('cache', 'result')),
+    'cache_hit_ratio': ('gauge', 'In-process cache hit ratio', ('cache',)),
+    'cache_invalidation_events_total': ('counter', 'Invalidation events received over LISTEN/NOTIFY by namespace', ('namespace',)),
+    'cache_invalidation_flushes_total': ('counter', 'Full cache flushes after the invalidation listener reconnected', ()),
+    'import_rows_processed_total': ('counter', 'Rows processed by the OpenFoodFacts import', ()),
+    'import_progress_ratio': ('gauge', 'Progress of the running OpenFoodFacts import (0-1)', ()),
+}
+
+class _Store:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+_local = threading.local()
+_stores = []  # (wątek, store) - do scalania przy eksporcie
+_retired = _Store()  # próbki zakończonych wątków
+_gauges = {}
+_lock = threading.Lock()
+_flusher_pid = None
+
+def _retire_dead():
+    # Wywoływane pod _lock - magazyny zakończonych wątków przenoszone są do _retired
+    alive = []
+    for thread, store in _stores:
+        if thread.is_alive():
+            alive.append((thread, store))
+        else:
+            _merge(_retired, store)
+    _stores[:] = alive
+
+def _store():
+    try:
+        return _local.store
+    except AttributeError:
+        store = _local.store = _Store()
+        with _lock:
+            # Przy wątku na żądanie i bez odczytów /metrics lista rosłaby bez końca - porządkowana przy każdym nowym wątku
+            _retire_dead()
+            _stores.append((threading.current_thread(), store))
+        return store
+
+# ==================== ZAPIS ====================
+
+def inc(name, labels=(), value=1):
+    counters = _store().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+def observe(name, labels, value):
+    histograms = _store().histograms
+    key = (name, labels)
+    buckets = histograms.get(key)
+    if buckets is None:
+        # Liczniki kubełków, kubełek +Inf i suma wartości na końcu
+        buckets = histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+    buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+    buckets[-1] += value
+
+def set_gauge(name, labels, value):
+    # Gauge opisuje stan procesu (np. postęp importu), więc jest wspólny dla wszystkich wątków
+    _gauges[(name, labels)] = value
+
+def cache_hit(cache):
+    inc('cache_requests_total', (cache, 'hit'))
+
+def cache_miss(cache):
+    inc('cache_requests_total', (cache, 'miss'))
+
+# ==================== ZBIERANIE ====================
+
+def _merge(target, source):
+    for key, value in list(source.counters.items()):
+        target.counters[key] = target.counters.get(key, 0) + value
+    for key, buckets in list(source.histograms.items()):
+        current = target.histograms.setdefault(key, [0] * len(buckets))
+        for i, value in enumerate(list(buckets)):
+            current[i] += value
+
+def snapshot():
+    # Stan bieżącego procesu: suma magazynów wszystkich wątków; magazyny zakończonych wątków są przenoszone do _retired
+    with _lock:
+        _retire_dead()
+        total = _Store()
+        _merge(total, _retired)
+        for _, store in _stores:
+            _merge(total, store)
+
+    gauges = dict(_gauges)
+    opened = total.counters.get(('db_connections_opened_total', ()), 0)
+    closed = total.counters.get(('db_connections_closed_total', ()), 0)
+    gauges[('db_connections_in_use', ())] = opened - closed
+
+    return {
+        "pid": os.getpid(),
+        "counters": [[name, list(labels), value] for (name, labels), value in total.counters.items()],
+        "histograms": [[name, list(labels), buckets] for (name, labels), buckets in total.histograms.items()],
+        "gauges": [[name, list(labels), value] for (name, labels), value in gauges.items()]
+    }
+
+def flush():
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    # Zapis do pliku tymczasowego i podmiana - czytający nigdy nie widzi połowy pliku
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+def _flush_periodically():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            pass
+
+def _ensure_flusher():
+    # Wątek startowany leniwie w każdym procesie - po fork() wątki rodzica nie istnieją
+    global _flusher_pid
+    if METRICS_DIR and _flusher_pid != os.getpid():
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_periodically, daemon=True).start()
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def collect():
+    # Suma stanów wszystkich procesów. Liczniki i histogramy zakończonych procesów są zachowane
+    # (tak jak w Prometheusie liczniki nie maleją), ich gauge są pomijane.
+    snapshots = [snapshot()]
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for filename in os.listdir(METRICS_DIR):
+            if not filename.endswith('.json') or filename == f'{os.getpid()}.json':
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _process_alive(data['pid']):
+                data['gauges'] = []
+            snapshots.append(data)
+
+    counters, histograms, gauges = {}, {}, {}
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets in data['histograms']:
+            current = histograms.setdefault((name, tuple(labels)), [0] * len(buckets))
+            for i, value in enumerate(buckets):
+                current[i] += value
+        for name, labels, value in data['gauges']:
+            key = (name, tuple(labels))
+            gauges[key] = gauges.get(key, 0) + value
+
+    for cache in {labels[0] for name, labels in counters if name == 'cache_requests_total'}:
+        hits = counters.get(('cache_requests_total', (cache, 'hit')), 0)
+        misses = counters.get(('cache_requests_total', (cache, 'miss')), 0)
+        gauges[('cache_hit_ratio', (cache,))] = hits / (hits + misses)
+
+    return counters, histograms, gauges
+
+# ==================== EKSPORT ====================
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render():
+    counters, histograms, gauges = collect()
+    lines = []
+    for name, (kind, description, label_names) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), buckets in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(label_names, labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(label_names, labels)} {buckets[-1]}')
+                lines.append(f'{name}_count{_labels(label_names, labels)} {cumulative}')
+        else:
+            for (metric, labels), value in sorted((counters if kind == 'counter' else gauges).items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(label_names, labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+# ==================== INTEGRACJA ====================
+
+def _route():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'none'
+
+def _record_query(cursor, statement, params, duration):
+    route = (_route(),)
+    inc('db_queries_total', route)
+    observe('db_query_duration_seconds', route, duration)
+
+def _record_connection(event, duration):
+    if event == 'open':
+        inc('db_connections_opened_total')
+        observe('db_connect_duration_seconds', (), duration)
+    else:
+        inc('db_connections_closed_total')
+
+def _start_request():
+    _ensure_flusher()
+    g.metrics_started = time.perf_counter()
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        route = request.endpoint or 'unmatched'
+        inc('http_requests_total', (route, request.method, str(response.status_code)))
+        observe('http_request_duration_seconds', (route, request.method), time.perf_counter() - started)
+    return response
+
+def init_metrics(app):
+    if _record_query not in QUERY_LISTENERS:
+        QUERY_LISTENERS.append(_record_query)
+    if _record_connection not in CONNECTION_LISTENERS:
+        CONNECTION_LISTENERS.append(_record_connection)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,59 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Haszowanie haseł (scrypt/pbkdf2) jest celowo kosztowne. Wykonywane jest w ograniczonej puli wątków
+# (hashlib zwalnia GIL, więc pozostałe żądania nie są blokowane), a liczba oczekujących zadań jest
+# ograniczona - gdy pula jest pełna, endpoint od razu zwraca 429 zamiast ustawiać żądania w kolejce.
+#
+# PASSWORD_HASH_METHOD  - metoda w formacie werkzeug, np. "scrypt:32768:8:1" albo "pbkdf2:sha256:600000"
+# PASSWORD_HASH_WORKERS - liczba wątków haszujących (domyślnie liczba rdzeni)
+# PASSWORD_HASH_QUEUE   - maksymalna liczba zadań wykonywanych i oczekujących (domyślnie 2 x wątki)
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', PASSWORD_HASH_WORKERS * 2))
+
+class PasswordHashingBusy(Exception):
+    pass
+
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+_lock = threading.Lock()
+_method = None
+
+def _get_executor():
+    # Pula tworzona leniwie w każdym procesie - po fork() wątki rodzica nie istnieją
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashingBusy("Password hashing capacity exceeded")
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+def _current_method():
+    # Pełna nazwa metody z parametrami (np. "scrypt" -> "scrypt:32768:8:1") odczytana z wygenerowanego skrótu
+    global _method
+    if _method is None:
+        _method = hash_password('').split('$', 1)[0]
+    return _method
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _current_method()
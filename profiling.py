@@ -0,0 +1,60 @@
+import cProfile
+import hmac
+import os
+import re
+import time
+
+# Profilowanie pojedynczego żądania cProfile - łącznie z Werkzeugiem, widokiem i serializacją odpowiedzi.
+# Żądanie jest profilowane, gdy ma nagłówek X-Profile równy PROFILE_TOKEN albo gdy ustawiono PROFILE_ALWAYS=1
+# (tylko lokalnie). Wynik zapisywany jest do PROFILE_DIR jako plik pstats (snakeviz, flameprof, gprof2dot),
+# a jego nazwa zwracana w nagłówku X-Profile-File. Bez tych zmiennych middleware nie jest instalowany.
+
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_ALWAYS = os.getenv('PROFILE_ALWAYS', '').lower() in ('1', 'true')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]+')
+
+class ProfilingMiddleware:
+    def __init__(self, app, token=None, always=False, profile_dir=PROFILE_DIR):
+        self.app = app
+        self.token = token
+        self.always = always
+        self.profile_dir = profile_dir
+
+    def _requested(self, environ):
+        if self.always:
+            return True
+        header = environ.get('HTTP_X_PROFILE')
+        return bool(self.token and header and hmac.compare_digest(header, self.token))
+
+    def __call__(self, environ, start_response):
+        if not self._requested(environ):
+            return self.app(environ, start_response)
+
+        path = _UNSAFE.sub('.', environ.get('PATH_INFO', '')).strip('.') or 'root'
+        filename = f"{environ['REQUEST_METHOD']}.{path}.{time.time_ns()}.{os.getpid()}.prof"
+
+        def profiled_start_response(status, headers, exc_info=None):
+            headers.append(('X-Profile-File', filename))
+            return start_response(status, headers, exc_info)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            # Odpowiedź jest budowana w całości wewnątrz profilu, żeby objąć też generowanie treści
+            app_iter = self.app(environ, profiled_start_response)
+            try:
+                body = b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+        finally:
+            profile.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(self.profile_dir, filename))
+        return [body]
+
+def init_profiling(app):
+    if PROFILE_TOKEN or PROFILE_ALWAYS:
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app, PROFILE_TOKEN, PROFILE_ALWAYS)
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+
+from db_config import QUERY_LISTENERS
+
+logger = logging.getLogger('nutri.queries')
+
+# Ten sam kształt zapytania powtórzony co najmniej tyle razy w jednym żądaniu to prawdopodobnie N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        # Kształt zapytania bez literałów i nadmiarowych białych znaków - parametry %s są już wyrzucone przez psycopg2
+        shapes = Counter()
+        for statement, count in self.shapes.items():
+            shapes[_LITERALS.sub('?', _WHITESPACE.sub(' ', statement).strip())] += count
+        return {shape: count for shape, count in shapes.most_common() if count >= threshold}
+
+def _record_query(cursor, statement, params, duration):
+    if has_request_context() and 'query_stats' in g:
+        g.query_stats.record(statement, duration)
+
+def _start_request():
+    g.query_stats = QueryStats()
+    g.request_started = time.perf_counter()
+
+def _finish_request(response):
+    stats = g.pop('query_stats', None)
+    if stats is None:
+        return response
+    db_ms = stats.duration * 1000
+    total_ms = (time.perf_counter() - g.pop('request_started')) * 1000
+
+    response.headers['X-DB-Query-Count'] = str(stats.count)
+    response.headers.add('Server-Timing', f'db;dur={db_ms:.2f};desc="{stats.count} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+
+    repeated = stats.repeated()
+    logger.log(logging.WARNING if repeated else logging.INFO, json.dumps({
+        "event": "request_queries",
+        "method": request.method,
+        "route": request.endpoint,
+        "status": response.status_code,
+        "queries": stats.count,
+        "db_ms": round(db_ms, 2),
+        "total_ms": round(total_ms, 2),
+        "repeated_shapes": repeated
+    }))
+
+    budget = current_app.config['QUERY_BUDGETS'].get(request.endpoint, current_app.config['QUERY_BUDGET'])
+    if current_app.testing and budget is not None and stats.count > budget:
+        raise QueryBudgetExceeded(f'{request.method} {request.endpoint} executed {stats.count} queries, budget is {budget}: {repeated}')
+    return response
+
+def init_query_stats(app):
+    # Liczba zapytań, czas bazy i powtarzające się kształty zapytań dla każdego żądania:
+    # nagłówki Server-Timing / X-DB-Query-Count i log w formacie JSON.
+    # QUERY_BUDGET (globalnie) i QUERY_BUDGETS (per endpoint) są egzekwowane tylko w trybie testowym.
+    budget = os.getenv('QUERY_BUDGET')
+    app.config.setdefault('QUERY_BUDGET', int(budget) if budget else None)
+    app.config.setdefault('QUERY_BUDGETS', {})
+
+    if _record_query not in QUERY_LISTENERS:
+        QUERY_LISTENERS.append(_record_query)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
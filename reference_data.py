@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from cache import INVALIDATION_LISTENERS, get_cache, invalidate
+from db_config import connect
+
+# Rejestr danych słownikowych: diety, kategorie posiłków i typy linków. Tabele są małe i prawie się nie zmieniają,
+# więc każdy worker trzyma ich kopię w pamięci (wczytaną przy pierwszym użyciu - fabryka aplikacji musi działać
+# bez bazy) i podmienia ją w całości, gdy:
+#   - zmieni się wersja przestrzeni cache 'reference' (refresh() po zapisie, zdarzenie z invalidation_bus.py
+#     albo zapis w innym workerze przy CACHE_URL=redis://),
+#   - listener dostanie unieważnienie przestrzeni bez zmiany wersji (invalidate_all(shared=False) przy pierwszym
+#     połączeniu szyny),
+#   - kopia jest starsza niż REFERENCE_DATA_TTL sekund (zabezpieczenie, gdy backend cache jest lokalny).
+
+REFERENCE_DATA_TTL = float(os.getenv('REFERENCE_DATA_TTL', 60))
+REFERENCE_NAMESPACE = 'reference'
+
+class ReferenceSnapshot:
+    def __init__(self, diets, meal_categories, link_types, version):
+        self.diets = diets                      # lista słowników posortowana po id
+        self.diets_by_id = {diet['id']: diet for diet in diets}
+        self.meal_categories = meal_categories
+        self.meal_categories_by_id = {category['id']: category for category in meal_categories}
+        self.link_types = link_types            # typ -> id
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+_snapshot = None
+_lock = threading.Lock()
+_invalidated_at = 0.0  # time.monotonic() ostatniego unieważnienia przez listener
+
+def _load(version):
+    # Zawsze serwer główny - odczyt z opóźnionej repliki zaraz po zapisie utrwaliłby nieaktualną kopię
+    started = time.monotonic()
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute('SELECT * FROM diet ORDER BY id')
+        diets = [dict(diet) for diet in cursor.fetchall()]
+        cursor.execute('SELECT * FROM meal_category ORDER BY id')
+        meal_categories = [dict(category) for category in cursor.fetchall()]
+        cursor.execute('SELECT id, type FROM link_types')
+        link_types = {row['type']: row['id'] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+    snapshot = ReferenceSnapshot(diets, meal_categories, link_types, version)
+    snapshot.loaded_at = started  # Unieważnienie w trakcie wczytywania nie może zostać uznane za uwzględnione
+    return snapshot
+
+def snapshot():
+    global _snapshot
+    current = _snapshot
+    version = get_cache(REFERENCE_NAMESPACE).version()
+    if (current is not None and current.version == version and current.loaded_at > _invalidated_at
+            and time.monotonic() - current.loaded_at < REFERENCE_DATA_TTL):
+        return current
+    if current is not None and not _lock.acquire(blocking=False):
+        return current  # Inny wątek właśnie wczytuje nową kopię - do tego czasu wystarczy poprzednia
+    if current is None:
+        _lock.acquire()
+    try:
+        if _snapshot is current or _snapshot.version != version or _snapshot.loaded_at <= _invalidated_at:
+            _snapshot = _load(version)
+        return _snapshot
+    finally:
+        _lock.release()
+
+def refresh():
+    # Wywoływane po zmianie diet, kategorii lub typów linków
+    invalidate(REFERENCE_NAMESPACE)
+
+def get_diets():
+    return snapshot().diets
+
+def get_diet(diet_id):
+    return snapshot().diets_by_id.get(int(diet_id))
+
+def get_meal_categories():
+    return snapshot().meal_categories
+
+def get_meal_category(category_id):
+    return snapshot().meal_categories_by_id.get(int(category_id))
+
+def get_link_type_id(link_type):
+    return snapshot().link_types.get(link_type)
+
+def _on_invalidate(namespace, key, version):
+    global _invalidated_at
+    if namespace == REFERENCE_NAMESPACE and key is None:
+        _invalidated_at = time.monotonic()
+
+INVALIDATION_LISTENERS.append(_on_invalidate)
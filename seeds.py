@@ -1,6 +1,7 @@
 from datetime import datetime
 import psycopg2
 from db_config import get_db_connection
+import reference_data
 from psycopg2.extras import RealDictCursor
 
 def seed_database():
@@ -68,5 +69,6 @@ def seed_database():
     conn.commit()
     cursor.close()
     conn.close()
+    reference_data.refresh()
 
     print("Database seeded successfully.")
\ No newline at end of file
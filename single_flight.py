@@ -0,0 +1,78 @@
+import os
+import threading
+from functools import wraps
+
+from flask import current_app, request
+
+from metrics import inc
+
+# Łączenie identycznych, równoczesnych żądań w jedno wykonanie widoku (single-flight). Pierwsze żądanie
+# ("lider") wykonuje widok, pozostałe z tym samym kluczem czekają na jego wynik i dostają kopię odpowiedzi
+# z nagłówkiem X-Single-Flight: shared. Nic nie jest przechowywane po zakończeniu wykonania - to nie jest cache.
+#
+# Klucz: endpoint, argumenty ścieżki, parametry zapytania i zakres uprawnień (scope). Dekorator stosuje się
+# pod dekoratorem uwierzytelniającym, żeby odpowiedź dzielili tylko uprawnieni użytkownicy; dla widoków,
+# których wynik zależy od wywołującego, scope zwraca np. tożsamość z JWT.
+#
+# Łączenie działa w obrębie procesu (workery wielowątkowe); między workerami zapytania łączy cache.get_or_set.
+
+SINGLE_FLIGHT_WAIT_S = float(os.getenv('SINGLE_FLIGHT_WAIT_S', 10))
+SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', '1').lower() not in ('0', 'false')
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None  # (body, status, headers) odpowiedzi lidera
+
+_flights = {}
+_lock = threading.Lock()
+
+def _key(scope):
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+        scope() if scope else None
+    )
+
+def _follow(flight):
+    if not flight.done.wait(SINGLE_FLIGHT_WAIT_S) or flight.response is None:
+        return None  # Lider nie zdążył albo zgłosił wyjątek - żądanie wykonywane samodzielnie
+    body, status, headers = flight.response
+    response = current_app.response_class(body, status=status, headers=headers)
+    response.headers['X-Single-Flight'] = 'shared'
+    return response
+
+def single_flight(scope=None):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not SINGLE_FLIGHT or request.method not in ('GET', 'HEAD'):
+                return fn(*args, **kwargs)
+
+            key = _key(scope)
+            with _lock:
+                flight = _flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _flights[key] = _Flight()
+
+            if not leader:
+                response = _follow(flight)
+                if response is not None:
+                    inc('single_flight_requests_total', (request.endpoint, 'follower'))
+                    return response
+                return fn(*args, **kwargs)
+
+            inc('single_flight_requests_total', (request.endpoint, 'leader'))
+            try:
+                response = current_app.make_response(fn(*args, **kwargs))
+                if not response.is_streamed:
+                    flight.response = (response.get_data(), response.status_code, list(response.headers.items()))
+                return response
+            finally:
+                with _lock:
+                    del _flights[key]
+                flight.done.set()
+        return wrapper
+    return decorator
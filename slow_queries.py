@@ -0,0 +1,87 @@
+import datetime
+import json
+import logging
+import os
+import random
+import re
+from collections import deque
+
+import psycopg2
+from flask import has_request_context, request
+
+from db_config import QUERY_LISTENERS
+
+logger = logging.getLogger('nutri.slow_queries')
+
+# Zapytania dłuższe niż SLOW_QUERY_MS są logowane; dla części z nich (EXPLAIN_SAMPLE_RATE)
+# zapisywany jest plan EXPLAIN (ANALYZE, BUFFERS). Ostatnie SLOW_QUERY_BUFFER wpisów procesu
+# trzymane są w pamięci dla /admin/slow-queries.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+EXPLAIN_SAMPLE_RATE = float(os.getenv('EXPLAIN_SAMPLE_RATE', 0.1))
+SLOW_QUERY_BUFFER = int(os.getenv('SLOW_QUERY_BUFFER', 100))
+
+_WHITESPACE = re.compile(r'\s+')
+# EXPLAIN ANALYZE wykonuje zapytanie ponownie - tylko dla zapytań, które niczego nie zmieniają
+_READ_ONLY = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_WRITES = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE)\b|\bFOR\s+(UPDATE|SHARE)\b', re.IGNORECASE)
+
+_buffer = deque(maxlen=SLOW_QUERY_BUFFER)
+
+def _redact(params):
+    # Wartości parametrów mogą zawierać dane osobowe i hasła - zapisywane są tylko ich typy
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params]
+    return type(params).__name__
+
+def _explain(cursor, statement, params):
+    conn = cursor.connection
+    if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+        return None
+    # Zwykły kursor zamiast conn.cursor() - EXPLAIN nie jest przekazywany do listenerów (nie liczy się do statystyk żądania)
+    explain = psycopg2.extensions.cursor(conn)
+    savepoint = not conn.autocommit
+    try:
+        # Punkt zapisu chroni transakcję aplikacji, gdyby EXPLAIN się nie powiódł
+        if savepoint:
+            explain.execute('SAVEPOINT slow_query_explain')
+        explain.execute('EXPLAIN (ANALYZE, BUFFERS) ' + statement, params)
+        plan = '\n'.join(row[0] for row in explain.fetchall())
+        if savepoint:
+            explain.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+    except psycopg2.Error as e:
+        if savepoint:
+            explain.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+        return f'EXPLAIN failed: {e}'
+    finally:
+        explain.close()
+
+def _record_query(cursor, statement, params, duration):
+    duration_ms = duration * 1000
+    if duration_ms < SLOW_QUERY_MS or not isinstance(statement, str):
+        return
+
+    entry = {
+        "at": datetime.datetime.utcnow().isoformat(),
+        "route": request.endpoint if has_request_context() else None,
+        "duration_ms": round(duration_ms, 2),
+        "statement": _WHITESPACE.sub(' ', statement).strip(),
+        "params": _redact(params),
+        "plan": None
+    }
+    logger.warning(json.dumps(dict(entry, event="slow_query")))
+
+    if random.random() < EXPLAIN_SAMPLE_RATE and _READ_ONLY.match(statement) and not _WRITES.search(statement):
+        entry['plan'] = _explain(cursor, statement, params)
+    _buffer.append(entry)
+
+def recent_slow_queries():
+    return list(reversed(_buffer))
+
+def init_slow_queries(app):
+    if _record_query not in QUERY_LISTENERS:
+        QUERY_LISTENERS.append(_record_query)
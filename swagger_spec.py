@@ -0,0 +1,67 @@
+import json
+import os
+
+from flask import jsonify, send_file
+
+# Specyfikacja API generowana raz (build_swagger.py, krok budowania obrazu) z docstringów widoków
+# i serwowana z pliku - workery nie parsują YAML-i przy starcie ani przy pierwszym żądaniu.
+# Swagger UI (/apidocs/) rejestrowany jest tylko przy SWAGGER_UI=1.
+
+SWAGGER_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'swagger.json')
+
+SWAGGER_TEMPLATE = {
+    "swagger": "2.0",
+    "info": {
+        "title": "Nutrition App API",
+        "description": "API documentation",
+        "version": "1.0.0"
+    },
+    "securityDefinitions": {
+        "Bearer": {
+            "type": "apiKey",
+            "name": "Authorization",
+            "in": "header",
+            "description": "JWT Authorization header using the Bearer scheme. Example: \"Authorization: Bearer {token}\""
+        }
+    },
+    "security": [
+        {
+            "Bearer": []
+        }
+    ]
+}
+
+def build_spec(app):
+    # Pełne parsowanie docstringów przez flasgger - tylko przy budowaniu
+    from flasgger import Swagger
+
+    swagger = Swagger(app, template=SWAGGER_TEMPLATE, config=dict(Swagger.DEFAULT_CONFIG, swagger_ui=False))
+    with app.test_request_context():
+        return json.loads(json.dumps(swagger.get_apispecs('apispec_1')))
+
+def get_apispec():
+    if not os.path.exists(SWAGGER_SPEC_PATH):
+        return jsonify({"error": "API specification has not been built", "message": "Run: python build_swagger.py"}), 404
+    return send_file(SWAGGER_SPEC_PATH, mimetype='application/json', max_age=3600)
+
+def init_swagger(app):
+    if os.getenv('SWAGGER_UI', '').lower() not in ('1', 'true'):
+        app.add_url_rule('/apispec_1.json', view_func=get_apispec, methods=['GET'])
+        return
+
+    from flasgger import Swagger
+
+    if not os.path.exists(SWAGGER_SPEC_PATH):
+        # Tryb deweloperski bez zbudowanego pliku - flasgger generuje specyfikację z docstringów przy pierwszym żądaniu
+        Swagger(app, template=SWAGGER_TEMPLATE)
+        return
+
+    with open(SWAGGER_SPEC_PATH) as f:
+        spec = json.load(f)
+    # Gotowa specyfikacja jako szablon, bez przeglądania reguł URL
+    Swagger(app, template=spec, config=dict(Swagger.DEFAULT_CONFIG, specs=[{
+        "endpoint": "apispec_1",
+        "route": "/apispec_1.json",
+        "rule_filter": lambda rule: False,
+        "model_filter": lambda tag: False
+    }]))
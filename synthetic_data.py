@@ -0,0 +1,326 @@
+"""Generator syntetycznego zbioru danych do benchmarków, testów planów zapytań i testów obciążeniowych.
+
+Uruchomienie (schemat musi istnieć - db_create_all()):
+
+    python synthetic_data.py --preset small --seed 42
+
+Dane są deterministyczne dla danego presetu, ziarna i daty odniesienia (domyślnie dzisiejszej)
+i dopisywane są za istniejącymi rekordami. Wszystkie tabele ładowane są przez COPY ze strumienia
+generowanego w locie, dzięki czemu preset "large" nie wymaga trzymania danych w pamięci.
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+from itertools import islice
+
+from psycopg2.extras import RealDictCursor
+
+from db_config import get_db_connection
+from passwords import hash_password
+from endpoints.meal_history import dedup_meal_compositions
+from seeds import seed_database
+
+SYNTHETIC_PASSWORD = 'synthetic_password'
+
+# log_days - ile dni wstecz sięga historia logów, schedule_days - na ile dni do przodu zaplanowano posiłki
+PRESETS = {
+    "small": {"ingredients": 10_000, "users": 200, "meals": 1_000, "max_versions": 3, "log_days": 30, "logs_per_day": 3, "schedule_days": 7},
+    "medium": {"ingredients": 250_000, "users": 10_000, "meals": 50_000, "max_versions": 4, "log_days": 180, "logs_per_day": 3, "schedule_days": 14},
+    "large": {"ingredients": 2_000_000, "users": 100_000, "meals": 500_000, "max_versions": 5, "log_days": 730, "logs_per_day": 2, "schedule_days": 14},
+}
+
+# Część użytkowników korzysta z cyklicznych reguł harmonogramu zamiast pojedynczych wpisów
+RULE_USERS_RATIO = 0.1
+INGREDIENTS_PER_MEAL = (5, 20)
+
+FOODS = ['apple', 'banana', 'rice', 'chicken', 'oat', 'milk', 'bean', 'tomato', 'cheese', 'bread', 'salmon', 'egg',
+         'pasta', 'potato', 'yogurt', 'almond', 'spinach', 'beef', 'tofu', 'lentil', 'carrot', 'pepper', 'onion', 'honey']
+ADJECTIVES = ['organic', 'fresh', 'smoked', 'dried', 'roasted', 'light', 'whole', 'spicy', 'sweet', 'frozen', 'raw', 'classic']
+FORMS = ['bar', 'mix', 'sauce', 'spread', 'flakes', 'chips', 'soup', 'salad', 'drink', 'paste', 'powder', 'slices']
+MEAL_NAMES = ['bowl', 'salad', 'wrap', 'soup', 'stew', 'curry', 'omelette', 'sandwich', 'smoothie', 'casserole', 'stir fry', 'porridge']
+UNITS = ['g', 'g', 'g', 'ml', 'piece']
+
+# ==================== COPY ====================
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return str(value)
+
+class CopyStream:
+    # Plikopodobny strumień dla copy_expert - wiersze formatowane są dopiero przy odczycie
+    def __init__(self, rows):
+        self._lines = ('\t'.join(map(_copy_value, row)) + '\n' for row in rows)
+        self._buffer = ''
+        self.rows = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            lines = list(islice(self._lines, 1000))
+            if not lines:
+                break
+            self.rows += len(lines)
+            self._buffer += ''.join(lines)
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+def copy_rows(cursor, table, columns, rows):
+    stream = CopyStream(rows)
+    cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN', stream, size=1 << 16)
+    return stream.rows
+
+def _next_id(cursor, table):
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 AS id FROM {table}')
+    return cursor.fetchone()['id']
+
+def _sync_sequence(cursor, table):
+    # Identyfikatory nadawane są jawnie, więc sekwencję SERIAL trzeba przesunąć za nie
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+
+# ==================== GENERATORY TABEL ====================
+
+def _rng(seed, table):
+    # Osobny strumień losowy dla każdej tabeli - zmiana rozmiaru jednej nie zmienia zawartości pozostałych
+    return random.Random(f'{seed}:{table}')
+
+def _popular_index(rng, count):
+    # Rozkład skośny - niewielka część składników występuje w większości posiłków, jak w prawdziwych danych
+    return int(count * rng.random() ** 3)
+
+def _ingredient_rows(rng, first_id, count):
+    for ingredient_id in range(first_id, first_id + count):
+        food = rng.choice(FOODS)
+        protein = rng.uniform(0, 35)
+        carbs = rng.uniform(0, 80)
+        fat = rng.uniform(0, 45)
+        yield (
+            ingredient_id,
+            f'{rng.choice(ADJECTIVES)} {food} {rng.choice(FORMS)}',
+            food,
+            protein * 4 + carbs * 4 + fat * 9,
+            protein,
+            carbs,
+            fat,
+            f'brand {rng.randrange(5_000)}',
+            f'{ingredient_id:013d}',
+            float(rng.choice([100, 250, 500, 1000]))
+        )
+
+def _meal_ingredients(rng, ingredient_ids):
+    ingredients = {}
+    count = rng.randint(*INGREDIENTS_PER_MEAL)
+    while len(ingredients) < min(count, len(ingredient_ids)):
+        ingredient_id = ingredient_ids[_popular_index(rng, len(ingredient_ids))]
+        ingredients[ingredient_id] = (rng.choice(UNITS), float(rng.randrange(10, 400, 5)))
+    return ingredients
+
+def _next_version(rng, ingredients, ingredient_ids):
+    # Kolejna wersja posiłku: zamiana jednego składnika albo zmiana ilości
+    ingredients = dict(ingredients)
+    if rng.random() < 0.5 and len(ingredients) > INGREDIENTS_PER_MEAL[0]:
+        del ingredients[rng.choice(sorted(ingredients))]
+        ingredient_id = ingredient_ids[_popular_index(rng, len(ingredient_ids))]
+        ingredients.setdefault(ingredient_id, (rng.choice(UNITS), float(rng.randrange(10, 400, 5))))
+    else:
+        ingredient_id = rng.choice(sorted(ingredients))
+        ingredients[ingredient_id] = (ingredients[ingredient_id][0], float(rng.randrange(10, 400, 5)))
+    return ingredients
+
+def _meals(rng, first_meal_id, count, user_ids, ingredient_ids, diet_ids, category_ids, max_versions, anchor):
+    # Posiłek z listą składników każdej wersji; generator jest deterministyczny, więc każda z tabel
+    # (meal, meal_ingredients, meal_history) ładowana jest z osobnego przebiegu zamiast z pamięci
+    for n in range(count):
+        meal_id = first_meal_id + n
+        # Pierwszy posiłek należy do pierwszego użytkownika - benchmarki wykonują żądania w jego imieniu
+        creator_id = user_ids[0] if n == 0 else rng.choice(user_ids)
+        name = f'{rng.choice(FOODS)} {rng.choice(MEAL_NAMES)} {meal_id}'
+        diet_id = rng.choice(diet_ids)
+        category_id = rng.choice(category_ids)
+        updated = datetime.datetime.combine(anchor, datetime.time()) - datetime.timedelta(days=rng.randrange(365), minutes=rng.randrange(1440))
+        versions = [_meal_ingredients(rng, ingredient_ids)]
+        for _ in range(int(max_versions * rng.random() ** 2)):
+            versions.append(_next_version(rng, versions[-1], ingredient_ids))
+        yield meal_id, name, creator_id, diet_id, category_id, updated, versions
+
+def _meal_rows(meals):
+    for meal_id, name, creator_id, diet_id, category_id, updated, versions in meals:
+        yield (meal_id, name, 'Synthetic meal', creator_id, diet_id, category_id, len(versions), updated)
+
+def _meal_ingredient_rows(meals):
+    for meal_id, _, _, _, _, _, versions in meals:
+        for ingredient_id, (unit, quantity) in versions[-1].items():
+            yield (meal_id, ingredient_id, unit, quantity)
+
+def _meal_history_rows(meals, first_history_id):
+    history_id = first_history_id
+    for meal_id, _, _, diet_id, category_id, updated, versions in meals:
+        for version, ingredients in enumerate(versions, start=1):
+            composition = {
+                "meal": {"diet_id": diet_id, "category_id": category_id, "last_update": updated.isoformat(), "version": version},
+                "ingredients": [{"ingredient_id": i, "unit": unit, "quantity": quantity} for i, (unit, quantity) in sorted(ingredients.items())]
+            }
+            yield (history_id, meal_id, version, json.dumps(composition))
+            history_id += 1
+
+def _food_log_rows(rng, user_ids, history_ids, log_days, logs_per_day, anchor):
+    days = [(anchor - datetime.timedelta(days=day)).isoformat() for day in range(log_days)]
+    for user_id in user_ids:
+        # Użytkownik jada zwykle kilka tych samych posiłków
+        favourites = [rng.choice(history_ids) for _ in range(8)]
+        for day in days:
+            for _ in range(logs_per_day):
+                meal_history_id = rng.choice(favourites) if rng.random() < 0.7 else rng.choice(history_ids)
+                yield (meal_history_id, float(rng.randrange(50, 600, 10)), f'{day} {rng.randrange(6, 23):02d}:{rng.randrange(60):02d}:00', user_id)
+
+def _food_schedule_rows(rng, user_ids, history_ids, schedule_days, anchor):
+    days = [(anchor + datetime.timedelta(days=day)).isoformat() for day in range(schedule_days)]
+    for user_id in user_ids:
+        for day in days:
+            for hour in rng.sample([8, 13, 16, 19], rng.randint(1, 3)):
+                yield (rng.choice(history_ids), f'{day} {hour:02d}:00:00', user_id)
+
+def _food_schedule_rule_rows(rng, user_ids, history_ids, anchor):
+    for user_id in user_ids:
+        if rng.random() < RULE_USERS_RATIO:
+            starts_on = anchor - datetime.timedelta(days=rng.randrange(28))
+            yield (rng.choice(history_ids), user_id, f'{rng.choice([7, 8, 12, 18]):02d}:00', rng.choice([31, 96, 127]), starts_on, starts_on + datetime.timedelta(weeks=rng.randint(4, 52), days=-1))
+
+# ==================== ŁADOWANIE ====================
+
+def generate_dataset(preset='small', seed=42, anchor=None, **overrides):
+    """Ładuje syntetyczny zbiór danych do bazy wskazanej zmiennymi POSTGRES_* i zwraca podsumowanie
+    (identyfikatory użytkowników, posiłków i składników oraz liczby wierszy w tabelach)."""
+    if preset not in PRESETS:
+        raise ValueError(f'Unknown preset: {preset}')
+    params = dict(PRESETS[preset])
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    anchor = anchor or datetime.date.today()
+
+    seed_database()
+
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    counts = {}
+
+    def step(table, started):
+        conn.commit()
+        print(f'{table}: {counts[table]} rows in {time.perf_counter() - started:.1f}s')
+
+    cursor.execute('SELECT id FROM diet ORDER BY id')
+    diet_ids = [row['id'] for row in cursor.fetchall()]
+    cursor.execute('SELECT id FROM meal_category ORDER BY id')
+    category_ids = [row['id'] for row in cursor.fetchall()]
+
+    started = time.perf_counter()
+    first_ingredient_id = _next_id(cursor, 'ingredients')
+    counts['ingredients'] = copy_rows(cursor, 'ingredients', (
+        'id', 'product_name', 'generic_name', 'kcal_100g', 'protein_100g', 'carbs_100g', 'fat_100g', 'brand', 'barcode', 'product_quantity'
+    ), _ingredient_rows(_rng(seed, 'ingredients'), first_ingredient_id, params['ingredients']))
+    cursor.execute("""
+        UPDATE ingredients SET tsv = to_tsvector('english', coalesce(product_name, '') || ' ' || coalesce(generic_name, ''))
+        WHERE id >= %s
+    """, (first_ingredient_id,))
+    _sync_sequence(cursor, 'ingredients')
+    ingredient_ids = range(first_ingredient_id, first_ingredient_id + params['ingredients'])
+    step('ingredients', started)
+
+    started = time.perf_counter()
+    rng = _rng(seed, 'user')
+    first_user_id = _next_id(cursor, '"user"')
+    user_ids = range(first_user_id, first_user_id + params['users'])
+    # Jeden skrót hasła dla wszystkich kont - haszowanie jest celowo kosztowne
+    password = hash_password(SYNTHETIC_PASSWORD)
+    created_at = datetime.datetime.combine(anchor, datetime.time()) - datetime.timedelta(days=params['log_days'])
+    counts['user'] = copy_rows(cursor, '"user"', ('id', 'email', 'password', 'created_at', 'email_confirmed', 'active'),
+                               ((user_id, f'user{user_id}@synthetic.example', password, created_at, True, True) for user_id in user_ids))
+    _sync_sequence(cursor, '"user"')
+    counts['user_details'] = copy_rows(cursor, 'user_details', (
+        'user_id', 'age', 'gender', 'height', 'weight', 'kcal_goal', 'fat_goal', 'protein_goal', 'carb_goal'
+    ), ((user_id, rng.randint(18, 80), rng.choice('FMX'), rng.uniform(150, 200), rng.uniform(45, 120),
+         rng.randrange(1400, 3200, 50), rng.randint(40, 110), rng.randint(50, 200), rng.randint(120, 400)) for user_id in user_ids))
+    counts['user_diets'] = copy_rows(cursor, 'user_diets', ('user_id', 'diet_id', 'allowed'),
+                                     ((user_id, rng.choice(diet_ids), True) for user_id in user_ids))
+    step('user', started)
+
+    started = time.perf_counter()
+    first_meal_id = _next_id(cursor, 'meal')
+    first_history_id = _next_id(cursor, 'meal_history')
+    meals = lambda: _meals(_rng(seed, 'meal'), first_meal_id, params['meals'], user_ids, ingredient_ids,
+                           diet_ids, category_ids, params['max_versions'], anchor)
+    counts['meal'] = copy_rows(cursor, 'meal', ('id', 'name', 'description', 'creator_id', 'diet_id', 'category_id', 'version', 'last_update'), _meal_rows(meals()))
+    counts['meal_ingredients'] = copy_rows(cursor, 'meal_ingredients', ('meal_id', 'ingredient_id', 'unit', 'quantity'), _meal_ingredient_rows(meals()))
+    # Historia ładowana jest w starym formacie (lista składników w composition), a deduplikację
+    # i skróty liczy Postgres - tak samo jak dla wersji tworzonych przez API
+    counts['meal_history'] = copy_rows(cursor, 'meal_history', ('id', 'meal_id', 'meal_version', 'composition'), _meal_history_rows(meals(), first_history_id))
+    dedup_meal_compositions(cursor)
+    _sync_sequence(cursor, 'meal')
+    _sync_sequence(cursor, 'meal_history')
+    history_ids = range(first_history_id, first_history_id + counts['meal_history'])
+    step('meal_history', started)
+
+    started = time.perf_counter()
+    counts['food_log'] = copy_rows(cursor, 'food_log', ('meal_history_id', 'portion', 'at', 'user_id'),
+                                   _food_log_rows(_rng(seed, 'food_log'), user_ids, history_ids, params['log_days'], params['logs_per_day'], anchor))
+    step('food_log', started)
+
+    started = time.perf_counter()
+    rng = _rng(seed, 'food_schedule')
+    counts['food_schedule'] = copy_rows(cursor, 'food_schedule', ('meal_history_id', 'at', 'user_id'),
+                                        _food_schedule_rows(rng, user_ids, history_ids, params['schedule_days'], anchor))
+    counts['food_schedule_rule'] = copy_rows(cursor, 'food_schedule_rule', ('meal_history_id', 'user_id', 'at_time', 'weekdays', 'starts_on', 'ends_on'),
+                                             _food_schedule_rule_rows(rng, user_ids, history_ids, anchor))
+    step('food_schedule', started)
+
+    # Świeże statystyki - bez nich plany zapytań na nowo załadowanych tabelach są przypadkowe
+    conn.autocommit = True
+    for table in ('ingredients', '"user"', 'user_details', 'user_diets', 'meal', 'meal_ingredients', 'meal_composition',
+                  'meal_history', 'food_log', 'food_schedule', 'food_schedule_rule'):
+        cursor.execute(f'ANALYZE {table}')
+
+    cursor.close()
+    conn.close()
+
+    return {
+        "preset": preset,
+        "seed": seed,
+        "anchor": anchor.isoformat(),
+        "parameters": params,
+        "user_ids": list(user_ids),
+        "meal_ids": list(range(first_meal_id, first_meal_id + params['meals'])),
+        "ingredient_ids": list(ingredient_ids),
+        "diet_ids": diet_ids,
+        "category_ids": category_ids,
+        "rows": counts
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generator syntetycznego zbioru danych (COPY)')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--anchor', help='data odniesienia DD-MM-YYYY (domyślnie dzisiaj) - logi sięgają wstecz, harmonogramy w przód')
+    for name in PRESETS['small']:
+        parser.add_argument(f'--{name.replace("_", "-")}', type=int, help='nadpisuje wartość z presetu')
+    args = parser.parse_args(argv)
+
+    # Uruchomienie jako skrypt - konfiguracja bazy z .env (w aplikacji wczytuje ją app.py)
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    anchor = datetime.datetime.strptime(args.anchor, '%d-%m-%Y').date() if args.anchor else None
+    overrides = {name: getattr(args, name) for name in PRESETS['small']}
+    started = time.perf_counter()
+    summary = generate_dataset(args.preset, args.seed, anchor, **overrides)
+    print(f"Dataset '{args.preset}' generated in {time.perf_counter() - started:.1f}s: {json.dumps(summary['rows'])}")
+
+if __name__ == '__main__':
+    main()